@@ -0,0 +1,154 @@
+import os
+import threading
+from typing import Optional, List
+
+import numpy as np
+
+import config
+
+
+class IVFIndex:
+    def __init__(self, n_lists: Optional[int] = None, n_probe: Optional[int] = None, seed: int = 0):
+        self.n_lists = n_lists if n_lists is not None else config.MEMORY_ANN_LISTS
+        self.n_probe = n_probe if n_probe is not None else config.MEMORY_ANN_PROBE
+        self.centroids: Optional[np.ndarray] = None
+        self._lists: List[List[int]] = []
+        self._arrays: List[Optional[np.ndarray]] = []
+        self.indexed_rows = 0
+        self.trained_rows = 0
+        self.last_indexed_id: Optional[str] = None
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    @staticmethod
+    def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        labels = np.empty(vectors.shape[0], dtype=np.int64)
+        chunk = config.MEMORY_SEARCH_CHUNK_ROWS
+        for start in range(0, vectors.shape[0], chunk):
+            block = vectors[start:start + chunk].astype(np.float32)
+            labels[start:start + chunk] = np.argmax(block @ centroids.T, axis=1)
+        return labels
+
+    def train(self, vectors: np.ndarray, iterations: int = 20):
+        n_rows = vectors.shape[0]
+        n_lists = self.n_lists or max(1, int(4 * np.sqrt(n_rows)))
+        n_lists = min(n_lists, n_rows)
+        sample_size = min(n_rows, max(config.MEMORY_ANN_TRAIN_SAMPLE, n_lists))
+        sample = vectors[self._rng.choice(n_rows, size=sample_size, replace=False)].astype(np.float32)
+        centroids = sample[self._rng.choice(sample_size, size=n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            labels = self._assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=n_lists)
+            empty = counts == 0
+            if empty.any():
+                sums[empty] = sample[self._rng.choice(sample_size, size=int(empty.sum()))]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = sums / norms
+        with self._lock:
+            self.centroids = centroids.astype(np.float32)
+            self._lists = [[] for _ in range(n_lists)]
+            self._arrays = [None] * n_lists
+            self.indexed_rows = 0
+            self.trained_rows = n_rows
+            self.last_indexed_id = None
+
+    def add(self, rows: np.ndarray, vectors: np.ndarray, last_id: Optional[str] = None):
+        if not self.is_trained or len(rows) == 0:
+            return
+        labels = self._assign(vectors, self.centroids)
+        with self._lock:
+            for row, label in zip(np.asarray(rows).tolist(), labels.tolist()):
+                self._lists[label].append(row)
+                self._arrays[label] = None
+            self.indexed_rows += len(rows)
+            if last_id is not None:
+                self.last_indexed_id = last_id
+
+    def _list_array(self, label: int) -> np.ndarray:
+        array = self._arrays[label]
+        if array is None:
+            array = np.asarray(self._lists[label], dtype=np.int64)
+            self._arrays[label] = array
+        return array
+
+    def probe(self, query_vector, n_probe: Optional[int] = None) -> np.ndarray:
+        n_probe = min(n_probe or self.n_probe, len(self._lists))
+        query = np.asarray(query_vector, dtype=np.float32).ravel()
+        scores = self.centroids @ query
+        nearest = np.argpartition(-scores, n_probe - 1)[:n_probe]
+        with self._lock:
+            arrays = [self._list_array(int(label)) for label in nearest]
+        rows = np.concatenate(arrays) if arrays else np.zeros(0, dtype=np.int64)
+        rows.sort()
+        return rows
+
+    def save(self, path: str):
+        if not self.is_trained:
+            return
+        with self._lock:
+            lengths = np.asarray([len(rows) for rows in self._lists], dtype=np.int64)
+            flat = np.asarray([row for rows in self._lists for row in rows], dtype=np.int64)
+            tmp_path = path + ".tmp.npz"
+            np.savez(tmp_path, centroids=self.centroids, lengths=lengths, rows=flat,
+                     indexed_rows=self.indexed_rows, trained_rows=self.trained_rows, last_indexed_id=str(self.last_indexed_id or ""))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["IVFIndex"]:
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                index = cls(n_lists=data["centroids"].shape[0])
+                index.centroids = data["centroids"].astype(np.float32)
+                bounds = np.concatenate([[0], np.cumsum(data["lengths"])])
+                flat = data["rows"]
+                index._lists = [flat[bounds[i]:bounds[i + 1]].tolist() for i in range(len(bounds) - 1)]
+                index._arrays = [None] * len(index._lists)
+                index.indexed_rows = int(data["indexed_rows"])
+                index.trained_rows = int(data["trained_rows"])
+                index.last_indexed_id = str(data["last_indexed_id"]) or None
+            return index
+        except Exception as e:
+            print(f"[DEBUG] Failed to load ANN index {path}: {e}")
+            return None
+
+
+if __name__ == "__main__":
+    import time
+    from vector_store import MatrixVectorStore
+
+    rows, dim, k, queries, topics = 200_000, 128, 10, 100, 2_000
+    rng = np.random.default_rng(0)
+    topic_centres = rng.normal(size=(topics, dim)).astype(np.float32)
+    vectors = topic_centres[rng.integers(0, topics, size=rows)] + 1.5 * rng.normal(size=(rows, dim)).astype(np.float32)
+    query_vectors = topic_centres[rng.integers(0, topics, size=queries)] + 1.5 * rng.normal(size=(queries, dim)).astype(np.float32)
+
+    store = MatrixVectorStore()
+    store.add_vectors([str(i) for i in range(rows)], [""] * rows, [{}] * rows, vectors)
+
+    start = time.perf_counter()
+    exact = [set(r for r, _ in store.search_by_vector(q, k)) for q in query_vectors]
+    exact_ms = (time.perf_counter() - start) / queries * 1e3
+
+    index = IVFIndex()
+    start = time.perf_counter()
+    index.train(store.matrix)
+    index.add(np.arange(rows), store.matrix)
+    print(f"Trained {len(index._lists)} lists over {rows} rows in {time.perf_counter() - start:.1f}s")
+
+    print(f"{'n_probe':>8} | {'recall@10':>9} | {'ms/query':>8} | {'speed-up':>8}")
+    print(f"{'exact':>8} | {1.0:>9.3f} | {exact_ms:>8.2f} | {1.0:>8.1f}")
+    for n_probe in [1, 4, 16, 64, 128, 256]:
+        start = time.perf_counter()
+        found = [set(r for r, _ in store.search_by_vector(q, k, rows=index.probe(q, n_probe))) for q in query_vectors]
+        ann_ms = (time.perf_counter() - start) / queries * 1e3
+        recall = np.mean([len(a & b) / k for a, b in zip(exact, found)])
+        print(f"{n_probe:>8} | {recall:>9.3f} | {ann_ms:>8.2f} | {exact_ms / ann_ms:>8.1f}")
@@ -0,0 +1,88 @@
+import asyncio
+import threading
+import concurrent.futures
+from typing import Optional, Coroutine, Any
+
+
+class BackgroundLoop:
+    def __init__(self):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._lock = threading.Lock()
+        self._current: Optional[concurrent.futures.Future] = None
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def submit(self, coro: Coroutine[Any, Any, Any], replace: bool = True) -> concurrent.futures.Future:
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        with self._lock:
+            previous, self._current = self._current, future
+        if replace and previous is not None and not previous.done():
+            previous.cancel()
+        return future
+
+    def cancel_current(self) -> bool:
+        with self._lock:
+            future, self._current = self._current, None
+        return future is not None and future.cancel()
+
+    async def _drain(self):
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def close(self):
+        if not self._thread.is_alive():
+            return
+        self.cancel_current()
+        try:
+            asyncio.run_coroutine_threadsafe(self._drain(), self._loop).result(timeout=2.0)
+        except (concurrent.futures.TimeoutError, RuntimeError) as e:
+            print(f"[DEBUG] Background loop did not drain cleanly: {e}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=2.0)
+        if not self._thread.is_alive():
+            self._loop.close()
+
+
+if __name__ == "__main__":
+    import time
+
+    def blocking_stage(name, seconds):
+        time.sleep(seconds)
+        return name
+
+    async def pipeline():
+        return await asyncio.gather(
+            asyncio.to_thread(blocking_stage, "context files", 0.3),
+            asyncio.to_thread(blocking_stage, "memory retrieval", 0.25),
+            asyncio.to_thread(blocking_stage, "conversation", 0.01),
+        )
+
+    start = time.perf_counter()
+    for name, seconds in [("context files", 0.3), ("memory retrieval", 0.25), ("conversation", 0.01)]:
+        blocking_stage(name, seconds)
+    sequential_ms = (time.perf_counter() - start) * 1e3
+
+    runner = BackgroundLoop()
+    start = time.perf_counter()
+    runner.submit(pipeline()).result()
+    concurrent_ms = (time.perf_counter() - start) * 1e3
+
+    slow = runner.submit(asyncio.sleep(30))
+    start = time.perf_counter()
+    runner.submit(asyncio.sleep(0))
+    try:
+        slow.result(timeout=1)
+    except concurrent.futures.CancelledError:
+        pass
+    cancel_ms = (time.perf_counter() - start) * 1e3
+    runner.close()
+
+    print(f"Sequential stages: {sequential_ms:6.1f} ms")
+    print(f"Concurrent stages: {concurrent_ms:6.1f} ms")
+    print(f"Superseded request cancelled in {cancel_ms:.2f} ms")
@@ -8,8 +8,11 @@ import config
 from project_handler import ProjectManagerHandler
 from vs_code_manager import VsCodeHandler
 from code_parser import CodeParser
+from context_collector import ContextCollector
 from llm_core import LLMService
-from project_memory import ProjectMemory
+import queue
+from response_stream import StreamingCall
+from async_runner import BackgroundLoop
 
 from faster_whisper import WhisperModel
 import sounddevice as sd
@@ -20,6 +23,12 @@ import pyttsx3
 
 load_dotenv()
 
+# Words that can pass the identifier check in dictated commands (sentence ends, abbreviations) but name no symbol.
+_COMMAND_STOPWORDS = frozenset({
+    "e.g", "i.e", "etc", "vs", "a.k.a", "this", "that", "file", "files", "main", "code", "function", "class",
+    "method", "review", "explain", "fix", "test", "tests", "please", "jarvis",
+})
+
 def split_into_subcommands(command: str):
     pattern = r"\b(?:first|then|after that|and then|next|afterwards|subsequently)\b"
     parts = re.split(pattern, command, flags=re.IGNORECASE)
@@ -46,17 +55,20 @@ class CodeAssistant:
         except Exception as e:
             self.ui.update_status(f"Whisper disabled: {e}")
 
-        self.project_memory = ProjectMemory(api_key=os.getenv("GOOGLE_API_KEY"))
         self.llm_service = LLMService(api_key=os.getenv("GOOGLE_API_KEY"), voice_handler=self, session_id=session_id, user_id=user_id)
+        self.project_memory = getattr(self.llm_service, "project_memory", None)
         self.project_manager = ProjectManagerHandler(voice_handler=self, base_dir=config.PROJECT_BASE_DIRECTORY)
         self.vscode_handler = VsCodeHandler(voice_manager=self)
         
         self.project_dir = None
         self.code_parser = None
+        self.context_collector = None
         self.project_goal = config.DEFAULT_PROJECT_GOAL
         self.active_file_path = None
         self.last_llm_response = None
+        self.last_response_abridged = False
         self.project_id = None
+        self.background_loop = BackgroundLoop() if config.GUIDANCE_ASYNC else None
 
     def speak(self, text: str, tag: str = 'assistant'):
         if not text: return
@@ -96,13 +108,15 @@ class CodeAssistant:
 
         return None
 
-    def _get_file_content(self, file_path):
+    def _get_file_content(self, file_path, notify=None):
         if file_path and os.path.exists(file_path):
             try:
+                if self.code_parser:
+                    return self.code_parser.file_cache.content(file_path)
                 with open(file_path, 'r', encoding='utf-8') as f:
                     return f.read()
             except Exception as e:
-                self.speak(f"Error reading {os.path.basename(file_path)}: {e}")
+                (notify or self.speak)(f"Error reading {os.path.basename(file_path)}: {e}")
         return ""
 
     def _write_file_content(self, file_path, content):
@@ -120,9 +134,84 @@ class CodeAssistant:
 
     def _refresh_code_parser(self):
         if self.project_dir:
-            self.code_parser = CodeParser(project_dir=self.project_dir)
+            if self.code_parser is None or self.code_parser.project_dir != os.path.abspath(self.project_dir):
+                if self.code_parser is not None:
+                    self.code_parser.close()
+                self.code_parser = CodeParser(project_dir=self.project_dir)
+                self.context_collector = ContextCollector(self.code_parser)
+            else:
+                self.code_parser.refresh()
             self.speak("Project file structure has been refreshed.")
 
+    def _collect_project_context(self, command: str = None):
+        context = {}
+        if self.context_collector and self.active_file_path:
+            try:
+                context = self.context_collector.collect(self.active_file_path)
+            except Exception as e:
+                print(f"[DEBUG] Context collection failed for {self.active_file_path}: {e}")
+        if command and self.code_parser:
+            context.update(self._symbol_snippets(command, context))
+        return context
+
+    @staticmethod
+    def _command_identifiers(command: str):
+        # Only tokens that look like code: `backticked`, snake_case, dotted.paths or camelCase/PascalCase.
+        # Commands usually arrive lowercased from listen(), so the casing test only helps callers passing raw text.
+        quoted = re.findall(r"`([A-Za-z_][A-Za-z0-9_.]*)`", command)
+        words = [word.strip(".") for word in re.findall(r"[A-Za-z_][A-Za-z0-9_.]{2,}", command)]
+        marked = [word for word in words if ("_" in word or "." in word or re.search(r"[a-z0-9][A-Z]", word))
+                  and word.lower() not in _COMMAND_STOPWORDS]
+        return list(dict.fromkeys(quoted + marked))
+
+    def _symbol_snippets(self, command: str, context: dict):
+        snippets = {}
+        identifiers = self._command_identifiers(command)
+        if not identifiers:
+            return snippets
+        try:
+            symbol_index = self.code_parser.symbol_index
+        except Exception as e:
+            print(f"[DEBUG] Symbol index unavailable: {e}")
+            return snippets
+        active_rel = os.path.relpath(self.active_file_path, self.project_dir) if self.active_file_path else None
+        for word in identifiers:
+            # find() falls back to a case-folded match, since "`CodeParser`" reaches here as "`codeparser`".
+            for definition in symbol_index.find(word)[:2]:
+                if definition["file"] in context or definition["file"] == active_rel or definition["kind"] == "variable":
+                    continue
+                snippets[f"{definition['file']}::{definition['qualname']}"] = symbol_index.snippet(definition)
+                if len(snippets) >= config.CONTEXT_MAX_SYMBOL_SNIPPETS:
+                    return snippets
+        return snippets
+
+    def _find_project_file(self, spoken_name: str):
+        if not self.code_parser:
+            return None
+        matches = self.code_parser.file_finder.find(spoken_name)
+        if not matches:
+            return None
+        if len(matches) > 1 and matches[1][2] >= matches[0][2] - 0.05:
+            self.ui.add_log("Other close matches:\n" + "\n".join(rel for rel, _, _ in matches[1:]), tag="info")
+        return matches[0][1]
+
+    def _remember_file(self, file_path: str):
+        if self.code_parser and file_path:
+            self.code_parser.file_finder.touch(file_path)
+
+    def _lookup_symbol(self, command: str, trigger_phrases: list[str]):
+        name = self._extract_argument_from_command(command, trigger_phrases, ["the ", "function ", "class ", "method ", "symbol ", "variable ", "of ", "to "])
+        if not name: name = self.listen("Which symbol should I look up?")
+        if not name or not self.code_parser:
+            return None, []
+        name = re.sub(r"\s+(?:defined|used|called)\b.*$", "", name.strip())
+        symbol_index = self.code_parser.symbol_index
+        for candidate in [name, name.replace(" ", "_"), name.replace(" ", "")]:
+            found = symbol_index.find(candidate)
+            if found:
+                return candidate, found
+        return name, []
+
     def _extract_argument_from_command(self, command_text: str, trigger_phrases: list[str], 
                                      prefix_keywords_to_strip: list[str] = None, 
                                      is_filename_extraction: bool = False) -> str | None:
@@ -197,6 +286,8 @@ class CodeAssistant:
         return result
     
     def _handle_llm_output(self, llm_response_dict):
+        if llm_response_dict is None:
+            return False
         if not isinstance(llm_response_dict, dict):
             self.speak(str(llm_response_dict), 'info')
             self.last_llm_response = None
@@ -206,16 +297,67 @@ class CodeAssistant:
             return False
         guidance_text = llm_response_dict.get("Guidance")
         suggested_code = llm_response_dict.get("Suggested code")
-        if guidance_text:
+        if guidance_text and not llm_response_dict.get("Streamed"):
             self.speak(guidance_text)
         if suggested_code and suggested_code.strip().lower() != 'none':
             self.last_llm_response = suggested_code
+            report = llm_response_dict.get("Context report")
+            self.last_response_abridged = bool(report and report["active_file_abridged"])
             if not guidance_text: self.speak("I have a code suggestion:")
             self.ui.add_log(suggested_code, tag='code')
         else:
             self.last_llm_response = None
         return True
 
+    def _ask_llm(self, command: str, active_file_path, load_active_code, load_context):
+        if self.background_loop is not None:
+            return self._ask_llm_async(command, active_file_path, load_active_code, load_context)
+
+        def ask(on_guidance=None):
+            # Errors raised while loading go through the same channel as streamed sentences, so speech stays on this thread.
+            return self.llm_service.get_code_guidance_with_project_context(
+                user_command=command, active_file_path=active_file_path,
+                active_file_code=load_active_code(on_guidance or self.speak),
+                project_context_files=load_context(), user_project_goal=self.project_goal,
+                on_guidance=on_guidance
+            )
+        if not config.LLM_STREAMING:
+            return ask()
+        # Generation keeps running on a worker thread while finished sentences are spoken here.
+        call = StreamingCall(ask)
+        for sentence in call:
+            self.speak(sentence)
+        return call.wait()
+
+    def _ask_llm_async(self, command: str, active_file_path, load_active_code, load_context):
+        sentences = queue.Queue()
+        future = self.background_loop.submit(self.llm_service.aget_code_guidance_with_project_context(
+            user_command=command, active_file_path=active_file_path,
+            active_file_code=lambda: load_active_code(sentences.put),
+            project_context_files=load_context, user_project_goal=self.project_goal, on_guidance=sentences.put
+        ))
+        # Only typed commands can cancel: the microphone is sampled in blocking five-second recordings
+        # and would pick up Jarvis's own speech, so voice input is not polled while a request is in flight.
+        self.ui.update_status("Thinking... type a new command to cancel.")
+        while not future.done() or not sentences.empty():
+            # A command typed while Jarvis is thinking supersedes the one in flight.
+            if not self.ui.user_input_queue.empty():
+                if not future.done():
+                    future.cancel()
+                    self.speak("Stopping that request.", 'info')
+                    return None
+                # The answer is already complete: stop reading it aloud but keep it, logging what was left unspoken.
+                while not sentences.empty():
+                    self.ui.add_log(sentences.get_nowait(), 'assistant')
+                break
+            try:
+                self.speak(sentences.get(timeout=0.1))
+            except queue.Empty:
+                pass
+        if future.cancelled():
+            return None
+        return future.result()
+
     def setup_project(self):
         self.speak("Welcome! I am Jarvis, your coding assistant.")
         project_name = self.listen("What is the name of the project we'll be working on? 'You can also say 'default' to use the default project name.")
@@ -240,6 +382,7 @@ class CodeAssistant:
         if file_path and os.path.exists(file_path):
             self.active_file_path = file_path
             self._refresh_code_parser()
+            self._remember_file(file_path)
             self.vscode_handler.open_file_in_editor(file_path)
             self.speak(f"Active file set to {os.path.basename(file_path)}.")
         else:
@@ -281,6 +424,7 @@ class CodeAssistant:
                 if self.vscode_handler.create_and_open_file(full_path):
                     self.active_file_path = full_path
                     self._refresh_code_parser()
+                    self._remember_file(full_path)
                     self.speak(f"Created file '{file_name}' inside '{os.path.relpath(base_path, self.project_dir)}'.")
             return True
         
@@ -310,14 +454,41 @@ class CodeAssistant:
             file_to_open = self._extract_argument_from_command(command, ["open file", "go to file", "switch to file", "open "], ["the ","a "], True)
             if not file_to_open: file_to_open = self.listen("Which file should I open?")
             if file_to_open:
-                found_path = next((path for path in self.code_parser.get_all_files().values() if file_to_open in os.path.basename(path)), None)
+                found_path = self._find_project_file(file_to_open)
                 if found_path and self.vscode_handler.open_file_in_editor(found_path):
                     self.active_file_path = found_path
+                    self._remember_file(found_path)
                     self.speak(f"Switched to {os.path.basename(found_path)}.")
                 else:
                     self.speak(f"Sorry, I couldn't find the file '{file_to_open}'.")
             return True
         
+        # Symbol lookups only trigger at the start, so "explain the definition of x" still reaches the LLM.
+        elif (command_lower.startswith("where is") and "defined" in command_lower) or command_lower.startswith(("find definition", "go to definition", "definition of")):
+            name, definitions = self._lookup_symbol(command, ["where is", "find definition", "go to definition", "definition of"])
+            if not definitions:
+                self.speak(f"I couldn't find a definition for '{name}'." if name else "No symbol given.")
+                return True
+            first = definitions[0]
+            self.speak(f"{first['name']} is a {first['kind']} in {first['file']} at line {first['start']}.")
+            if len(definitions) > 1:
+                self.speak(f"There are {len(definitions)} definitions with that name.", tag='info')
+                self.ui.add_log("\n".join(f"{d['file']}:{d['start']}  {d['kind']} {d['name']}" for d in definitions[:20]), tag="assistant")
+            self.vscode_handler.open_file_in_editor(first['path'], line=first['start'])
+            return True
+
+        elif command_lower.startswith(("find usages", "find references", "who calls", "usages of", "references to")):
+            name, definitions = self._lookup_symbol(command, ["find usages", "find references", "who calls", "usages of", "references to"])
+            symbol = definitions[0]['qualname'] if definitions else name
+            sites = self.code_parser.symbol_index.references(symbol) if symbol and self.code_parser else []
+            if not sites:
+                self.speak(f"I couldn't find any references to '{name}'." if name else "No symbol given.")
+                return True
+            calls = sum(1 for site in sites if site['call'])
+            self.speak(f"Found {len(sites)} references to {symbol}, {calls} of them calls.")
+            self.ui.add_log("\n".join(f"{site['file']}:{site['line']}{'  (call)' if site['call'] else ''}" for site in sites[:50]), tag="assistant")
+            return True
+
         elif "list files" in command_lower or "project structure" in command_lower:
             structure = "\n".join(self.code_parser.get_all_files().keys()) if self.code_parser else "Not available."
             self.speak("Current project structure:", tag='info')
@@ -326,25 +497,19 @@ class CodeAssistant:
 
         elif any(kw in command_lower for kw in ["analyze", "help", "review", "explain", "debug"]):
             self.speak("Thinking...")
-            active_code = self._get_file_content(self.active_file_path) if self.active_file_path else "No active file."
-            import_files = self.code_parser.extract_imports_from_file(self.active_file_path) if self.active_file_path else {}
-            import_paths = self.code_parser.resolve_import_paths(import_files) if self.active_file_path else {}
-            
-            project_context_files = {}
-            for rel_path, abs_path in import_paths.items():
-                content = self._get_file_content(abs_path)
-                if content:
-                    project_context_files[rel_path] = content
-                    
-            llm_response = self.llm_service.get_code_guidance_with_project_context(
-                user_command=command, active_file_path=self.active_file_path or "None",
-                active_file_code=active_code, project_context_files=project_context_files, user_project_goal=self.project_goal
-            )
+            active_file_path = self.active_file_path
+            llm_response = self._ask_llm(
+                command, active_file_path or "None",
+                lambda notify: self._get_file_content(active_file_path, notify) if active_file_path else "No active file.",
+                lambda: self._collect_project_context(command))
             self._handle_llm_output(llm_response)
             return True
 
         elif any(cmd in command_lower for cmd in ["write this", "apply this"]):
-            if self.last_llm_response and self.active_file_path:
+            if self.last_llm_response and self.active_file_path and self.last_response_abridged:
+                self.speak("That suggestion was written against a shortened view of the file, "
+                           "so I won't overwrite it. Please copy the relevant parts from the log.")
+            elif self.last_llm_response and self.active_file_path:
                 self.speak(f"Applying changes to {os.path.basename(self.active_file_path)}...")
                 if self._write_file_content(self.active_file_path, self.last_llm_response):
                     self.speak("Content written successfully.")
@@ -370,7 +535,7 @@ class CodeAssistant:
             new_active_file = self._extract_argument_from_command(command, ["set active file", "switch active file", "change active file"], ["to ", "as "], True)
             if not new_active_file: new_active_file = self.listen("What is the new active file?")
             if new_active_file:
-                found_path = next((path for path in self.code_parser.get_all_files() if new_active_file in os.path.basename(path)), None)
+                found_path = self._find_project_file(new_active_file)
                 if found_path:
                     self.set_active_file(found_path)
                 else:
@@ -391,14 +556,10 @@ class CodeAssistant:
         
         else:
             self.speak("Let me see what I can do with that...")
-            active_code = self._get_file_content(self.active_file_path)
-            llm_response = self.llm_service.get_code_guidance_with_project_context(
-                user_command=command, 
-                active_file_path=self.active_file_path,
-                active_file_code=active_code, 
-                project_context_files={},
-                user_project_goal=self.project_goal
-            )
+            active_file_path = self.active_file_path
+            llm_response = self._ask_llm(command, active_file_path,
+                                         lambda notify: self._get_file_content(active_file_path, notify),
+                                         lambda: self._collect_project_context(command))
             self._handle_llm_output(llm_response)
             return True
 
@@ -421,4 +582,6 @@ class CodeAssistant:
                         running = False
                         break
             else:
-                time.sleep(0.1)
\ No newline at end of file
+                time.sleep(0.1)
+        if self.background_loop is not None:
+            self.background_loop.close()
@@ -1,97 +1,119 @@
 import os
-import ast
-from typing import Dict,Any
-import importlib.util
+from typing import Dict,Any,Iterator
+
+from file_index import FileIndex
+from module_index import ModuleIndex, extract_imports
+from file_cache import FileCache
+from import_graph import ImportGraph
+from symbol_index import SymbolIndex
+from file_finder import FileFinder
+from path_scanner import scan, ScanEntry
 
 class CodeParser:
     def __init__(self, project_dir):
         self.project_dir = os.path.abspath(project_dir)
-        self.all_files = self.get_all_files(include_ext={'.py'})
-
-    def get_all_files(self, include_ext=None, ignore_hidden=True, follow_symlinks=False):
-        files = {}
-        for root, dirs, file_names in os.walk(self.project_dir, followlinks=follow_symlinks):
-            if ignore_hidden:
-                dirs[:] = [d for d in dirs if not d.startswith('.') and d != '__pycache__']
-            for name in file_names:
-                if ignore_hidden and name.startswith('.'):
-                    continue
-                if include_ext and not os.path.splitext(name)[1] in include_ext:
-                    continue
-                abs_path = os.path.join(root, name)
-                rel_path = os.path.relpath(abs_path, self.project_dir)
-                files[rel_path] = abs_path
-            for name in dirs:
-                if ignore_hidden and name.startswith('.'):
-                    continue
-                abs_path = os.path.join(root, name)
-                rel_path = os.path.relpath(abs_path, self.project_dir)
-                files[rel_path] = abs_path
-        return files
+        self.file_index = FileIndex(self.project_dir)
+        self.file_cache = FileCache()
+        self._module_index = None
+        self._module_index_source = None
+        self._import_graph = None
+        self._symbol_index = None
+        self._file_finder = None
+
+    @property
+    def all_files(self):
+        return self.file_index.files(include_ext={'.py'})
+
+    def refresh(self):
+        return self.file_index.refresh()
+
+    def close(self):
+        if self._import_graph is not None:
+            self._import_graph.close()
+        self.file_index.close()
+
+    def get_all_files(self, include_ext=None, ignore_hidden=True, follow_symlinks=False, max_depth=None):
+        if ignore_hidden == self.file_index.ignore_hidden and follow_symlinks == self.file_index.follow_symlinks:
+            self.file_index.refresh()
+            files = self.file_index.files(include_ext=include_ext)
+            if max_depth is not None:
+                files = {rel: path for rel, path in files.items() if rel.count(os.sep) < max_depth}
+            return files
+        return self.walk_files(self.project_dir, include_ext, ignore_hidden, follow_symlinks, max_depth)
+
+    def iter_files(self, include_ext=None, max_depth=None) -> Iterator[ScanEntry]:
+        return scan(self.project_dir, include_ext, self.file_index.ignore_hidden, self.file_index.follow_symlinks,
+                    max_depth, dirs=False, rules=self.file_index.rules)
+
+    def iter_directories(self, max_depth=None) -> Iterator[ScanEntry]:
+        return scan(self.project_dir, None, self.file_index.ignore_hidden, self.file_index.follow_symlinks,
+                    max_depth, files=False, rules=self.file_index.rules)
+
+    @staticmethod
+    def walk_files(project_dir, include_ext=None, ignore_hidden=True, follow_symlinks=False, max_depth=None):
+        return {entry.rel_path: entry.path
+                for entry in scan(project_dir, include_ext, ignore_hidden, follow_symlinks, max_depth, dirs=False)}
+
+    @property
+    def module_index(self):
+        files = self.all_files
+        if self._module_index is None or self._module_index_source is not files:
+            self._module_index = ModuleIndex(files, file_cache=self.file_cache)
+            self._module_index_source = files
+        return self._module_index
+
+    @property
+    def import_graph(self):
+        if self._import_graph is None:
+            self._import_graph = ImportGraph(self.project_dir, file_index=self.file_index)
+        self._import_graph.update()
+        return self._import_graph
+
+    @property
+    def symbol_index(self):
+        if self._symbol_index is None:
+            self._symbol_index = SymbolIndex(self)
+        self._symbol_index.update()
+        return self._symbol_index
+
+    @property
+    def file_finder(self):
+        if self._file_finder is None:
+            self._file_finder = FileFinder(self.file_index)
+        self._file_finder.refresh()
+        return self._file_finder
 
     def extract_imports_from_file(self, file_path:str)->Dict[str,Any]:
         if not os.path.exists(file_path):
             print(f"[DEBUG] File not found: {file_path}")
             return {"Error": "File not found."}
-        with open(file_path, "r", encoding="utf-8") as f:
-            try:
-                tree = ast.parse(f.read(), filename=file_path)
-            except Exception as e:
-                print(f"[DEBUG] Error parsing AST for {file_path}: {e}")
-                return {"Error": "AST parsing failed."}
-        imports = {}
-        for node in ast.walk(tree):
-            if isinstance(node, ast.ImportFrom):
-                if node.module:
-                    top_module = node.module.split('.')[0]
-                    if top_module not in imports:
-                        imports[top_module] = set()
-                    for alias in node.names:
-                        imports[top_module].add(alias.name)
+        try:
+            summary = self.file_cache.summary(file_path, "imports", extract_imports)
+        except Exception as e:
+            print(f"[DEBUG] Error parsing AST for {file_path}: {e}")
+            return {"Error": "AST parsing failed."}
+        imports = {module: set(names) for module, names in summary.items()}
         return imports if imports else {"Info": "No imports found."}
 
-    def resolve_import_paths(self, imports:Dict[str,Any])->Dict[str,Any]:
+    def resolve_import_paths(self, imports:Dict[str,Any], from_file:str=None)->Dict[str,Any]:
+        self.file_index.refresh()
+        index = self.module_index
         result = {}
         for module, names in imports.items():
-            if module in ["Error", "Info"]:  
+            if module in ["Error", "Info"]:
                 continue
-            py_file = module + '.py'
-            found = False
-            for rel_path,abs_path in self.all_files.items():
-                if os.path.basename(rel_path)==py_file:
-                    result[rel_path]=abs_path
-                    found = True
-                    break 
-            if found:
+            name = module.lstrip(".")
+            absolute = index.absolute_name(name, len(module) - len(name), from_file)
+            if absolute is None:
+                print(f"[DEBUG] Cannot resolve relative import '{module}' without a file inside a package.")
                 continue
-            else:
-                found_path = ""
-                for rel_path,abs_path in self.all_files.items():
-                    if os.path.basename(rel_path)==module:
-                        found_path = abs_path
-                        break
-                if found_path.strip(): 
-                    init_file = os.path.join(found_path, "__init__.py")
-                    if os.path.exists(init_file):
-                        rel_init = os.path.join(module, "__init__.py")
-                        result[rel_init] = init_file
-                        try:
-                            with open(init_file, "r", encoding="utf-8") as f:
-                                tree = ast.parse(f.read(), filename=init_file)
-                        except Exception as e:
-                            print(f"[DEBUG] Failed to parse {init_file}: {e}")
-                            continue
-                        for node in ast.walk(tree):
-                            if isinstance(node, ast.ImportFrom) and node.module:
-                                for alias in node.names:
-                                    if alias.name in names:
-                                        sub_file = node.module.split('.')[0] + ".py"
-                                        sub_path = os.path.join(found_path, sub_file)
-                                        if os.path.exists(sub_path):
-                                            rel_sub = os.path.join(module, sub_file)
-                                            result[rel_sub] = sub_path
-                                        else:
-                                            print(f"[DEBUG] Submodule file not found: {sub_file}")
+            targets = [absolute]
+            for imported_name in names:
+                targets.extend(index.resolve_name(absolute, imported_name))
+            for target in targets:
+                path = index.resolve(target)
+                if path:
+                    result[os.path.relpath(path, self.project_dir)] = path
         return result if result else {"Info": "No import paths resolved."}
 
 if __name__ == "__main__":
@@ -109,6 +131,6 @@ if __name__ == "__main__":
     print(imports)
 
     print("\n=============================================\n")
-    resolved_imports = code_parser.resolve_import_paths(imports=imports)
+    resolved_imports = code_parser.resolve_import_paths(imports=imports, from_file=test_file)
     print("Resolved Imports from files:")
     print(resolved_imports)
@@ -1,6 +1,83 @@
 
 PROJECT_BASE_DIRECTORY = "C:/Users/Debajyoti/OneDrive/Desktop"
 FAISS_STORE_PATH="C:/Users/Debajyoti/OneDrive/Desktop/Code Assistant"
+EMBEDDING_MODEL = "models/embedding-001"
+EMBEDDING_BATCH_SIZE = 100
 SEQUENCE_KEYWORDS = ["first", "then", "after that", "and then", "next", "afterwards", "subsequently"]
 DEFAULT_PROJECT_GOAL="I want to create a project that can watch over my phone messages and notify me about important messages."
-DEFAULT_PROJECT_NAME="MessageAgent"
\ No newline at end of file
+DEFAULT_PROJECT_NAME="MessageAgent"
+MEMORY_LOG_FSYNC_EVERY = 32
+MEMORY_LOG_FSYNC_INTERVAL = 1.0
+MEMORY_LOG_COMPACT_INTERVAL = 300.0
+MEMORY_LOG_COMPACT_DEAD_RATIO = 0.5
+MEMORY_VECTOR_DTYPE = "float32"
+MEMORY_SEARCH_CHUNK_ROWS = 65536
+MEMORY_INDEXED_FIELDS = ["user_id", "project_id", "session_id", "type"]
+MEMORY_ANN_ENABLED = False
+MEMORY_ANN_MIN_ROWS = 50000
+MEMORY_ANN_LISTS = None
+MEMORY_ANN_PROBE = 16
+MEMORY_ANN_TRAIN_SAMPLE = 50000
+MEMORY_ANN_RETRAIN_GROWTH = 4.0
+MEMORY_MAX_LOADED_SHARDS = 4
+MEMORY_MAPPED_ROWS = True
+MEMORY_MAPPED_RECORD_CACHE = 4096
+MEMORY_WRITE_BEHIND = True
+MEMORY_WRITE_QUEUE_SIZE = 1024
+MEMORY_WRITE_BATCH_SIZE = 64
+MEMORY_WRITE_FLUSH_INTERVAL = 0.5
+MEMORY_PROJECT_MAX_RECORDS = 20000
+MEMORY_PROJECT_MAX_BYTES = None
+MEMORY_PROJECT_TARGET_RATIO = 0.8
+MEMORY_SUMMARIZE_EVICTED = True
+MEMORY_SEARCH_MODE = "auto"
+MEMORY_BM25_K1 = 1.2
+MEMORY_BM25_B = 0.75
+MEMORY_RRF_K = 60
+MEMORY_FUSION_CANDIDATES = 20
+FILE_INDEX_PERSIST = True
+FILE_INDEX_USE_WATCHER = True
+FILE_INDEX_FULL_POLL_INTERVAL = 30.0
+FILE_INDEX_SAVE_INTERVAL = 10.0
+FILE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+FILE_CACHE_AST_COST_FACTOR = 10
+FILE_CACHE_DISK_ENABLED = True
+# Parallel import parsing is opt-in (None = one per CPU). On Windows every spawned worker starts a fresh
+# interpreter and re-imports main.py, which outweighs the serial parse unless thousands of files changed.
+IMPORT_GRAPH_WORKERS = 1
+IMPORT_GRAPH_PARALLEL_MIN = 256
+IMPORT_GRAPH_CHUNK_SIZE = 256
+IMPORT_GRAPH_PERSIST = True
+IMPORT_GRAPH_SAVE_INTERVAL = 10.0
+IMPORT_GRAPH_STAT_INTERVAL = 2.0
+CONTEXT_MAX_DEPTH = 3
+CONTEXT_MAX_BYTES = 48 * 1024
+CONTEXT_SLICE_SYMBOLS = True
+CONTEXT_MAX_SYMBOL_SNIPPETS = 5
+FILE_FINDER_MIN_SCORE = 0.25
+FILE_FINDER_RECENCY_WEIGHT = 0.3
+FILE_FINDER_RECENT_LIMIT = 200
+FILE_SCAN_EXCLUDE_GLOBS = ["node_modules/", "venv/", ".venv/", "build/", "dist/", "__pycache__/", "*.egg-info/",
+                           "site-packages/", ".tox/", ".mypy_cache/", ".pytest_cache/"]
+FILE_SCAN_USE_GITIGNORE = True
+FILE_SCAN_SKIP_VIRTUALENVS = True
+CONTEXT_TOKEN_BUDGET = 24000
+CONTEXT_ACTIVE_FILE_SHARE = 0.6
+CONTEXT_CHARS_PER_TOKEN = 4
+CONTEXT_CHUNK_LINES = 60
+CONTEXT_CHUNK_MAX_TOKENS = 800
+LLM_STREAMING = True
+LLM_STREAM_MIN_SENTENCE_CHARS = 20
+RESPONSE_CACHE_ENABLED = True
+RESPONSE_CACHE_MAX_ENTRIES = 256
+RESPONSE_CACHE_TTL = 3600.0
+RESPONSE_CACHE_DISK_ENABLED = True
+GUIDANCE_ASYNC = True
+GUIDANCE_CONTEXT_TIMEOUT = 10.0
+GUIDANCE_MEMORY_TIMEOUT = 5.0
+GUIDANCE_LLM_TIMEOUT = 90.0
+SHORT_TERM_MAX_TURNS = 6
+SHORT_TERM_TOKEN_BUDGET = 3000
+SHORT_TERM_SUMMARY_TOKENS = 400
+MEMORY_WRITE_RETRY_BASE_DELAY = 1.0
+MEMORY_WRITE_RETRY_MAX_DELAY = 60.0
@@ -0,0 +1,254 @@
+import os
+import ast
+from collections import deque
+from typing import Optional, Dict, Any, List, Set, Tuple
+
+import config
+
+MODULE_SCOPE = "<module>"
+
+
+def _references(node: ast.AST) -> List[str]:
+    found = set()
+    for child in ast.walk(node):
+        if isinstance(child, ast.Attribute):
+            parts = []
+            value = child
+            while isinstance(value, ast.Attribute):
+                parts.append(value.attr)
+                value = value.value
+            if isinstance(value, ast.Name):
+                found.add(".".join([value.id] + parts[::-1]))
+        elif isinstance(child, ast.Name):
+            found.add(child.id)
+    return sorted(found)
+
+
+def symbol_summary(tree: ast.Module) -> Dict[str, Any]:
+    defs: Dict[str, List[int]] = {}
+    refs: Dict[str, List[str]] = {}
+    bindings: Dict[str, List[Optional[str]]] = {}
+    module_refs = set()
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.asname:
+                    bindings[alias.asname] = [alias.name, None]
+                else:
+                    root = alias.name.split(".")[0]
+                    bindings[root] = [root, None]
+            continue
+        if isinstance(node, ast.ImportFrom):
+            module = "." * node.level + (node.module or "")
+            for alias in node.names:
+                if alias.name != "*":
+                    bindings[alias.asname or alias.name] = [module, alias.name]
+            continue
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names = [node.name]
+        elif isinstance(node, ast.Assign):
+            names = [n.id for target in node.targets for n in ast.walk(target) if isinstance(n, ast.Name)]
+        elif isinstance(node, ast.AnnAssign) and isinstance(node.target, ast.Name):
+            names = [node.target.id]
+        else:
+            module_refs.update(_references(node))
+            continue
+        start = min([node.lineno] + [d.lineno for d in getattr(node, "decorator_list", [])])
+        used = [ref for ref in _references(node) if ref not in names]
+        for name in names:
+            defs[name] = [start, node.end_lineno]
+            refs[name] = used
+    refs[MODULE_SCOPE] = sorted(module_refs)
+    return {"defs": defs, "refs": refs, "bindings": bindings}
+
+
+class ContextCollector:
+    def __init__(self, code_parser):
+        self.code_parser = code_parser
+
+    def _summary(self, path: str) -> Optional[Dict[str, Any]]:
+        try:
+            return self.code_parser.file_cache.summary(path, "symbols", symbol_summary)
+        except Exception as e:
+            print(f"[DEBUG] Cannot slice {path}: {e}")
+            return None
+
+    def _target(self, graph, from_path: str, binding: List[Optional[str]],
+                attrs: List[str]) -> Optional[Tuple[str, Optional[str]]]:
+        module_key, imported = binding
+        name = module_key.lstrip(".")
+        base = graph.module_index.absolute_name(name, len(module_key) - len(name), from_path)
+        if base is None:
+            return None
+        dotted = ([imported] if imported else []) + attrs
+        for cut in range(len(dotted), -1, -1):
+            path = graph.module_index.resolve(".".join([base] + dotted[:cut]))
+            if path is not None:
+                rel = graph.rel_of(path)
+                return (rel, dotted[cut] if cut < len(dotted) else None) if rel is not None else None
+        return None
+
+    def _slice(self, content: str, summary: Dict[str, Any], names: Optional[Set[str]]) -> str:
+        if names is None:
+            return content
+        lines = content.splitlines()
+        ranges = sorted(summary["defs"][name] for name in names if name in summary["defs"])
+        merged: List[List[int]] = []
+        for start, end in ranges:
+            if merged and start <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        chunks = ["\n".join(lines[start - 1:end]) for start, end in merged]
+        header = f"# Relevant definitions only: {', '.join(sorted(n for n in names if n in summary['defs']))}"
+        return header + "\n\n" + "\n\n# ...\n\n".join(chunks)
+
+    def collect(self, active_file: str, max_depth: Optional[int] = None,
+                max_bytes: Optional[int] = None) -> Dict[str, str]:
+        max_depth = max_depth if max_depth is not None else config.CONTEXT_MAX_DEPTH
+        max_bytes = max_bytes if max_bytes is not None else config.CONTEXT_MAX_BYTES
+        if not active_file or not os.path.exists(active_file):
+            return {}
+        graph = self.code_parser.import_graph
+        distances = graph.distances(active_file, max_depth)
+        if not distances:
+            return {}
+        active_rel = next(rel for rel, depth in distances.items() if depth == 0)
+
+        if not config.CONTEXT_SLICE_SYMBOLS:
+            wanted: Dict[str, Optional[Set[str]]] = {rel: None for rel in distances if rel != active_rel}
+        else:
+            wanted = {}
+            summaries: Dict[str, Optional[Dict[str, Any]]] = {}
+            expanded: Dict[str, Set[str]] = {}
+            queue = deque([(active_rel, None)])
+            while queue:
+                rel, names = queue.popleft()
+                path = graph.path_of(rel)
+                if rel not in summaries:
+                    summaries[rel] = self._summary(path)
+                summary = summaries[rel]
+                if summary is None:
+                    continue
+                done = expanded.setdefault(rel, set())
+                # A file taken whole also follows its own imports, so re-exports such as
+                # `from .core import Engine` in a package __init__ reach the defining module.
+                pending = list(summary["defs"]) + [MODULE_SCOPE] + list(summary["bindings"]) if names is None else list(names)
+                while pending:
+                    name = pending.pop()
+                    if name in done:
+                        continue
+                    done.add(name)
+                    if name in summary["defs"] or name == MODULE_SCOPE:
+                        if rel != active_rel and name in summary["defs"] and wanted.get(rel, ()) is not None:
+                            wanted.setdefault(rel, set()).add(name)
+                        for ref in summary["refs"].get(name, []):
+                            base, *attrs = ref.split(".")
+                            if base in summary["defs"]:
+                                pending.append(base)
+                            elif base in summary["bindings"]:
+                                pending.append(ref)
+                        continue
+                    base, *attrs = name.split(".")
+                    binding = summary["bindings"].get(base)
+                    if binding is None:
+                        continue
+                    target = self._target(graph, path, binding, attrs)
+                    if target is None or target[0] not in distances or target[0] == active_rel:
+                        continue
+                    target_rel, symbol = target
+                    if symbol is None:
+                        if wanted.get(target_rel, ()) is not None:
+                            wanted[target_rel] = None
+                            queue.append((target_rel, None))
+                    elif wanted.get(target_rel, ()) is not None and symbol not in expanded.get(target_rel, ()):
+                        queue.append((target_rel, {symbol}))
+
+        ranked = []
+        for rel, names in wanted.items():
+            path = graph.path_of(rel)
+            try:
+                content = self.code_parser.file_cache.content(path)
+            except (OSError, UnicodeDecodeError) as e:
+                print(f"[DEBUG] Skipping context file {path}: {e}")
+                continue
+            summary = self._summary(path) if names is not None else None
+            text = self._slice(content, summary, names) if summary is not None else content
+            ranked.append((distances[rel], len(text), rel, text))
+        ranked.sort()
+
+        context, used = {}, 0
+        for depth, size, rel, text in ranked:
+            if used + size > max_bytes:
+                continue
+            context[rel] = text
+            used += size
+        return context
+
+
+if __name__ == "__main__":
+    import time
+    import shutil
+    import tempfile
+    from code_parser import CodeParser
+
+    bench_dir = tempfile.mkdtemp(prefix="context_collector_bench_")
+    original_store = config.FAISS_STORE_PATH
+    config.FAISS_STORE_PATH = os.path.join(bench_dir, "store")
+    project_dir = os.path.join(bench_dir, "project")
+    try:
+        layers, width, helpers = 5, 6, 40
+        helper_body = "".join(f"def helper_{h}(value):\n    return [value * {h} for _ in range(3)]\n\n" for h in range(helpers))
+        for layer in range(layers):
+            package = os.path.join(project_dir, "app", f"layer{layer}")
+            os.makedirs(package)
+            open(os.path.join(project_dir, "app", "__init__.py"), "w").close()
+            open(os.path.join(package, "__init__.py"), "w").close()
+            for w in range(width):
+                lines = []
+                if layer + 1 < layers:
+                    lines.append(f"from app.layer{layer + 1}.mod{w} import entry_{w} as next_entry")
+                lines.append(helper_body)
+                call = "next_entry(value)" if layer + 1 < layers else "value"
+                lines.append(f"def entry_{w}(value):\n    return helper_{w}({call})\n")
+                with open(os.path.join(package, f"mod{w}.py"), "w") as f:
+                    f.write("\n".join(lines))
+        active = os.path.join(project_dir, "main.py")
+        with open(active, "w") as f:
+            f.write("".join(f"from app.layer0.mod{w} import entry_{w}\n" for w in range(width)))
+            f.write("print(" + " + ".join(f"entry_{w}(1)" for w in range(width)) + ")\n")
+
+        old = time.time() - 60
+        for root, _, names in os.walk(project_dir):
+            for name in names:
+                os.utime(os.path.join(root, name), (old, old))
+        parser = CodeParser(project_dir)
+
+        start = time.perf_counter()
+        imports = parser.extract_imports_from_file(active)
+        direct = {rel: parser.file_cache.content(path)
+                  for rel, path in parser.resolve_import_paths(imports, from_file=active).items()}
+        direct_ms = (time.perf_counter() - start) * 1e3
+
+        collector = ContextCollector(parser)
+        original_slice = config.CONTEXT_SLICE_SYMBOLS
+        config.CONTEXT_SLICE_SYMBOLS = False
+        whole = collector.collect(active, max_bytes=10 ** 9)
+        config.CONTEXT_SLICE_SYMBOLS = original_slice
+        collector.collect(active)
+        start = time.perf_counter()
+        sliced = collector.collect(active)
+        sliced_ms = (time.perf_counter() - start) * 1e3
+
+        def size(context):
+            return sum(len(text) for text in context.values()) / 1024
+
+        print(f"Direct imports, whole files:      {len(direct):3d} files {size(direct):7.1f} KB  {direct_ms:6.1f} ms")
+        print(f"Depth {config.CONTEXT_MAX_DEPTH}, whole files:            {len(whole):3d} files {size(whole):7.1f} KB")
+        print(f"Depth {config.CONTEXT_MAX_DEPTH}, sliced + byte budget:   {len(sliced):3d} files {size(sliced):7.1f} KB  "
+              f"{sliced_ms:6.1f} ms")
+        print(next(iter(sliced.values())))
+        parser.close()
+    finally:
+        config.FAISS_STORE_PATH = original_store
+        shutil.rmtree(bench_dir)
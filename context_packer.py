@@ -0,0 +1,197 @@
+import os
+import ast
+from typing import Optional, Dict, Any, List, Tuple, NamedTuple
+
+import config
+from keyword_index import BM25Index, tokenize
+
+
+class Chunk(NamedTuple):
+    source: str
+    start: int
+    end: int
+    name: str
+    text: str
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + config.CONTEXT_CHARS_PER_TOKEN - 1) // config.CONTEXT_CHARS_PER_TOKEN
+
+
+def _line_chunks(source: str, lines: List[str], first: int = 1, last: Optional[int] = None) -> List[Chunk]:
+    last = last if last is not None else len(lines)
+    window = config.CONTEXT_CHUNK_LINES
+    return [Chunk(source, start, min(start + window - 1, last), f"lines {start}-{min(start + window - 1, last)}",
+                  "\n".join(lines[start - 1:min(start + window - 1, last)]))
+            for start in range(first, last + 1, window)]
+
+
+def _python_chunks(source: str, code: str, lines: List[str]) -> List[Chunk]:
+    tree = ast.parse(code)
+    max_tokens = config.CONTEXT_CHUNK_MAX_TOKENS
+    chunks: List[Chunk] = []
+    pending: List[Tuple[int, int, ast.AST]] = []
+
+    def flush_pending():
+        if pending:
+            start, end = pending[0][0], pending[-1][1]
+            imports_only = all(isinstance(node, (ast.Import, ast.ImportFrom)) for _, _, node in pending)
+            chunks.append(Chunk(source, start, end, "imports" if imports_only else "module code",
+                                "\n".join(lines[start - 1:end])))
+            pending.clear()
+
+    for node in tree.body:
+        start = min([node.lineno] + [d.lineno for d in getattr(node, "decorator_list", [])])
+        end = node.end_lineno
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            pending.append((start, end, node))
+            continue
+        flush_pending()
+        text = "\n".join(lines[start - 1:end])
+        if isinstance(node, ast.ClassDef) and estimate_tokens(text) > max_tokens:
+            members = [m for m in node.body if isinstance(m, (ast.FunctionDef, ast.AsyncFunctionDef))]
+            header_end = (min([members[0].lineno] + [d.lineno for d in members[0].decorator_list]) - 1) if members else end
+            chunks.append(Chunk(source, start, header_end, f"class {node.name}", "\n".join(lines[start - 1:header_end])))
+            for member in members:
+                member_start = min([member.lineno] + [d.lineno for d in member.decorator_list])
+                chunks.append(Chunk(source, member_start, member.end_lineno, f"{node.name}.{member.name}",
+                                    "\n".join(lines[member_start - 1:member.end_lineno])))
+        elif estimate_tokens(text) > max_tokens:
+            chunks.extend(_line_chunks(source, lines, start, end))
+        else:
+            chunks.append(Chunk(source, start, end, node.name, text))
+    flush_pending()
+    return chunks
+
+
+def chunk_file(source: str, code: str) -> List[Chunk]:
+    lines = code.splitlines()
+    if source.split("::")[0].endswith(".py"):
+        try:
+            return _python_chunks(source, code, lines)
+        except (SyntaxError, ValueError):
+            pass
+    return _line_chunks(source, lines)
+
+
+def _assemble(chunks: List[Chunk], omitted: List[Chunk]) -> str:
+    pieces = sorted([(c.start, c.text) for c in chunks] +
+                    [(c.start, f"# ... omitted {c.name} (lines {c.start}-{c.end}) ...") for c in omitted])
+    return "\n\n".join(text for _, text in pieces)
+
+
+def pack_context(user_command: str, active_file_path: Optional[str], active_file_code: str,
+                 context_files: Dict[str, str], token_budget: Optional[int] = None) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+    budget = token_budget if token_budget is not None else config.CONTEXT_TOKEN_BUDGET
+    report: Dict[str, Any] = {"budget": budget, "used": 0, "active_file_abridged": False, "included": [], "dropped": []}
+    active_source = active_file_path or "active file"
+    active_tokens = estimate_tokens(active_file_code or "")
+    active_share = int(budget * config.CONTEXT_ACTIVE_FILE_SHARE)
+
+    candidates: List[Chunk] = []
+    if active_file_code and active_tokens > active_share:
+        candidates.extend(chunk_file(active_source, active_file_code))
+    for path, content in context_files.items():
+        if content:
+            candidates.extend(chunk_file(path, content))
+    if not candidates:
+        report["used"] = active_tokens
+        return active_file_code, dict(context_files), report
+
+    index = BM25Index(initial_capacity=len(candidates))
+    index.add_many(range(len(candidates)), [f"{c.source} {c.name} {c.text}" for c in candidates])
+    hits, _ = index.search(user_command, len(candidates))
+    relevance = dict(hits)
+    top = max(relevance.values(), default=0.0) or 1.0
+    query_terms = set(tokenize(user_command))
+    file_order = {path: rank for rank, path in enumerate(context_files)}
+
+    def score(i: int, chunk: Chunk) -> float:
+        value = relevance.get(i, 0.0) / top
+        if query_terms & set(tokenize(chunk.name)):
+            value += 0.5
+        if chunk.source == active_source:
+            value += 1.0 + (0.5 if chunk.name == "imports" else 0.0)
+        else:
+            value += 0.3 * 0.8 ** file_order.get(chunk.source, 0)
+        return value
+
+    ranked = sorted(((score(i, c), i, c) for i, c in enumerate(candidates)), key=lambda item: (-item[0], item[1]))
+    used = 0 if active_tokens > active_share else active_tokens
+    active_limit = active_share if active_tokens > active_share else 0
+    kept: Dict[str, List[Chunk]] = {}
+    dropped: Dict[str, List[Chunk]] = {}
+    active_used = 0
+    for value, _, chunk in ranked:
+        tokens = estimate_tokens(chunk.text)
+        is_active = chunk.source == active_source
+        fits = used + tokens <= budget and (not is_active or active_used + tokens <= active_limit)
+        if fits:
+            kept.setdefault(chunk.source, []).append(chunk)
+            used += tokens
+            active_used += tokens if is_active else 0
+            report["included"].append({"source": chunk.source, "name": chunk.name, "lines": [chunk.start, chunk.end],
+                                       "tokens": tokens, "score": round(value, 3)})
+        else:
+            dropped.setdefault(chunk.source, []).append(chunk)
+            report["dropped"].append({"source": chunk.source, "name": chunk.name, "lines": [chunk.start, chunk.end],
+                                      "tokens": tokens, "score": round(value, 3)})
+
+    if active_tokens > active_share:
+        report["active_file_abridged"] = True
+        active_text = _assemble(kept.get(active_source, []), dropped.get(active_source, []))
+    else:
+        active_text = active_file_code
+    packed = {}
+    for path in sorted((p for p in kept if p != active_source),
+                       key=lambda p: file_order.get(p, len(file_order))):
+        whole = path not in dropped
+        packed[path] = context_files[path] if whole else _assemble(kept[path], [])
+    report["used"] = used
+    return active_text, packed, report
+
+
+def describe_report(report: Dict[str, Any]) -> str:
+    dropped = report["dropped"]
+    text = (f"Context: {len(report['included'])} chunks, ~{report['used']} of {report['budget']} tokens"
+            f"{', active file abridged' if report['active_file_abridged'] else ''}.")
+    if dropped:
+        dropped_tokens = sum(d["tokens"] for d in dropped)
+        names = ", ".join(f"{os.path.basename(d['source'].split('::')[0])}:{d['name']}" for d in dropped[:8])
+        text += f" Dropped {len(dropped)} chunks (~{dropped_tokens} tokens): {names}{' ...' if len(dropped) > 8 else ''}"
+    return text
+
+
+if __name__ == "__main__":
+    import time
+    import random
+
+    rng = random.Random(0)
+    def make_module(name: str, functions: int) -> str:
+        parts = ["import os\nimport json\nfrom typing import Dict, List\n", f"LIMIT = {functions}\n"]
+        for j in range(functions):
+            topic = rng.choice(["cache", "parser", "socket", "render", "token", "budget"])
+            parts.append(f"def {topic}_{name}_{j}(items: List[str]) -> Dict[str, int]:\n"
+                         f"    counts = {{}}\n    for item in items:\n        counts[item] = counts.get(item, 0) + {j}\n"
+                         f"    return {{k: v for k, v in counts.items() if v < LIMIT}}\n")
+        parts.append(f"class {name.title()}Service:\n" + "".join(
+            f"    def handle_{m}(self, payload):\n        return json.dumps(payload)[:{m + 10}]\n\n" for m in range(40)))
+        return "\n\n".join(parts)
+
+    active_code = make_module("active", 80)
+    context = {f"pkg/module_{i}.py": make_module(f"module{i}", 60) for i in range(12)}
+    context["README.md"] = "\n".join(f"Line {i}: notes about the token budget and cache design." for i in range(400))
+    command = "why does the token budget cache overflow in token_active_3"
+    raw_tokens = estimate_tokens(active_code) + sum(estimate_tokens(c) for c in context.values())
+
+    rounds = 20
+    start = time.perf_counter()
+    for _ in range(rounds):
+        active_text, packed, report = pack_context(command, "app/active.py", active_code, context)
+    elapsed_ms = (time.perf_counter() - start) / rounds * 1e3
+    packed_tokens = estimate_tokens(active_text) + sum(estimate_tokens(c) for c in packed.values())
+
+    print(f"Unpacked prompt context: ~{raw_tokens} tokens across {len(context) + 1} files")
+    print(f"Packed to budget {report['budget']}: ~{packed_tokens} tokens in {elapsed_ms:.1f} ms")
+    print(describe_report(report)[:400])
+    print("Top chunks:", [(d["source"], d["name"]) for d in report["included"][:5]])
@@ -0,0 +1,161 @@
+import json
+import threading
+from typing import Optional, Dict, Any, List, Callable, Tuple
+
+from langchain_core.messages import HumanMessage, AIMessage, BaseMessage
+
+import config
+from context_packer import estimate_tokens
+
+
+def compact_response(raw: str) -> str:
+    text = raw.strip()
+    if text.startswith("```"):
+        text = text.strip("`")
+        text = text[text.find("\n") + 1:] if "\n" in text else text
+    try:
+        parsed = json.loads(text)
+    except ValueError:
+        return raw
+    if not isinstance(parsed, dict):
+        return raw
+    guidance = str(parsed.get("Guidance") or "").strip()
+    code = parsed.get("Suggested code")
+    if code and str(code).strip().lower() != "none":
+        guidance += f" [Suggested {len(str(code).splitlines())} lines of code, not repeated here]"
+    return guidance or raw
+
+
+def fallback_summary(summary: str, transcript: str, max_tokens: int) -> str:
+    lines = [line for line in (summary.splitlines() + transcript.splitlines()) if line.strip()]
+    kept: List[str] = []
+    used = 0
+    for line in reversed(lines):
+        line = line if len(line) <= 300 else line[:297] + "..."
+        cost = estimate_tokens(line)
+        if used + cost > max_tokens:
+            break
+        kept.append(line)
+        used += cost
+    return "\n".join(reversed(kept))
+
+
+class RollingConversationMemory:
+    def __init__(self, summarizer: Optional[Callable[[str, str], str]] = None, max_turns: Optional[int] = None,
+                 token_budget: Optional[int] = None, summary_tokens: Optional[int] = None,
+                 background: bool = True):
+        self.summarizer = summarizer
+        self.max_turns = max_turns if max_turns is not None else config.SHORT_TERM_MAX_TURNS
+        self.token_budget = token_budget if token_budget is not None else config.SHORT_TERM_TOKEN_BUDGET
+        self.summary_tokens = summary_tokens if summary_tokens is not None else config.SHORT_TERM_SUMMARY_TOKENS
+        self.background = background
+        self.summary = ""
+        self._turns: List[Tuple[str, str, str]] = []
+        self._pending: List[Tuple[str, str, str]] = []
+        self._messages: List[BaseMessage] = []
+        self._lock = threading.RLock()
+        self._folding = False
+        self._generation = 0
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        with self._lock:
+            return list(self._messages)
+
+    @staticmethod
+    def _render(turn: Tuple[str, str, str], full: bool = False) -> str:
+        human, raw, compact = turn
+        return f"Human: {human}\nAI: {raw if full else compact}"
+
+    def _turn_tokens(self, turn: Tuple[str, str, str]) -> int:
+        return estimate_tokens(self._render(turn))
+
+    def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, Any]):
+        human, raw = str(inputs.get("input", "")), str(outputs.get("output", ""))
+        with self._lock:
+            self._messages.extend([HumanMessage(content=human), AIMessage(content=raw)])
+            self._turns.append((human, raw, compact_response(raw)))
+            budget = self.token_budget - estimate_tokens(self.summary)
+            while len(self._turns) > 1 and (len(self._turns) > self.max_turns or
+                                            sum(map(self._turn_tokens, self._turns)) > budget):
+                self._pending.append(self._turns.pop(0))
+            start_fold = bool(self._pending) and not self._folding
+            if start_fold:
+                self._folding = True
+        if start_fold:
+            if self.background:
+                threading.Thread(target=self._fold, daemon=True).start()
+            else:
+                self._fold()
+
+    def _fold(self):
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._folding = False
+                    return
+                batch, summary, generation = list(self._pending), self.summary, self._generation
+            transcript = "\n".join(self._render(turn) for turn in batch)
+            updated = None
+            if self.summarizer is not None:
+                try:
+                    updated = self.summarizer(summary, transcript)
+                except Exception as e:
+                    print(f"[DEBUG] Conversation summary update failed, using a trimmed transcript: {e}")
+            if not updated or estimate_tokens(updated) > self.summary_tokens * 2:
+                updated = fallback_summary(updated or summary, "" if updated else transcript, self.summary_tokens)
+            with self._lock:
+                if generation != self._generation:
+                    self._folding = False
+                    return
+                self.summary = updated.strip()
+                del self._pending[:len(batch)]
+
+    def load_memory_variables(self, inputs: Optional[Dict[str, Any]] = None) -> Dict[str, str]:
+        with self._lock:
+            parts = []
+            if self.summary:
+                parts.append(f"Summary of earlier conversation:\n{self.summary}")
+            # Turns still waiting to be folded stay visible in compact form so nothing disappears meanwhile.
+            parts.extend(self._render(turn) for turn in self._pending)
+            last = len(self._turns) - 1
+            for i, turn in enumerate(self._turns):
+                full = i == last and estimate_tokens(self._render(turn, True)) <= self.token_budget // 2
+                parts.append(self._render(turn, full))
+            return {"current_conversation_history": "\n".join(parts)}
+
+    def clear(self):
+        with self._lock:
+            self.summary = ""
+            self._turns.clear()
+            self._pending.clear()
+            self._messages.clear()
+            self._generation += 1
+
+
+if __name__ == "__main__":
+    import time
+
+    def fake_summarizer(summary, transcript):
+        time.sleep(0.05)
+        asked = [line[len("Human: "):] for line in transcript.splitlines() if line.startswith("Human: ")]
+        return (summary + "\n" if summary else "") + "; ".join(f"User asked to {q}" for q in asked)
+
+    code = "\n".join(f"def step_{i}(data):\n    return [d * {i} for d in data]" for i in range(40))
+    turns = 60
+    raw_sizes, rolling_sizes = [], []
+    transcript = []
+    memory = RollingConversationMemory(summarizer=fake_summarizer, background=False)
+    for turn in range(turns):
+        question = f"review the loop in step_{turn} and explain the edge cases"
+        answer = json.dumps({"Guidance": f"Step {turn} multiplies every item; an empty list returns []. "
+                                         f"Consider validating the input type first.", "Suggested code": code})
+        transcript.append(f"Human: {question}\nAI: {answer}")
+        memory.save_context({"input": question}, {"output": answer})
+        raw_sizes.append(estimate_tokens("\n".join(transcript)))
+        rolling_sizes.append(estimate_tokens(memory.load_memory_variables({})["current_conversation_history"]))
+
+    for turn in (1, 5, 10, 30, 60):
+        print(f"Turn {turn:3d}: full buffer ~{raw_sizes[turn - 1]:6d} tokens, rolling memory ~{rolling_sizes[turn - 1]:5d} tokens")
+    print(f"Summary so far ({estimate_tokens(memory.summary)} tokens): {memory.summary[:160]}...")
+    print(f"Messages kept for long-term save: {len(memory.messages)}")
@@ -0,0 +1,124 @@
+import os
+import json
+import hashlib
+import threading
+from typing import Optional, Dict, Tuple, List, Set
+
+import numpy as np
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingSidecar:
+    def __init__(self, base_path: str):
+        self.vectors_path = base_path + ".vectors.f32"
+        self.index_path = base_path + ".vectors.idx"
+        os.makedirs(os.path.dirname(os.path.abspath(base_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._index: Dict[Tuple[str, str], Tuple[int, int]] = {}
+        self._data = np.zeros(0, dtype=np.float32)
+        self._pending: Dict[Tuple[str, str], np.ndarray] = {}
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.vectors_path) or not os.path.exists(self.index_path):
+            return
+        size = os.path.getsize(self.vectors_path) // 4
+        self._data = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(size,)) if size else self._data
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                offset, dim = entry["offset"], entry["dim"]
+                if offset % 4 or offset // 4 + dim > self._data.size:
+                    continue
+                self._index[(entry["hash"], entry["model"])] = (offset // 4, dim)
+
+    def __len__(self) -> int:
+        return len(self._index) + len(self._pending)
+
+    def get(self, text_hash: str, model: str) -> Optional[np.ndarray]:
+        key = (text_hash, model)
+        if key in self._pending:
+            return self._pending[key]
+        location = self._index.get(key)
+        if location is None:
+            return None
+        start, dim = location
+        return self._data[start:start + dim]
+
+    def put_many(self, entries: List[Tuple[str, str, List[float]]]):
+        with self._lock:
+            new_entries = [(h, m, np.asarray(v, dtype=np.float32)) for h, m, v in entries
+                           if (h, m) not in self._index and (h, m) not in self._pending]
+            if not new_entries:
+                return
+            with open(self.vectors_path, "ab") as vf:
+                offset = vf.tell()
+                if offset % 4:
+                    vf.write(b"\0" * (4 - offset % 4))
+                    offset += 4 - offset % 4
+                index_lines = []
+                for text_hash, model, vector in new_entries:
+                    vf.write(vector.tobytes())
+                    index_lines.append(json.dumps({"hash": text_hash, "model": model, "offset": offset, "dim": int(vector.size)}))
+                    self._pending[(text_hash, model)] = vector
+                    offset += vector.nbytes
+            with open(self.index_path, "a", encoding="utf-8") as idx:
+                idx.write("\n".join(index_lines) + "\n")
+
+    def put(self, text_hash: str, model: str, vector: List[float]):
+        self.put_many([(text_hash, model, vector)])
+
+    def retain(self, keys: Set[Tuple[str, str]]):
+        with self._lock:
+            kept = [(h, m, self.get(h, m)) for h, m in list(self._index.keys()) + list(self._pending.keys()) if (h, m) in keys]
+            vectors_tmp, index_tmp = self.vectors_path + ".tmp", self.index_path + ".tmp"
+            with open(vectors_tmp, "wb") as vf, open(index_tmp, "w", encoding="utf-8") as idx:
+                offset = 0
+                for text_hash, model, vector in kept:
+                    vf.write(vector.tobytes())
+                    idx.write(json.dumps({"hash": text_hash, "model": model, "offset": offset, "dim": int(vector.size)}) + "\n")
+                    offset += vector.nbytes
+                vf.flush()
+                os.fsync(vf.fileno())
+                idx.flush()
+                os.fsync(idx.fileno())
+            self.close()
+            # Drop the old index first: a crash between the two renames must not pair old offsets with new data.
+            if os.path.exists(self.index_path):
+                os.remove(self.index_path)
+            os.replace(vectors_tmp, self.vectors_path)
+            os.replace(index_tmp, self.index_path)
+            self._index, self._pending = {}, {}
+            self._load()
+
+    def close(self):
+        # Windows refuses to replace or delete a file that still has a mapped view.
+        self._data = np.zeros(0, dtype=np.float32)
+
+
+if __name__ == "__main__":
+    import shutil
+    import tempfile
+    import time
+
+    test_dir = tempfile.mkdtemp(prefix="embedding_sidecar_")
+    try:
+        base = os.path.join(test_dir, "memory_store.jsonl")
+        rng = np.random.default_rng(0)
+        count, dim = 100_000, 768
+        sidecar = EmbeddingSidecar(base)
+        sidecar.put_many([(content_hash(f"message {i}"), "models/embedding-001", rng.normal(size=dim)) for i in range(count)])
+
+        start = time.perf_counter()
+        reopened = EmbeddingSidecar(base)
+        hits = sum(reopened.get(content_hash(f"message {i}"), "models/embedding-001") is not None for i in range(count))
+        print(f"Loaded {hits}/{count} cached vectors in {time.perf_counter() - start:.2f}s")
+        print("Other model cached:", reopened.get(content_hash("message 0"), "models/text-embedding-004") is not None)
+    finally:
+        shutil.rmtree(test_dir)
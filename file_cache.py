@@ -0,0 +1,228 @@
+import os
+import ast
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Callable
+
+import config
+
+# Files modified this recently may change again within the same mtime tick, so they are re-hashed on every hit.
+_RACY_WINDOW_NS = 2_000_000_000
+
+
+class FileCache:
+    def __init__(self, max_bytes: Optional[int] = None, disk_dir: Optional[str] = None, use_disk: Optional[bool] = None):
+        self.max_bytes = max_bytes if max_bytes is not None else config.FILE_CACHE_MAX_BYTES
+        use_disk = use_disk if use_disk is not None else config.FILE_CACHE_DISK_ENABLED
+        self.disk_dir = (disk_dir or os.path.join(config.FAISS_STORE_PATH, "file_cache")) if use_disk else None
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self.stats = {"hits": 0, "disk_hits": 0, "reads": 0, "parses": 0, "evictions": 0}
+
+    @staticmethod
+    def _key(path: str) -> str:
+        return os.path.normcase(os.path.normpath(os.path.abspath(path)))
+
+    @staticmethod
+    def _is_racy(stat: os.stat_result) -> bool:
+        return time.time_ns() - stat.st_mtime_ns < _RACY_WINDOW_NS
+
+    def _cost(self, entry: Dict[str, Any]) -> int:
+        content_bytes = entry["size"] if entry.get("content") is not None else 0
+        tree_bytes = entry["size"] * config.FILE_CACHE_AST_COST_FACTOR if entry.get("tree") is not None else 0
+        return 256 + content_bytes + tree_bytes + sum(len(name) + 64 + self._summary_bytes(value)
+                                                      for name, value in entry["summaries"].items())
+
+    @staticmethod
+    def _summary_bytes(value: Any) -> int:
+        # Summaries are persisted as JSON, so their serialized length is a cheap stand-in for their footprint.
+        try:
+            return len(json.dumps(value, default=str))
+        except (TypeError, ValueError):
+            return len(repr(value))
+
+    def _store(self, key: str, entry: Dict[str, Any]):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old["cost"]
+        entry["cost"] = self._cost(entry)
+        self._entries[key] = entry
+        self._bytes += entry["cost"]
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted["cost"]
+            self.stats["evictions"] += 1
+
+    def _disk_path(self, key: str) -> Optional[str]:
+        if self.disk_dir is None:
+            return None
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.disk_dir, digest[:2], digest + ".json")
+
+    def _load_disk(self, key: str, stat: os.stat_result) -> Optional[Dict[str, Any]]:
+        disk_path = self._disk_path(key)
+        if disk_path is None or not os.path.exists(disk_path):
+            return None
+        try:
+            with open(disk_path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[DEBUG] Ignoring file cache entry {disk_path}: {e}")
+            return None
+        if stored.get("path") != key or stored.get("mtime") != stat.st_mtime_ns or stored.get("size") != stat.st_size:
+            return None
+        return {"mtime": stat.st_mtime_ns, "size": stat.st_size, "hash": stored.get("hash"),
+                "content": None, "tree": None, "summaries": stored.get("summaries", {})}
+
+    def _save_disk(self, key: str, entry: Dict[str, Any]):
+        disk_path = self._disk_path(key)
+        if disk_path is None:
+            return
+        try:
+            os.makedirs(os.path.dirname(disk_path), exist_ok=True)
+            tmp_path = disk_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"path": key, "mtime": entry["mtime"], "size": entry["size"], "hash": entry["hash"],
+                           "summaries": entry["summaries"]}, f)
+            os.replace(tmp_path, disk_path)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"[DEBUG] Failed to write file cache entry {disk_path}: {e}")
+
+    def _read(self, key: str, path: str, stat: os.stat_result, known: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        with open(path, "rb") as f:
+            raw = f.read()
+        self.stats["reads"] += 1
+        content_hash = hashlib.sha256(raw).hexdigest()
+        # Universal newlines, as text-mode open() gave: CRLF files must not leak "\r" into prompts and snippets.
+        content = raw.decode("utf-8").replace("\r\n", "\n").replace("\r", "\n")
+        same = known is not None and known.get("hash") == content_hash
+        entry = {
+            "mtime": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "hash": content_hash,
+            "content": content,
+            "tree": known["tree"] if same else None,
+            "summaries": known["summaries"] if same else {},
+        }
+        self._store(key, entry)
+        if same and (known["mtime"] != stat.st_mtime_ns or known["size"] != stat.st_size) and entry["summaries"]:
+            self._save_disk(key, entry)
+        return entry
+
+    def _lookup(self, path: str, need_content: bool) -> Dict[str, Any]:
+        key = self._key(path)
+        stat = os.stat(path)
+        entry = self._entries.get(key)
+        fresh = entry is not None and entry["mtime"] == stat.st_mtime_ns and entry["size"] == stat.st_size
+        if fresh and not self._is_racy(stat) and (entry["content"] is not None or not need_content):
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry
+        if entry is None and not need_content and not self._is_racy(stat):
+            entry = self._load_disk(key, stat)
+            if entry is not None:
+                self.stats["disk_hits"] += 1
+                self._store(key, entry)
+                return entry
+        return self._read(key, path, stat, entry or self._load_disk(key, stat))
+
+    def content(self, path: str) -> str:
+        with self._lock:
+            return self._lookup(path, need_content=True)["content"]
+
+    def tree(self, path: str) -> ast.Module:
+        with self._lock:
+            entry = self._lookup(path, need_content=True)
+            if entry["tree"] is None:
+                entry["tree"] = ast.parse(entry["content"], filename=path)
+                self.stats["parses"] += 1
+                self._store(self._key(path), entry)
+            return entry["tree"]
+
+    def summary(self, path: str, name: str, compute: Callable[[ast.Module], Any]) -> Any:
+        with self._lock:
+            entry = self._lookup(path, need_content=False)
+            if name in entry["summaries"]:
+                return entry["summaries"][name]
+            if entry["content"] is None:
+                entry = self._lookup(path, need_content=True)
+            tree = entry["tree"]
+            if tree is None:
+                tree = ast.parse(entry["content"], filename=path)
+                self.stats["parses"] += 1
+            value = compute(tree)
+            entry["summaries"][name] = value
+            self._store(self._key(path), entry)
+            self._save_disk(self._key(path), entry)
+            return value
+
+    def memory_bytes(self) -> int:
+        return self._bytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+if __name__ == "__main__":
+    import shutil
+    import tempfile
+
+    bench_dir = tempfile.mkdtemp(prefix="file_cache_bench_")
+    try:
+        sources = []
+        for i in range(200):
+            path = os.path.join(bench_dir, f"module_{i}.py")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("import os\nfrom typing import Dict, Any\n")
+                for j in range(200):
+                    f.write(f"def function_{j}(value: int) -> int:\n    return value * {j} + len(os.sep)\n\n")
+            sources.append(path)
+        old = time.time() - 60
+        for path in sources:
+            os.utime(path, (old, old))
+
+        def imports_of(tree: ast.Module) -> list:
+            return sorted(node.module for node in ast.walk(tree) if isinstance(node, ast.ImportFrom) and node.module)
+
+        def uncached():
+            for path in sources:
+                with open(path, "r", encoding="utf-8") as f:
+                    imports_of(ast.parse(f.read(), filename=path))
+
+        rounds = 5
+        start = time.perf_counter()
+        for _ in range(rounds):
+            uncached()
+        uncached_ms = (time.perf_counter() - start) / rounds * 1e3
+
+        cache = FileCache(disk_dir=os.path.join(bench_dir, "cache"), use_disk=True)
+        start = time.perf_counter()
+        for path in sources:
+            cache.summary(path, "imports", imports_of)
+        cold_ms = (time.perf_counter() - start) * 1e3
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for path in sources:
+                cache.summary(path, "imports", imports_of)
+        warm_ms = (time.perf_counter() - start) / rounds * 1e3
+
+        restarted = FileCache(disk_dir=os.path.join(bench_dir, "cache"), use_disk=True)
+        start = time.perf_counter()
+        for path in sources:
+            restarted.summary(path, "imports", imports_of)
+        disk_ms = (time.perf_counter() - start) * 1e3
+
+        print(f"{len(sources)} files, {sum(os.path.getsize(p) for p in sources) / 1e6:.1f} MB")
+        print(f"read + parse every time:   {uncached_ms:8.1f} ms/pass")
+        print(f"cache, first pass:         {cold_ms:8.1f} ms")
+        print(f"cache, unchanged files:    {warm_ms:8.1f} ms/pass")
+        print(f"cache, after restart:      {disk_ms:8.1f} ms ({restarted.stats['disk_hits']} disk hits, {restarted.stats['reads']} reads)")
+        print(f"memory held: {cache.memory_bytes() / 1e6:.1f} MB of {cache.max_bytes / 1e6:.0f} MB budget")
+    finally:
+        shutil.rmtree(bench_dir)
@@ -0,0 +1,276 @@
+import os
+import re
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, List, Tuple, Set
+
+import numpy as np
+
+import config
+
+_CANDIDATE_POSTINGS = 20_000
+_NON_ALNUM = re.compile(r"[^a-z0-9]")
+_SPOKEN_SEPARATORS = [(r"\bdot\b", "."), (r"\bunderscore\b", "_"), (r"\b(?:back)?slash\b", "/"), (r"\bdash\b", "-")]
+
+
+def normalize(text: str) -> str:
+    return _NON_ALNUM.sub("", text.lower())
+
+
+def normalize_spoken(text: str) -> str:
+    text = text.lower()
+    for pattern, replacement in _SPOKEN_SEPARATORS:
+        text = re.sub(pattern, replacement, text)
+    return normalize(text)
+
+
+def trigrams(text: str) -> Set[str]:
+    padded = f" {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class _Postings:
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._lists: List[List[int]] = []
+        self._arrays: List[np.ndarray] = []
+
+    def add(self, doc: int, grams: Set[str]):
+        for gram in grams:
+            gram_id = self._ids.get(gram)
+            if gram_id is None:
+                gram_id = len(self._lists)
+                self._ids[gram] = gram_id
+                self._lists.append([])
+                self._arrays.append(np.zeros(0, dtype=np.int64))
+            self._lists[gram_id].append(doc)
+
+    def get(self, gram: str) -> Optional[np.ndarray]:
+        gram_id = self._ids.get(gram)
+        if gram_id is None:
+            return None
+        docs, array = self._lists[gram_id], self._arrays[gram_id]
+        if array.size < len(docs):
+            array = np.concatenate([array, np.asarray(docs[array.size:], dtype=np.int64)])
+            self._arrays[gram_id] = array
+        return array
+
+
+class FileFinder:
+    def __init__(self, file_index=None, persist: Optional[bool] = None):
+        self.file_index = file_index
+        self.min_score = config.FILE_FINDER_MIN_SCORE
+        persist = persist if persist is not None else file_index is not None
+        if persist and file_index is not None:
+            digest = hashlib.sha1(file_index.project_dir.encode("utf-8")).hexdigest()
+            self.recent_path = os.path.join(config.FAISS_STORE_PATH, "file_finder", digest + ".json")
+        else:
+            self.recent_path = None
+        self._lock = threading.RLock()
+        self._source = None
+        self._recent: "OrderedDict[str, None]" = OrderedDict()
+        self._reset()
+        self._load_recent()
+
+    def _reset(self):
+        self._ids: Dict[str, int] = {}
+        self._rels: List[Optional[str]] = []
+        self._paths: List[Optional[str]] = []
+        self._names: List[str] = []
+        self._stems: List[str] = []
+        self._dir_names: List[str] = []
+        self._alive = np.zeros(1024, dtype=bool)
+        self._base = _Postings()
+        self._dirs = _Postings()
+        self._dead = 0
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _load_recent(self):
+        if self.recent_path is None or not os.path.exists(self.recent_path):
+            return
+        try:
+            with open(self.recent_path, "r", encoding="utf-8") as f:
+                self._recent = OrderedDict((rel, None) for rel in json.load(f))
+        except (OSError, ValueError, TypeError) as e:
+            print(f"[DEBUG] Ignoring recent files list {self.recent_path}: {e}")
+
+    def _save_recent(self):
+        if self.recent_path is None:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.recent_path), exist_ok=True)
+            tmp_path = self.recent_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(list(self._recent), f)
+            os.replace(tmp_path, self.recent_path)
+        except OSError as e:
+            print(f"[DEBUG] Failed to save recent files list {self.recent_path}: {e}")
+
+    def _add(self, rel: str, path: str):
+        doc = len(self._rels)
+        if doc >= self._alive.shape[0]:
+            capacity = self._alive.shape[0] * 2
+            self._alive = np.concatenate([self._alive, np.zeros(capacity - self._alive.shape[0], dtype=bool)])
+        name = normalize(os.path.basename(rel))
+        name_grams = trigrams(name)
+        self._ids[rel] = doc
+        self._rels.append(rel)
+        self._paths.append(path)
+        self._names.append(name)
+        self._stems.append(normalize(os.path.splitext(os.path.basename(rel))[0]))
+        self._dir_names.append(normalize(os.path.dirname(rel)))
+        self._alive[doc] = True
+        self._base.add(doc, name_grams)
+        self._dirs.add(doc, trigrams(self._dir_names[doc]) - name_grams)
+
+    def sync(self, files: Dict[str, str]):
+        with self._lock:
+            if files is self._source:
+                return
+            removed = [rel for rel in self._ids if rel not in files]
+            if self._dead + len(removed) > len(self._ids) // 2 + 1024:
+                self._reset()
+                removed = []
+            for rel in removed:
+                doc = self._ids.pop(rel)
+                self._alive[doc] = False
+                self._rels[doc] = self._paths[doc] = None
+                self._dead += 1
+            for rel, path in files.items():
+                if rel not in self._ids:
+                    self._add(rel, path)
+            self._source = files
+
+    def refresh(self):
+        if self.file_index is None:
+            return
+        self.file_index.refresh()
+        view = self.file_index.files()
+        if view is not self._source:
+            self.sync(view)
+            self._source = view
+
+    def touch(self, path: str):
+        rel = path
+        if self.file_index is not None and os.path.isabs(path):
+            rel = os.path.relpath(path, self.file_index.project_dir)
+        with self._lock:
+            self._recent.pop(rel, None)
+            self._recent[rel] = None
+            while len(self._recent) > config.FILE_FINDER_RECENT_LIMIT:
+                self._recent.popitem(last=False)
+        self._save_recent()
+
+    def _counts(self, postings: _Postings, grams: Set[str], size: int) -> Optional[np.ndarray]:
+        arrays = sorted((docs for docs in map(postings.get, grams) if docs is not None), key=len)
+        picked, total = [], 0
+        # Candidates come from the rarest trigrams; common ones (".py", "src") only matter when reranking.
+        for docs in arrays:
+            if picked and total + docs.size > _CANDIDATE_POSTINGS:
+                break
+            picked.append(docs)
+            total += docs.size
+        if not picked:
+            return None
+        return np.bincount(np.concatenate(picked), minlength=size)
+
+    def _score(self, doc: int, query: str, grams: Set[str]) -> float:
+        name = self._names[doc]
+        name_grams = trigrams(name)
+        score = len(grams & name_grams) / max(len(name_grams), len(grams))
+        dir_grams = trigrams(self._dir_names[doc]) - name_grams
+        score += 0.25 * len(grams & dir_grams) / len(grams)
+        if query == name or query == self._stems[doc]:
+            score += 1.0
+        elif query in name:
+            score += 0.5
+        return score
+
+    def find(self, query: str, limit: int = 5) -> List[Tuple[str, str, float]]:
+        query = normalize_spoken(query)
+        if not query:
+            return []
+        grams = trigrams(query)
+        with self._lock:
+            size = len(self._rels)
+            base = self._counts(self._base, grams, size)
+            dirs = self._counts(self._dirs, grams, size)
+            if base is None and dirs is None:
+                coarse = None
+            elif dirs is None:
+                coarse = base
+            else:
+                coarse = dirs * 0.25 if base is None else base + dirs * 0.25
+            candidates = set()
+            if coarse is not None:
+                hits = np.flatnonzero(coarse >= coarse.max() * 0.5)
+                shortlist = max(limit * 8, 32)
+                if hits.size > shortlist:
+                    hits = hits[np.argpartition(-coarse[hits], shortlist - 1)[:shortlist]]
+                candidates.update(hits.tolist())
+            recent = list(reversed(self._recent))
+            candidates.update(self._ids[rel] for rel in recent if rel in self._ids)
+
+            ranked = []
+            recency = {rel: rank for rank, rel in enumerate(recent)}
+            for doc in candidates:
+                if not self._alive[doc]:
+                    continue
+                score = self._score(doc, query, grams)
+                if score <= 0:
+                    continue
+                rank = recency.get(self._rels[doc])
+                if rank is not None:
+                    score += config.FILE_FINDER_RECENCY_WEIGHT * 0.8 ** rank
+                if score >= self.min_score:
+                    ranked.append((score, self._rels[doc], self._paths[doc]))
+            ranked.sort(key=lambda item: (-item[0], len(item[1]), item[1]))
+            return [(rel, path, score) for score, rel, path in ranked[:limit]]
+
+
+if __name__ == "__main__":
+    import time
+    import random
+
+    rng = random.Random(0)
+    words = ["memory", "shard", "index", "parser", "vector", "store", "config", "handler", "manager", "utils",
+             "client", "server", "model", "view", "cache", "writer", "reader", "graph", "token", "stream"]
+    files = {}
+    while len(files) < 100_000:
+        directory = os.path.join(*rng.sample(["src", "lib", "app", "core", "api", "tests", "tools", "legacy"], 2),
+                                 f"pkg{rng.randrange(400)}")
+        name = "_".join(rng.sample(words, rng.choice([1, 2, 3]))) + rng.choice([".py", ".py", ".json", ".md"])
+        files[os.path.join(directory, name)] = os.path.join("/project", directory, name)
+    target = os.path.join("src", "core", "pkg7", "code_parser.py")
+    files[target] = os.path.join("/project", target)
+
+    finder = FileFinder()
+    start = time.perf_counter()
+    finder.sync(files)
+    build_s = time.perf_counter() - start
+
+    queries = ["code parser dot py", "code_parser.py", "cod parsr", "codeparser", "vector store", "memory shard index"]
+    for query in queries:
+        finder.find(query)
+    rounds = 200
+    print(f"{len(files)} paths indexed in {build_s:.2f}s")
+    for query in queries:
+        start = time.perf_counter()
+        for _ in range(rounds):
+            results = finder.find(query)
+        elapsed_ms = (time.perf_counter() - start) / rounds * 1e3
+        print(f"{query!r:>24}: {elapsed_ms:.3f} ms -> {results[0][0] if results else None}")
+
+    start = time.perf_counter()
+    for _ in range(20):
+        next((path for path in files.values() if "codeparser" in os.path.basename(path).replace("_", "")), None)
+    print(f"Old substring scan over basenames: {(time.perf_counter() - start) / 20 * 1e3:.1f} ms")
+
+    before = finder.find("vector store")[0][0]
+    runner_up = finder.find("vector store")[1][0]
+    finder.touch(runner_up)
+    print(f"Recency boost: 'vector store' -> {before} before, {finder.find('vector store')[0][0]} after opening it")
@@ -0,0 +1,331 @@
+import os
+import json
+import time
+import atexit
+import hashlib
+import threading
+from typing import Optional, Dict, Any, List, Set, Iterable
+
+import config
+from path_scanner import IgnoreRules
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+
+class _DirtyDirHandler(FileSystemEventHandler):
+    def __init__(self, index: "FileIndex"):
+        self.index = index
+
+    def on_any_event(self, event):
+        for path in [getattr(event, "src_path", None), getattr(event, "dest_path", None)]:
+            if path:
+                self.index.mark_dirty(os.path.dirname(os.fsdecode(path)))
+                if event.is_directory:
+                    self.index.mark_dirty(os.fsdecode(path))
+
+
+class FileIndex:
+    def __init__(self, project_dir: str, ignore_hidden: bool = True, follow_symlinks: bool = False,
+                 persist: Optional[bool] = None, use_watcher: Optional[bool] = None,
+                 rules: Optional[IgnoreRules] = None):
+        self.project_dir = os.path.abspath(project_dir)
+        self.ignore_hidden = ignore_hidden
+        self.follow_symlinks = follow_symlinks
+        self.rules = rules if rules is not None else IgnoreRules(self.project_dir)
+        self.persist = persist if persist is not None else config.FILE_INDEX_PERSIST
+        self.full_poll_interval = config.FILE_INDEX_FULL_POLL_INTERVAL
+        key = (f"{self.project_dir}|{ignore_hidden}|{follow_symlinks}|{sorted(self.rules.exclude)}"
+               f"|{self.rules.use_gitignore}|{self.rules.skip_virtualenvs}")
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        self.snapshot_path = os.path.join(config.FAISS_STORE_PATH, "file_index", digest + ".json")
+        self._dirs: Dict[str, Dict[str, Any]] = {}
+        self._paths: Dict[str, str] = {}
+        self._dir_paths: Set[str] = set()
+        self._views: Dict[Optional[frozenset], Dict[str, str]] = {}
+        self._dirty: Set[str] = set()
+        self.epoch = 0
+        self._lock = threading.RLock()
+        self._changed = False
+        self._unsaved = False
+        self._last_save = time.monotonic()
+        self._last_full_poll = float("-inf")
+        self._observer = None
+        self.last_refresh = {"rescanned_dirs": 0, "checked_dirs": 0, "ms": 0.0}
+
+        self._load_snapshot()
+        atexit.register(self.close)
+        if use_watcher if use_watcher is not None else config.FILE_INDEX_USE_WATCHER:
+            self._start_watcher()
+        self.refresh(full=True)
+
+    def _start_watcher(self):
+        if Observer is None:
+            return
+        try:
+            self._observer = Observer()
+            self._observer.schedule(_DirtyDirHandler(self), self.project_dir, recursive=True)
+            self._observer.start()
+        except Exception as e:
+            print(f"[DEBUG] File watcher unavailable for {self.project_dir}, polling instead: {e}")
+            self._observer = None
+
+    def mark_dirty(self, abs_dir: str):
+        rel_dir = self._rel(abs_dir)
+        if rel_dir is None:
+            return
+        with self._lock:
+            self._dirty.add(rel_dir)
+            self.epoch += 1
+
+    def _rel(self, abs_path: str) -> Optional[str]:
+        rel_path = os.path.relpath(os.path.abspath(abs_path), self.project_dir)
+        if rel_path == os.curdir:
+            return ""
+        if rel_path.startswith(os.pardir):
+            return None
+        return rel_path
+
+    def _abs(self, rel_path: str) -> str:
+        return os.path.join(self.project_dir, rel_path) if rel_path else self.project_dir
+
+    def _load_snapshot(self):
+        if not self.persist or not os.path.exists(self.snapshot_path):
+            return
+        try:
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+            if snapshot.get("project_dir") != self.project_dir:
+                return
+            self.rules.seed(snapshot.get("rules", {}))
+            for rel_dir, (mtime, inode, files, dirs) in snapshot["dirs"].items():
+                self._dirs[rel_dir] = {"mtime": mtime, "ino": inode, "files": files, "dirs": dirs}
+                for name in files:
+                    self._paths[os.path.join(rel_dir, name)] = self._abs(os.path.join(rel_dir, name))
+                for name in dirs:
+                    rel_path = os.path.join(rel_dir, name)
+                    self._paths[rel_path] = self._abs(rel_path)
+                    self._dir_paths.add(rel_path)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"[DEBUG] Ignoring file index snapshot {self.snapshot_path}: {e}")
+            self._dirs, self._paths, self._dir_paths = {}, {}, set()
+
+    def _save_snapshot(self):
+        self._unsaved = False
+        self._last_save = time.monotonic()
+        if not self.persist:
+            return
+        os.makedirs(os.path.dirname(self.snapshot_path), exist_ok=True)
+        snapshot = {
+            "project_dir": self.project_dir,
+            "dirs": {rel_dir: [d["mtime"], d["ino"], d["files"], d["dirs"]] for rel_dir, d in self._dirs.items()},
+            "rules": self.rules.signature()
+        }
+        tmp_path = self.snapshot_path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, self.snapshot_path)
+        except OSError as e:
+            print(f"[DEBUG] Failed to save file index snapshot {self.snapshot_path}: {e}")
+
+    def _drop_tree(self, rel_dir: str):
+        entry = self._dirs.pop(rel_dir, None)
+        if entry is not None:
+            for name in entry["files"]:
+                self._paths.pop(os.path.join(rel_dir, name), None)
+            for name in entry["dirs"]:
+                child = os.path.join(rel_dir, name)
+                self._paths.pop(child, None)
+                self._dir_paths.discard(child)
+                self._drop_tree(child)
+        self._changed = True
+
+    def _scan_dir(self, rel_dir: str, stat: os.stat_result, force: bool = False) -> int:
+        files: List[str] = []
+        dirs: List[str] = []
+        descend: List[str] = []
+        # A new or edited .gitignore changes what belongs below this directory, so the subtree is rescanned.
+        force = self.rules.sync_dir(rel_dir) or force
+        try:
+            with os.scandir(self._abs(rel_dir)) as entries:
+                for entry in entries:
+                    if self.ignore_hidden and entry.name.startswith('.'):
+                        continue
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        continue
+                    rel_path = os.path.join(rel_dir, entry.name)
+                    if is_dir:
+                        if self.ignore_hidden and entry.name == '__pycache__':
+                            continue
+                        if self.rules.ignored(rel_path, True, entry.path):
+                            continue
+                        dirs.append(entry.name)
+                        if self.follow_symlinks or not entry.is_symlink():
+                            descend.append(entry.name)
+                    elif not self.rules.ignored(rel_path, False):
+                        files.append(entry.name)
+        except OSError:
+            self._drop_tree(rel_dir)
+            return 0
+
+        old = self._dirs.get(rel_dir, {"files": [], "dirs": []})
+        for name in set(old["files"]) - set(files):
+            self._paths.pop(os.path.join(rel_dir, name), None)
+        for name in set(old["dirs"]) - set(dirs):
+            child = os.path.join(rel_dir, name)
+            self._paths.pop(child, None)
+            self._dir_paths.discard(child)
+            self._drop_tree(child)
+        for name in files:
+            self._paths[os.path.join(rel_dir, name)] = self._abs(os.path.join(rel_dir, name))
+        for name in dirs:
+            child = os.path.join(rel_dir, name)
+            self._paths[child] = self._abs(child)
+            self._dir_paths.add(child)
+        self._dirs[rel_dir] = {"mtime": stat.st_mtime_ns, "ino": stat.st_ino, "files": files, "dirs": dirs}
+        self._changed = True
+
+        scanned = 1
+        for name in descend:
+            child = os.path.join(rel_dir, name)
+            if child in self._dirs and not force:
+                continue
+            try:
+                child_stat = os.stat(self._abs(child))
+            except OSError:
+                continue
+            scanned += self._scan_dir(child, child_stat, force)
+        return scanned
+
+    def _check_dirs(self, rel_dirs: Iterable[str]) -> int:
+        rescanned = 0
+        for rel_dir in rel_dirs:
+            if rel_dir and rel_dir not in self._dirs:
+                continue
+            try:
+                stat = os.stat(self._abs(rel_dir))
+            except OSError:
+                self._drop_tree(rel_dir)
+                continue
+            entry = self._dirs.get(rel_dir)
+            if entry is None or entry["mtime"] != stat.st_mtime_ns or entry["ino"] != stat.st_ino:
+                rescanned += self._scan_dir(rel_dir, stat)
+        return rescanned
+
+    def refresh(self, full: bool = False) -> int:
+        start = time.perf_counter()
+        with self._lock:
+            full = (full or self._observer is None or not self._dirs
+                    or time.monotonic() - self._last_full_poll >= self.full_poll_interval)
+            if full and self.rules.changed():
+                try:
+                    self._scan_dir("", os.stat(self.project_dir), force=True)
+                except OSError:
+                    self._drop_tree("")
+            if full:
+                targets = [""] + [rel_dir for rel_dir in self._dirs if rel_dir]
+                self._dirty.clear()
+                self._last_full_poll = time.monotonic()
+            else:
+                targets = sorted(self._dirty, key=len)
+                self._dirty.clear()
+            rescanned = self._check_dirs(targets)
+            if self._changed:
+                self.epoch += 1
+                self._views.clear()
+                self._unsaved = True
+                self._changed = False
+            if self._unsaved and time.monotonic() - self._last_save >= config.FILE_INDEX_SAVE_INTERVAL:
+                self._save_snapshot()
+            self.last_refresh = {"rescanned_dirs": rescanned, "checked_dirs": len(targets),
+                                 "ms": (time.perf_counter() - start) * 1e3}
+        return rescanned
+
+    def files(self, include_ext: Optional[Iterable[str]] = None) -> Dict[str, str]:
+        key = frozenset(include_ext) if include_ext else None
+        with self._lock:
+            view = self._views.get(key)
+            if view is None:
+                view = {rel: path for rel, path in self._paths.items()
+                        if rel not in self._dir_paths and (key is None or os.path.splitext(rel)[1] in key)}
+                self._views[key] = view
+            return view
+
+    @property
+    def watching(self) -> bool:
+        return self._observer is not None
+
+    def is_dir(self, rel_path: str) -> bool:
+        return rel_path in self._dir_paths
+
+    def close(self):
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join(timeout=2)
+            self._observer = None
+        with self._lock:
+            if self._unsaved:
+                self._save_snapshot()
+
+
+if __name__ == "__main__":
+    import shutil
+    import tempfile
+    from code_parser import CodeParser
+
+    bench_dir = tempfile.mkdtemp(prefix="file_index_bench_")
+    original_store = config.FAISS_STORE_PATH
+    config.FAISS_STORE_PATH = os.path.join(bench_dir, "store")
+    project_dir = os.path.join(bench_dir, "project")
+    try:
+        n_dirs, files_per_dir = 2_000, 25
+        for d in range(n_dirs):
+            package = os.path.join(project_dir, f"pkg{d % 40}", f"mod{d}")
+            os.makedirs(package)
+            for f in range(files_per_dir):
+                open(os.path.join(package, f"file{f}.py"), "w").close()
+
+        def full_walk():
+            return CodeParser.walk_files(os.path.abspath(project_dir), include_ext={'.py'})
+
+        start = time.perf_counter()
+        walked = full_walk()
+        walk_ms = (time.perf_counter() - start) * 1e3
+
+        start = time.perf_counter()
+        index = FileIndex(project_dir, use_watcher=False)
+        build_ms = (time.perf_counter() - start) * 1e3
+        assert index.files({'.py'}) == walked
+        index.close()
+
+        start = time.perf_counter()
+        index = FileIndex(project_dir, use_watcher=False)
+        reload_ms = (time.perf_counter() - start) * 1e3
+
+        start = time.perf_counter()
+        index.refresh()
+        idle_ms = (time.perf_counter() - start) * 1e3
+
+        open(os.path.join(project_dir, "pkg3", "mod3", "new_file.py"), "w").close()
+        start = time.perf_counter()
+        rescanned = index.refresh()
+        changed_ms = (time.perf_counter() - start) * 1e3
+        assert index.files({'.py'}) == full_walk()
+
+        print(f"{n_dirs * files_per_dir} files in {n_dirs} directories")
+        print(f"Full scan (walk_files):        {walk_ms:8.1f} ms")
+        print(f"FileIndex first build:         {build_ms:8.1f} ms")
+        print(f"FileIndex reload from snapshot:{reload_ms:8.1f} ms")
+        print(f"Polling refresh, no changes:   {idle_ms:8.1f} ms")
+        print(f"Polling refresh, one new file: {changed_ms:8.1f} ms ({rescanned} directory rescanned)")
+        index.close()
+    finally:
+        config.FAISS_STORE_PATH = original_store
+        shutil.rmtree(bench_dir)
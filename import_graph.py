@@ -0,0 +1,403 @@
+import os
+import json
+import time
+import atexit
+import hashlib
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Dict, Any, List, Set, Tuple
+
+import config
+from file_index import FileIndex
+from module_index import ModuleIndex, parse_import_file
+
+class ImportGraph:
+    def __init__(self, project_dir: str, file_index: Optional[FileIndex] = None,
+                 workers: Optional[int] = None, persist: Optional[bool] = None):
+        self.project_dir = os.path.abspath(project_dir)
+        self._owns_index = file_index is None
+        self.file_index = file_index if file_index is not None else FileIndex(self.project_dir)
+        self.workers = workers or config.IMPORT_GRAPH_WORKERS or os.cpu_count() or 1
+        self.persist = persist if persist is not None else config.IMPORT_GRAPH_PERSIST
+        digest = hashlib.sha1(self.project_dir.encode("utf-8")).hexdigest()
+        self.snapshot_path = os.path.join(config.FAISS_STORE_PATH, "import_graph", digest + ".json")
+        self.module_index: Optional[ModuleIndex] = None
+        self._files: Dict[str, List[Any]] = {}
+        self._paths: Dict[str, str] = {}
+        self._rels: Dict[str, str] = {}
+        self._edges: Dict[str, Set[str]] = {}
+        self._reverse: Dict[str, Set[str]] = {}
+        self._source = None
+        self._swept_epoch = None
+        self._last_sweep = float("-inf")
+        self._lock = threading.RLock()
+        self._unsaved = False
+        self._last_save = time.monotonic()
+        self.last_update = {"parsed": 0, "removed": 0, "resolved": 0, "ms": 0.0}
+
+        self._load_snapshot()
+        atexit.register(self.close)
+
+    def __len__(self) -> int:
+        return len(self._edges)
+
+    def _load_snapshot(self):
+        if not self.persist or not os.path.exists(self.snapshot_path):
+            return
+        try:
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+            if snapshot.get("project_dir") == self.project_dir:
+                self._files = snapshot["files"]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[DEBUG] Ignoring import graph snapshot {self.snapshot_path}: {e}")
+            self._files = {}
+
+    def _save_snapshot(self):
+        self._unsaved = False
+        self._last_save = time.monotonic()
+        if not self.persist:
+            return
+        os.makedirs(os.path.dirname(self.snapshot_path), exist_ok=True)
+        tmp_path = self.snapshot_path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"project_dir": self.project_dir, "files": self._files}, f)
+            os.replace(tmp_path, self.snapshot_path)
+        except OSError as e:
+            print(f"[DEBUG] Failed to save import graph snapshot {self.snapshot_path}: {e}")
+
+    def _parse(self, paths: List[str]) -> List[Tuple[str, Optional[int], int, Dict[str, List[str]], Optional[list]]]:
+        if self.workers <= 1 or len(paths) < config.IMPORT_GRAPH_PARALLEL_MIN:
+            return [parse_import_file(path) for path in paths]
+        chunk_size = max(1, min(config.IMPORT_GRAPH_CHUNK_SIZE, len(paths) // (self.workers * 4)))
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                return list(pool.map(parse_import_file, paths, chunksize=chunk_size))
+        except (OSError, RuntimeError) as e:
+            print(f"[DEBUG] Parallel import parsing failed, parsing serially: {e}")
+            return [parse_import_file(path) for path in paths]
+
+    def _statements(self, path: str) -> Optional[list]:
+        entry = self._files.get(self._rels.get(path))
+        return entry[3] if entry is not None else None
+
+    def _resolve_file(self, rel: str) -> Set[str]:
+        index = self.module_index
+        path = self._paths[rel]
+        targets = set()
+        for module, names in self._files[rel][2].items():
+            name = module.lstrip(".")
+            absolute = index.absolute_name(name, len(module) - len(name), path)
+            if absolute is None:
+                continue
+            candidates = [absolute]
+            for imported_name in names:
+                candidates.extend(index.resolve_name(absolute, imported_name))
+            for candidate in candidates:
+                target = self._rels.get(index.resolve(candidate))
+                if target is not None and target != rel:
+                    targets.add(target)
+        return targets
+
+    def _affected_by(self, changed: List[str]) -> Set[str]:
+        # A module is importable under any dotted suffix of its path, so those are the names that can resolve differently.
+        names = set()
+        for rel in changed:
+            parts = rel[:-3].split(os.sep)
+            for i in range(len(parts)):
+                names.add(".".join(parts[i:]))
+        index = self.module_index
+        affected = set()
+        for rel, entry in self._files.items():
+            path = self._paths.get(rel)
+            if path is None:
+                continue
+            for module, imported in entry[2].items():
+                name = module.lstrip(".")
+                absolute = index.absolute_name(name, len(module) - len(name), path)
+                if absolute is None:
+                    continue
+                keys = [absolute] + [f"{absolute}.{imported_name}" for imported_name in imported]
+                if any(".".join(key.split(".")[:cut]) in names for key in keys for cut in range(1, key.count(".") + 2)):
+                    affected.add(rel)
+                    break
+        return affected
+
+    def _set_edges(self, rel: str, targets: Optional[Set[str]]):
+        for target in self._edges.pop(rel, ()):
+            dependents = self._reverse.get(target)
+            if dependents is not None:
+                dependents.discard(rel)
+        if targets is None:
+            return
+        self._edges[rel] = targets
+        for target in targets:
+            self._reverse.setdefault(target, set()).add(rel)
+
+    def update(self) -> int:
+        start = time.perf_counter()
+        with self._lock:
+            self.file_index.refresh()
+            # The watcher bumps the epoch on any file event, so an unchanged epoch means nothing needs a stat.
+            # Without a watcher, content edits are only seen by stat, so the sweep is throttled instead.
+            epoch = self.file_index.epoch
+            interval = (config.FILE_INDEX_FULL_POLL_INTERVAL if self.file_index.watching
+                        else config.IMPORT_GRAPH_STAT_INTERVAL)
+            if (self.module_index is not None and epoch == self._swept_epoch
+                    and time.monotonic() - self._last_sweep < interval):
+                self.last_update = {"parsed": 0, "removed": 0, "resolved": 0, "ms": (time.perf_counter() - start) * 1e3}
+                return 0
+            self._swept_epoch, self._last_sweep = epoch, time.monotonic()
+            view = self.file_index.files(include_ext={'.py'})
+            added, gone = [], []
+            if view is not self._source:
+                # FileIndex hands out a new view on any directory rescan; only the set of .py paths matters here.
+                paths = {rel: path for rel, path in view.items() if rel.endswith(".py")}
+                added = [rel for rel in paths if rel not in self._paths]
+                gone = [rel for rel in self._paths if rel not in paths]
+                if added or gone:
+                    self._paths = paths
+                    self._rels = {path: rel for rel, path in paths.items()}
+                self._source = view
+            removed = [rel for rel in self._files if rel not in self._paths]
+            stale = []
+            for rel, path in self._paths.items():
+                entry = self._files.get(rel)
+                if entry is None or entry[0] is None:
+                    stale.append(rel)
+                    continue
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if entry[0] != stat.st_mtime_ns or entry[1] != stat.st_size:
+                    stale.append(rel)
+
+            for rel in removed:
+                del self._files[rel]
+            for path, mtime, size, imports, statements in self._parse([self._paths[rel] for rel in stale]):
+                self._files[self._rels[path]] = [mtime, size, imports, statements]
+
+            full = (self.module_index is None
+                    or any(os.path.basename(rel) == "__init__.py" for rel in stale + removed + gone))
+            if full:
+                self.module_index = ModuleIndex(self._paths, statements=self._statements)
+                self._edges, self._reverse = {}, {}
+                resolve = list(self._paths)
+            elif added or gone:
+                self.module_index = ModuleIndex(self._paths, statements=self._statements)
+                resolve = sorted(set(stale) | self._affected_by(added + gone))
+            else:
+                resolve = stale
+            for rel in removed:
+                self._set_edges(rel, None)
+            for rel in resolve:
+                if rel in self._files:
+                    self._set_edges(rel, self._resolve_file(rel))
+
+            if stale or removed:
+                self._unsaved = True
+            if self._unsaved and time.monotonic() - self._last_save >= config.IMPORT_GRAPH_SAVE_INTERVAL:
+                self._save_snapshot()
+            self.last_update = {"parsed": len(stale), "removed": len(removed), "resolved": len(resolve),
+                                "ms": (time.perf_counter() - start) * 1e3}
+        return len(stale) + len(removed)
+
+    def _key(self, path: str) -> Optional[str]:
+        if path in self._edges:
+            return path
+        return self._rels.get(os.path.abspath(os.path.join(self.project_dir, path)))
+
+    def distances(self, path: str, max_depth: Optional[int] = None, reverse: bool = False) -> Dict[str, int]:
+        adjacency = self._reverse if reverse else self._edges
+        with self._lock:
+            start = self._key(path)
+            if start is None:
+                return {}
+            limit = max_depth if max_depth is not None else float("inf")
+            found = {start: 0}
+            frontier = [start]
+            depth = 0
+            while frontier and depth < limit:
+                depth += 1
+                next_frontier = []
+                for rel in frontier:
+                    for target in sorted(adjacency.get(rel, ())):
+                        if target not in found:
+                            found[target] = depth
+                            next_frontier.append(target)
+                frontier = next_frontier
+            return found
+
+    def path_of(self, rel: str) -> Optional[str]:
+        return self._paths.get(rel)
+
+    def rel_of(self, path: str) -> Optional[str]:
+        return self._rels.get(path)
+
+    def dependencies(self, path: str, transitive: bool = True, max_depth: Optional[int] = None) -> Dict[str, str]:
+        found = self.distances(path, max_depth if transitive else 1)
+        return {rel: self._paths[rel] for rel, depth in found.items() if depth > 0}
+
+    def dependents(self, path: str, transitive: bool = True, max_depth: Optional[int] = None) -> Dict[str, str]:
+        found = self.distances(path, max_depth if transitive else 1, reverse=True)
+        return {rel: self._paths[rel] for rel, depth in found.items() if depth > 0}
+
+    def strongly_connected_components(self, include_trivial: bool = False) -> List[List[str]]:
+        with self._lock:
+            index_of: Dict[str, int] = {}
+            lowlink: Dict[str, int] = {}
+            on_stack: Set[str] = set()
+            stack: List[str] = []
+            components: List[List[str]] = []
+            counter = 0
+            for root in sorted(self._edges):
+                if root in index_of:
+                    continue
+                work = [(root, iter(sorted(self._edges.get(root, ()))))]
+                index_of[root] = lowlink[root] = counter
+                counter += 1
+                stack.append(root)
+                on_stack.add(root)
+                while work:
+                    node, children = work[-1]
+                    advanced = False
+                    for child in children:
+                        if child not in index_of:
+                            index_of[child] = lowlink[child] = counter
+                            counter += 1
+                            stack.append(child)
+                            on_stack.add(child)
+                            work.append((child, iter(sorted(self._edges.get(child, ())))))
+                            advanced = True
+                            break
+                        if child in on_stack:
+                            lowlink[node] = min(lowlink[node], index_of[child])
+                    if advanced:
+                        continue
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        lowlink[parent] = min(lowlink[parent], lowlink[node])
+                    if lowlink[node] == index_of[node]:
+                        component = []
+                        while True:
+                            member = stack.pop()
+                            on_stack.discard(member)
+                            component.append(member)
+                            if member == node:
+                                break
+                        if include_trivial or len(component) > 1:
+                            components.append(sorted(component))
+            return components
+
+    def close(self):
+        with self._lock:
+            if self._unsaved:
+                self._save_snapshot()
+        if self._owns_index:
+            self.file_index.close()
+
+
+if __name__ == "__main__":
+    import sys
+    import random
+    import shutil
+    import tempfile
+
+    n_files = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    bench_dir = tempfile.mkdtemp(prefix="import_graph_bench_")
+    original_store, original_interval = config.FAISS_STORE_PATH, config.IMPORT_GRAPH_STAT_INTERVAL
+    config.FAISS_STORE_PATH = os.path.join(bench_dir, "store")
+    project_dir = os.path.join(bench_dir, "project")
+    try:
+        rng = random.Random(0)
+        n_packages, modules_per_sub = 100, 25
+        subs_per_package = max(1, n_files // (n_packages * modules_per_sub))
+        modules = [(p, s, m) for p in range(n_packages) for s in range(subs_per_package) for m in range(modules_per_sub)]
+        for p in range(n_packages):
+            os.makedirs(os.path.join(project_dir, f"pkg{p}"))
+            with open(os.path.join(project_dir, f"pkg{p}", "__init__.py"), "w") as f:
+                f.write("from .sub0.mod0 import function_0 as entry_point\n")
+            for s in range(subs_per_package):
+                os.makedirs(os.path.join(project_dir, f"pkg{p}", f"sub{s}"))
+                with open(os.path.join(project_dir, f"pkg{p}", f"sub{s}", "__init__.py"), "w") as f:
+                    f.write("from . import mod0\n")
+        body = "".join(f"def function_{j}(value: int) -> int:\n    total = value\n    for i in range({j}):\n"
+                       f"        total += i * len(os.sep)\n    return total\n\n" for j in range(15))
+        for p, s, m in modules:
+            lines = ["import os", "from typing import Dict, List"]
+            for _ in range(4):
+                op, os_, om = rng.choice(modules)
+                lines.append(f"from pkg{op}.sub{os_}.mod{om} import function_{rng.randrange(15)}")
+            lines.append(f"import pkg{rng.randrange(n_packages)}.sub0.mod{rng.randrange(modules_per_sub)}")
+            lines.append(f"from .mod{(m + 1) % modules_per_sub} import function_1")
+            lines.append(f"from pkg{rng.randrange(n_packages)} import entry_point")
+            with open(os.path.join(project_dir, f"pkg{p}", f"sub{s}", f"mod{m}.py"), "w") as f:
+                f.write("\n".join(lines) + "\n\n" + body)
+        old = time.time() - 60
+        for root, _, names in os.walk(project_dir):
+            for name in names:
+                os.utime(os.path.join(root, name), (old, old))
+        index = FileIndex(project_dir, persist=False, use_watcher=False)
+        total = sum(1 for rel in index.files({'.py'}) if rel.endswith(".py"))
+
+        serial = ImportGraph(project_dir, file_index=index, workers=1, persist=False)
+        start = time.perf_counter()
+        serial.update()
+        serial_s = time.perf_counter() - start
+
+        workers = os.cpu_count() or 1
+        graph = ImportGraph(project_dir, file_index=index, workers=workers)
+        start = time.perf_counter()
+        graph.update()
+        parallel_s = time.perf_counter() - start
+        assert graph._edges == serial._edges
+        graph.close()
+
+        start = time.perf_counter()
+        graph = ImportGraph(project_dir, file_index=index, workers=workers)
+        graph.update()
+        reload_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        graph.update()
+        gated_ms = (time.perf_counter() - start) * 1e3
+
+        config.IMPORT_GRAPH_STAT_INTERVAL = 0.0
+        start = time.perf_counter()
+        graph.update()
+        idle_ms = (time.perf_counter() - start) * 1e3
+
+        for p, s, m in modules[:10]:
+            with open(os.path.join(project_dir, f"pkg{p}", f"sub{s}", f"mod{m}.py"), "a") as f:
+                f.write("\nimport pkg1.sub0.mod1\n")
+        start = time.perf_counter()
+        changed = graph.update()
+        changed_ms = (time.perf_counter() - start) * 1e3
+
+        target = os.path.join("pkg0", "sub0", "mod0.py")
+        start = time.perf_counter()
+        deps = graph.dependencies(target)
+        users = graph.dependents(target)
+        query_ms = (time.perf_counter() - start) * 1e3
+        start = time.perf_counter()
+        components = graph.strongly_connected_components()
+        scc_ms = (time.perf_counter() - start) * 1e3
+
+        print(f"{total} files, {sum(len(t) for t in graph._edges.values())} resolved edges, {workers} worker(s)")
+        print(f"Serial build:                {serial_s:8.2f} s")
+        print(f"Process pool build:          {parallel_s:8.2f} s")
+        print(f"Reload snapshot + update:    {reload_s:8.2f} s")
+        print(f"Update, no changes (gated):  {gated_ms:8.1f} ms")
+        print(f"Update, no changes (stat):   {idle_ms:8.1f} ms")
+        print(f"Update, {changed} files changed:    {changed_ms:8.1f} ms")
+        print(f"Transitive deps + dependents of {target}: {len(deps)} / {len(users)} files in {query_ms:.1f} ms")
+        print(f"Strongly connected components: {len(components)} cycles, largest {max(map(len, components), default=0)} "
+              f"files, {scc_ms:.1f} ms")
+        graph.close()
+        index.close()
+    finally:
+        config.FAISS_STORE_PATH, config.IMPORT_GRAPH_STAT_INTERVAL = original_store, original_interval
+        shutil.rmtree(bench_dir)
@@ -0,0 +1,172 @@
+import re
+import math
+import threading
+from typing import Optional, Dict, List, Tuple, Sequence
+
+import numpy as np
+
+import config
+
+_TOKEN_RE = re.compile(r"[A-Za-z0-9_]+(?:[./\-][A-Za-z0-9_]+)*")
+_QUOTED_RE = re.compile(r"""^\s*(["'`]).+\1\s*$""")
+_CAMEL_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+")
+_STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "to", "in", "on", "for", "is", "it", "this", "that", "with", "as", "at",
+    "be", "by", "i", "you", "me", "my", "we", "do", "did", "what", "how", "can", "from", "are", "was", "about"
+}
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for match in _TOKEN_RE.findall(text):
+        whole = match.lower()
+        if whole not in _STOPWORDS:
+            tokens.append(whole)
+        if match == whole and match.isalnum():
+            continue
+        pieces = [piece.lower() for piece in re.split(r"[./\-]", match)]
+        if len(pieces) > 1:
+            tokens.extend(piece for piece in pieces if piece not in _STOPWORDS)
+        parts = [p.lower() for word in re.split(r"[./\-_]", match) for p in _CAMEL_RE.findall(word)]
+        if len(parts) > 1:
+            tokens.extend(p for p in parts if p not in _STOPWORDS and (len(pieces) == 1 or p not in pieces))
+    return tokens
+
+
+def is_identifier_like(token: str) -> bool:
+    return bool(re.search(r"[./\-_0-9]", token)) or bool(re.search(r"[a-z][A-Z]", token))
+
+
+def is_exact_query(query: str) -> bool:
+    if _QUOTED_RE.match(query):
+        return True
+    terms = [term for term in _TOKEN_RE.findall(query) if term.lower() not in _STOPWORDS]
+    return bool(terms) and all(is_identifier_like(term) for term in terms)
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: Optional[int] = None) -> Dict[str, float]:
+    k = k if k is not None else config.MEMORY_RRF_K
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking):
+            fused[key] = fused.get(key, 0.0) + 1.0 / (k + rank + 1)
+    return fused
+
+
+class BM25Index:
+    def __init__(self, k1: Optional[float] = None, b: Optional[float] = None, initial_capacity: int = 1024):
+        self.k1 = k1 if k1 is not None else config.MEMORY_BM25_K1
+        self.b = b if b is not None else config.MEMORY_BM25_B
+        self._term_ids: Dict[str, int] = {}
+        self._postings: List[Tuple[List[int], List[int]]] = []
+        self._arrays: List[Tuple[np.ndarray, np.ndarray]] = []
+        self._doc_len = np.zeros(initial_capacity, dtype=np.float32)
+        self._size = 0
+        self._total_len = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, row: int, text: str):
+        self.add_many([row], [text])
+
+    def add_many(self, rows: Sequence[int], texts: Sequence[str]):
+        tokenized = [tokenize(text) for text in texts]
+        with self._lock:
+            for row, tokens in zip(rows, tokenized):
+                self._add_locked(row, tokens)
+
+    def _add_locked(self, row: int, tokens: List[str]):
+        counts: Dict[str, int] = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        if row >= self._doc_len.shape[0]:
+            capacity = self._doc_len.shape[0]
+            while capacity <= row:
+                capacity *= 2
+            grown = np.zeros(capacity, dtype=np.float32)
+            grown[:self._size] = self._doc_len[:self._size]
+            self._doc_len = grown
+        for term, tf in counts.items():
+            term_id = self._term_ids.get(term)
+            if term_id is None:
+                term_id = len(self._postings)
+                self._term_ids[term] = term_id
+                self._postings.append(([], []))
+                self._arrays.append((np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)))
+            rows, tfs = self._postings[term_id]
+            rows.append(row)
+            tfs.append(tf)
+        self._doc_len[row] = len(tokens)
+        self._total_len += len(tokens)
+        self._size = max(self._size, row + 1)
+
+    def _posting(self, term_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        rows, tfs = self._postings[term_id]
+        row_array, tf_array = self._arrays[term_id]
+        if row_array.size < len(rows):
+            upto = row_array.size
+            row_array = np.concatenate([row_array, np.asarray(rows[upto:], dtype=np.int64)])
+            tf_array = np.concatenate([tf_array, np.asarray(tfs[upto:], dtype=np.float32)])
+            self._arrays[term_id] = (row_array, tf_array)
+        return row_array, tf_array
+
+    def search(self, query: str, k: int, candidates: Optional[np.ndarray] = None) -> Tuple[List[Tuple[int, float]], int]:
+        terms = list(dict.fromkeys(tokenize(query)))
+        with self._lock:
+            if not terms or self._size == 0 or k <= 0:
+                return [], 0
+            term_ids = [self._term_ids.get(term) for term in terms]
+            full_terms = None if any(term_id is None for term_id in term_ids) else len(term_ids)
+            scores = np.zeros(self._size, dtype=np.float32)
+            matched = np.zeros(self._size, dtype=np.int32)
+            avg_len = self._total_len / self._size or 1.0
+            for term_id in term_ids:
+                if term_id is None:
+                    continue
+                rows, tfs = self._posting(term_id)
+                df = rows.size
+                idf = math.log(1.0 + (self._size - df + 0.5) / (df + 0.5))
+                norm = self.k1 * (1.0 - self.b + self.b * self._doc_len[rows] / avg_len)
+                scores[rows] += idf * tfs * (self.k1 + 1.0) / (tfs + norm)
+                matched[rows] += 1
+        if candidates is not None:
+            mask = np.zeros(self._size, dtype=bool)
+            mask[candidates[candidates < self._size]] = True
+            scores[~mask] = 0.0
+            matched[~mask] = 0
+        hit_rows = np.flatnonzero(scores > 0)
+        full_matches = 0 if full_terms is None else int(np.count_nonzero(matched == full_terms))
+        if hit_rows.size == 0:
+            return [], full_matches
+        hit_scores = scores[hit_rows]
+        if k < hit_rows.size:
+            top = np.argpartition(-hit_scores, k - 1)[:k]
+        else:
+            top = np.arange(hit_rows.size)
+        top = top[np.argsort(-hit_scores[top], kind="stable")]
+        return [(int(hit_rows[i]), float(hit_scores[i])) for i in top], full_matches
+
+
+if __name__ == "__main__":
+    import time
+    import random
+
+    rows, queries, k = 100_000, 200, 5
+    vocabulary = [f"word{i}" for i in range(5_000)] + ["project_memory.py", "MemoryShard", "enforce_budget", "deploy"]
+    rng = random.Random(0)
+    texts = [" ".join(rng.choices(vocabulary, k=40)) for _ in range(rows)]
+    index = BM25Index()
+    start = time.perf_counter()
+    for offset in range(0, rows, 1000):
+        index.add_many(range(offset, offset + 1000), texts[offset:offset + 1000])
+    build_s = time.perf_counter() - start
+    print(f"Indexed {rows} messages in {build_s:.2f}s ({build_s / rows * 1e6:.1f} us/message)")
+
+    for query in ["enforce_budget", "MemoryShard deploy", "project_memory.py word17 word42"]:
+        start = time.perf_counter()
+        for _ in range(queries):
+            hits, full = index.search(query, k)
+        elapsed_ms = (time.perf_counter() - start) / queries * 1e3
+        print(f"{query!r:>40}: {elapsed_ms:.2f} ms/query, {full} full matches, top row {hits[0][0] if hits else None}")
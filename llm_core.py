@@ -1,5 +1,6 @@
 import os
-from typing import Dict, Optional, Any, List
+import asyncio
+from typing import Dict, Optional, Any, List, Callable, Tuple, Union
 import datetime
 import json
 import shutil
@@ -8,11 +9,14 @@ from langchain_core.prompts import ChatPromptTemplate, HumanMessagePromptTemplat
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.output_parsers import JsonOutputParser, StrOutputParser
 from langchain_core.exceptions import OutputParserException
-from langchain.memory.buffer import ConversationBufferMemory
 from langchain_core.messages import HumanMessage, AIMessage
 from dotenv import load_dotenv
 
 from project_memory import ProjectMemory
+from context_packer import pack_context, describe_report
+from response_stream import stream_field_sentences, astream_field_sentences
+from response_cache import ResponseCache, content_hash, prompt_key
+from conversation_memory import RollingConversationMemory
 import config
 
 load_dotenv()
@@ -27,6 +31,7 @@ class LLMService:
         self.project_id = "default_project"
         self.llm = None
         self.llm_call_chain = None
+        self.response_cache = ResponseCache() if config.RESPONSE_CACHE_ENABLED else None
 
         if not api_key:
             msg = "Gemini API key not provided. LLM Service will be offline."
@@ -40,8 +45,8 @@ class LLMService:
                 api_key=api_key,
                 temperature=0.5
             )
-            self.project_memory = ProjectMemory(api_key=api_key)
-            self.buffer_memory = ConversationBufferMemory(memory_key="current_conversation_history", return_messages=False)
+            self.project_memory = ProjectMemory(api_key=api_key, summarizer=self._summarize_memory_records)
+            self.buffer_memory = RollingConversationMemory(summarizer=self._update_conversation_summary)
             prompt = self._get_prompt_with_rag_retrieval()
             self.llm_call_chain = prompt | self.llm | StrOutputParser()
             msg = f"Jarvis LLM Service is online."
@@ -58,7 +63,7 @@ class LLMService:
         'Current Conversation' contains the most recent back-and-forth messages in this session.
         Use both to understand the full context. Your primary goal is to respond to the 'Current User Request'.
         Be friendly, helpful, and direct. Do not use markdown for code.
-        Your response MUST be a JSON object with keys "Suggested code" and "Guidance".
+        Your response MUST be a JSON object with keys "Guidance" and "Suggested code", in that order.
         """
         HUMAN_TEMPLATE = """
             Project Goal: {project_goal}
@@ -77,8 +82,8 @@ class LLMService:
             Current User Request: {input}
             Please respond strictly in the following JSON format:
             {{
-            "Suggested code": "<your code suggestion or 'None'>",
-            "Guidance": "<your textual guidance and explanation, addressing any errors if applicable>"
+            "Guidance": "<your textual guidance and explanation, addressing any errors if applicable>",
+            "Suggested code": "<your code suggestion or 'None'>"
             }}
         """
         return ChatPromptTemplate.from_messages([
@@ -86,6 +91,28 @@ class LLMService:
             HumanMessagePromptTemplate.from_template(HUMAN_TEMPLATE)
         ])
 
+    def _summarize_memory_records(self, records: List[Dict[str, Any]]) -> str:
+        transcript = "\n".join(
+            f"{record['metadata'].get('type', 'unknown').upper()}: {record['page_content']}" for record in records
+        )
+        prompt = ("Summarize the following past conversation between a user and Jarvis, their programming assistant. "
+                  "Keep decisions, code changes, file names, open problems and user preferences. "
+                  "Answer with the summary only.\n\n" + transcript)
+        return self.llm.invoke(prompt).content
+
+    def _update_conversation_summary(self, summary: str, transcript: str) -> str:
+        prompt = ("You keep a running summary of a conversation between a user and Jarvis, their programming assistant. "
+                  f"Update the summary with the new lines below in at most {config.SHORT_TERM_SUMMARY_TOKENS * 3 // 4} words. "
+                  "Keep decisions, file names, open problems and user preferences; drop code. "
+                  "Answer with the updated summary only.\n\n"
+                  f"Current summary:\n{summary or 'None yet.'}\n\nNew lines:\n{transcript}")
+        return self.llm.invoke(prompt).content
+
+    def clear_response_cache(self, project_id: Optional[str] = None) -> int:
+        if self.response_cache is None:
+            return 0
+        return self.response_cache.invalidate(project_id)
+
     def clear_conversation_memory(self):
         self.buffer_memory.clear()
         msg = "Current conversation history has been cleared."
@@ -95,7 +122,7 @@ class LLMService:
             print(msg)
             
     def save_conversation_to_long_term_memory(self):
-        messages = self.buffer_memory.chat_memory.messages
+        messages = self.buffer_memory.messages
         if not messages:
             msg = "Nothing in the current conversation to save."
             if self.voice_handler: self.voice_handler.speak(msg)
@@ -103,11 +130,22 @@ class LLMService:
             return
 
         print(f"Saving {len(messages)} messages to long-term memory for project '{self.project_id}'...")
+        batch = []
         for message in messages:
             if isinstance(message, HumanMessage):
-                self.project_memory.add_response(message.content, self.user_id, self.session_id, self.project_id, message_type="human")
+                message_type = "human"
             elif isinstance(message, AIMessage):
-                self.project_memory.add_response(message.content, self.user_id, self.session_id, self.project_id, message_type="ai")
+                message_type = "ai"
+            else:
+                continue
+            batch.append({
+                "response_content": message.content,
+                "user_id": self.user_id,
+                "session_id": self.session_id,
+                "project_id": self.project_id,
+                "message_type": message_type
+            })
+        self.project_memory.add_responses(batch)
         
         self.buffer_memory.clear()
         
@@ -115,31 +153,31 @@ class LLMService:
         if self.voice_handler: self.voice_handler.speak(msg)
         else: print(msg)
 
-    def get_code_guidance_with_project_context(
-        self,
-        user_command: str,
-        active_file_path: str,
-        active_file_code: str,
-        project_context_files: Dict[str, str],
-        user_project_goal:str,
-        current_project_id: Optional[str] = None
-    ) -> Dict[str, Any]:
-        if not self.llm_call_chain:
-            return {"Error": "Jarvis LLM RAG chain is not initialized."}
-
-        target_project_id = current_project_id if current_project_id else self.project_id
+    def _pack_files(self, user_command: str, active_file_path: Optional[str], active_file_code: Optional[str],
+                    project_context_files: Dict[str, str]) -> Tuple[str, str, Dict[str, str], Dict[str, Any]]:
         active_file_name = os.path.basename(active_file_path) if active_file_path else "None"
-        active_file_code_str = active_file_code or "This file is currently empty."
-        context_str = "\n".join([f"-- Content of {path} --\n{content}" if os.path.basename(path)!=active_file_name else "" for path, content in project_context_files.items()])
-
-        retrieved_history_str = self.project_memory.load_chat_on_current_project(
+        context_files = {path: content for path, content in (project_context_files or {}).items()
+                         if os.path.basename(path.split("::")[0]) != active_file_name}
+        active_text, context_files, report = pack_context(user_command, active_file_path, active_file_code or "", context_files)
+        if report["dropped"] or report["active_file_abridged"]:
+            print(f"[DEBUG] {describe_report(report)}")
+        return active_file_name, active_text or "This file is currently empty.", context_files, report
+
+    def _retrieve_history(self, user_command: str, project_id: str) -> str:
+        return self.project_memory.load_chat_on_current_project(
             query=user_command,
             user_id=self.user_id,
-            project_id=target_project_id,
+            project_id=project_id,
             k=3
         )
-        current_conversation_str = self.buffer_memory.load_memory_variables({})['current_conversation_history']
 
+    def _conversation_history(self) -> str:
+        return self.buffer_memory.load_memory_variables({})['current_conversation_history']
+
+    def _build_payload(self, user_command: str, user_project_goal: str, active_file_name: str, active_file_code_str: str,
+                       context_files: Dict[str, str], retrieved_history_str: str,
+                       current_conversation_str: str) -> Tuple[Dict[str, Any], Optional[str]]:
+        context_str = "\n".join(f"-- Content of {path} --\n{content}" for path, content in context_files.items())
         invoke_payload = {
             "project_goal": user_project_goal or "Not specified.",
             "active_file_name": active_file_name,
@@ -149,41 +187,184 @@ class LLMService:
             "current_conversation_history": current_conversation_str,
             "input": user_command
         }
+        cache_key = None
+        if self.response_cache is not None:
+            cache_key = prompt_key(
+                command=" ".join(user_command.lower().split()),
+                active_file=[active_file_name, content_hash(active_file_code_str)],
+                context_files={path: content_hash(content) for path, content in context_files.items()},
+                goal=user_project_goal,
+                retrieved_history=retrieved_history_str,
+                # Everything the prompt shows of the conversation, recent turns included, or a stale answer could be served.
+                conversation=content_hash(current_conversation_str) if current_conversation_str else "no history"
+            )
+        return invoke_payload, cache_key
+
+    def _cached_response(self, user_command: str, project_id: str, cache_key: Optional[str],
+                         context_report: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if cache_key is None:
+            return None
+        cached = self.response_cache.get(project_id, cache_key)
+        if cached is None:
+            return None
+        print(f"[DEBUG] Response cache hit (hit ratio {self.response_cache.hit_ratio:.0%})")
+        self.buffer_memory.save_context({"input": user_command}, {"output": cached["raw"]})
+        response = dict(cached["response"])
+        response["Context report"] = context_report
+        return response
+
+    def _finish_response(self, user_command: str, raw_llm_output_str: str, project_id: str, cache_key: Optional[str],
+                         streamed: bool, context_report: Dict[str, Any]) -> Dict[str, Any]:
+        json_parser = JsonOutputParser()
+        parsed_response = json_parser.parse(raw_llm_output_str)
+
+        self.buffer_memory.save_context({"input": user_command}, {"output": raw_llm_output_str})
+        if cache_key is not None and isinstance(parsed_response, dict):
+            self.response_cache.put(project_id, cache_key, dict(parsed_response), raw_llm_output_str)
+        if isinstance(parsed_response, dict):
+            # Travels with the response so a superseded request cannot change what this one reports.
+            parsed_response["Context report"] = context_report
+            if streamed:
+                parsed_response["Streamed"] = True
+        return parsed_response
+
+    def _response_error(self, user_command: str, raw_llm_output_str: str, error: Exception) -> Dict[str, Any]:
+        # This can run on a streaming worker or the event-loop thread, so the caller speaks the returned error.
+        if isinstance(error, OutputParserException):
+            print(f"[DEBUG] LLM output was not valid JSON: {error}")
+            self.buffer_memory.save_context({"input": user_command}, {"output": f"LLM_ERROR: {raw_llm_output_str}"})
+            return {"Error": "Jarvis's response was a bit garbled.", "RawResponse": raw_llm_output_str}
+        return {"Error": f"An error occurred while talking to Jarvis: {error}"}
+
+    def get_code_guidance_with_project_context(
+        self,
+        user_command: str,
+        active_file_path: str,
+        active_file_code: str,
+        project_context_files: Dict[str, str],
+        user_project_goal:str,
+        current_project_id: Optional[str] = None,
+        on_guidance: Optional[Callable[[str], None]] = None
+    ) -> Dict[str, Any]:
+        if not self.llm_call_chain:
+            return {"Error": "Jarvis LLM RAG chain is not initialized."}
+
+        target_project_id = current_project_id if current_project_id else self.project_id
+        active_file_name, active_file_code_str, context_files, context_report = self._pack_files(
+            user_command, active_file_path, active_file_code, project_context_files)
+        retrieved_history_str = self._retrieve_history(user_command, target_project_id)
+        current_conversation_str = self._conversation_history()
+
+        invoke_payload, cache_key = self._build_payload(user_command, user_project_goal, active_file_name,
+                                                        active_file_code_str, context_files, retrieved_history_str,
+                                                        current_conversation_str)
+        cached = self._cached_response(user_command, target_project_id, cache_key, context_report)
+        if cached is not None:
+            return cached
 
         raw_llm_output_str = ""
         try:
-            raw_llm_output_str = self.llm_call_chain.invoke(invoke_payload)
+            streamed = []
+            if on_guidance is not None and config.LLM_STREAMING:
+                def forward(sentence: str):
+                    streamed.append(sentence)
+                    on_guidance(sentence)
+                raw_llm_output_str = stream_field_sentences(self.llm_call_chain.stream(invoke_payload), "Guidance",
+                                                            forward, config.LLM_STREAM_MIN_SENTENCE_CHARS)
+            else:
+                raw_llm_output_str = self.llm_call_chain.invoke(invoke_payload)
+            return self._finish_response(user_command, raw_llm_output_str, target_project_id, cache_key, bool(streamed),
+                                         context_report)
+        except Exception as e:
+            return self._response_error(user_command, raw_llm_output_str, e)
 
-            json_parser = JsonOutputParser()
-            parsed_response = json_parser.parse(raw_llm_output_str)
+    async def _stage(self, name: str, timeout: float, func: Callable[..., Any], *args, default: Any = None) -> Any:
+        try:
+            return await asyncio.wait_for(asyncio.to_thread(func, *args), timeout)
+        except asyncio.TimeoutError:
+            print(f"[DEBUG] Guidance stage '{name}' timed out after {timeout:.1f}s; continuing without it.")
+        except Exception as e:
+            print(f"[DEBUG] Guidance stage '{name}' failed: {e}")
+        return default
 
-            self.buffer_memory.save_context({"input": user_command}, {"output": raw_llm_output_str})
-            
-            return parsed_response
-        
-        except OutputParserException as ope:
-            error_msg = f"LLM output was not valid JSON: {ope}"
-            if self.voice_handler: self.voice_handler.speak("Jarvis's response was a bit garbled.")
-            self.buffer_memory.save_context({"input": user_command}, {"output": f"LLM_ERROR: {raw_llm_output_str}"})
-            return {"Error": error_msg, "RawResponse": raw_llm_output_str}
+    async def aget_code_guidance_with_project_context(
+        self,
+        user_command: str,
+        active_file_path: str,
+        active_file_code: Union[str, Callable[[], str], None],
+        project_context_files: Union[Dict[str, str], Callable[[], Dict[str, str]], None],
+        user_project_goal: str,
+        current_project_id: Optional[str] = None,
+        on_guidance: Optional[Callable[[str], None]] = None
+    ) -> Dict[str, Any]:
+        if not self.llm_call_chain:
+            return {"Error": "Jarvis LLM RAG chain is not initialized."}
+
+        target_project_id = current_project_id if current_project_id else self.project_id
+
+        def load_files():
+            code = active_file_code() if callable(active_file_code) else active_file_code
+            files = project_context_files() if callable(project_context_files) else project_context_files
+            return self._pack_files(user_command, active_file_path, code, files or {})
+
+        def load_active_only():
+            code = active_file_code() if callable(active_file_code) else active_file_code
+            return self._pack_files(user_command, active_file_path, code, {})
+
+        files, retrieved_history_str, current_conversation_str = await asyncio.gather(
+            self._stage("context files", config.GUIDANCE_CONTEXT_TIMEOUT, load_files),
+            self._stage("memory retrieval", config.GUIDANCE_MEMORY_TIMEOUT, self._retrieve_history,
+                        user_command, target_project_id, default=""),
+            self._stage("conversation", config.GUIDANCE_MEMORY_TIMEOUT, self._conversation_history, default="")
+        )
+        if files is None:
+            files = await self._stage("active file", config.GUIDANCE_CONTEXT_TIMEOUT, load_active_only)
+        if files is None:
+            return {"Error": "Could not load the active file in time."}
+        active_file_name, active_file_code_str, context_files, context_report = files
+
+        invoke_payload, cache_key = self._build_payload(user_command, user_project_goal, active_file_name,
+                                                        active_file_code_str, context_files, retrieved_history_str,
+                                                        current_conversation_str)
+        cached = self._cached_response(user_command, target_project_id, cache_key, context_report)
+        if cached is not None:
+            return cached
+
+        raw_llm_output_str = ""
+        try:
+            streamed = []
+            if on_guidance is not None and config.LLM_STREAMING:
+                def forward(sentence: str):
+                    streamed.append(sentence)
+                    on_guidance(sentence)
+                raw_llm_output_str = await asyncio.wait_for(
+                    astream_field_sentences(self.llm_call_chain.astream(invoke_payload), "Guidance", forward,
+                                            config.LLM_STREAM_MIN_SENTENCE_CHARS),
+                    config.GUIDANCE_LLM_TIMEOUT)
+            else:
+                raw_llm_output_str = await asyncio.wait_for(self.llm_call_chain.ainvoke(invoke_payload),
+                                                            config.GUIDANCE_LLM_TIMEOUT)
+            return self._finish_response(user_command, raw_llm_output_str, target_project_id, cache_key, bool(streamed),
+                                         context_report)
+        except asyncio.TimeoutError:
+            return self._response_error(user_command, raw_llm_output_str,
+                                        TimeoutError(f"no answer within {config.GUIDANCE_LLM_TIMEOUT:.0f} seconds"))
         except Exception as e:
-            error_msg = f"An error occurred while talking to Jarvis: {e}"
-            if self.voice_handler: self.voice_handler.speak(error_msg)
-            return {"Error": error_msg}
+            return self._response_error(user_command, raw_llm_output_str, e)
 
     def set_current_project(self, project_id: str):
         self.project_id = project_id
         self.buffer_memory.clear()
+        self.project_memory.activate(self.user_id, project_id)
         print(f"LLMService active project ID set to: {project_id}. Conversation buffer cleared.")
         return project_id
 
     def get_last_ai_response_directly(self, project_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
         target_project_id = project_id if project_id else self.project_id
         
-        last_doc_str = self.project_memory._generic_load_chat_history(
-            command_query="last ai response",
-            filter_criteria={"user_id": self.user_id, "project_id": target_project_id, "type": "ai"},
-            k=1
+        last_doc_str = self.project_memory.load_recent_chat(
+            filter_by={"user_id": self.user_id, "project_id": target_project_id, "type": "ai"},
+            n=1
         )
 
         if last_doc_str and "Error" not in last_doc_str and "No relevant" not in last_doc_str:
@@ -1,9 +1,13 @@
 import threading
-from code_assistant_gui import CodeAssistantGUI
-from code_assistant import CodeAssistant
-import os
+import multiprocessing
+
 
 def main_code_assistant():
+    # Imported here, not at module level: spawned import-parsing workers re-import this module as __mp_main__
+    # and must not pay for loading the GUI, speech and LLM stacks.
+    from code_assistant_gui import CodeAssistantGUI
+    from code_assistant import CodeAssistant
+
     ui = CodeAssistantGUI()
     user_id = "default_user"
     session_id = "default_session"
@@ -15,4 +19,5 @@ def main_code_assistant():
     ui.start()
 
 if __name__ == "__main__":
-    main_code_assistant()
\ No newline at end of file
+    multiprocessing.freeze_support()
+    main_code_assistant()
@@ -0,0 +1,225 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Sequence, Iterator
+
+import numpy as np
+
+import config
+
+
+class MappedRowFile:
+    def __init__(self, base_path: str, fields: Sequence[str]):
+        self.fields = list(fields)
+        self.meta_path = base_path + ".rows.json"
+        self.vectors_path = base_path + ".rows.f32"
+        self.data_path = base_path + ".rows.jsonl"
+        self.offsets_path = base_path + ".rows.off"
+        self.times_path = base_path + ".rows.ts"
+        self.codes_paths = {field: base_path + f".rows.{field}.i32" for field in self.fields}
+        self.meta: Optional[Dict[str, Any]] = None
+        self.rows = 0
+        self.mapped_rows = 0
+        self.dim: Optional[int] = None
+        self.vectors: Optional[np.ndarray] = None
+        self.offsets: Optional[np.ndarray] = None
+        self.times: Optional[np.ndarray] = None
+        self.codes: Dict[str, np.ndarray] = {}
+        self._data_file = None
+        self._cache: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _all_paths(self) -> List[str]:
+        return [self.vectors_path, self.data_path, self.offsets_path, self.times_path] + list(self.codes_paths.values())
+
+    def open(self, model: str) -> bool:
+        if not os.path.exists(self.meta_path):
+            return False
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            rows, dim = int(meta["rows"]), int(meta["dim"])
+            if meta["model"] != model or meta["fields"] != self.fields:
+                return False
+            expected = {
+                self.vectors_path: rows * dim * 4,
+                self.offsets_path: rows * 16,
+                self.times_path: rows * 8,
+                self.data_path: int(meta["data_size"]),
+            }
+            expected.update({path: rows * 4 for path in self.codes_paths.values()})
+            for path, size in expected.items():
+                if not os.path.exists(path) or os.path.getsize(path) < size:
+                    return False
+            for path, size in expected.items():
+                if os.path.getsize(path) > size:
+                    os.truncate(path, size)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[DEBUG] Ignoring mapped rows at {self.meta_path}: {e}")
+            return False
+
+        self.meta, self.rows, self.mapped_rows, self.dim = meta, rows, rows, dim
+        if rows:
+            self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, dim))
+            self.offsets = np.memmap(self.offsets_path, dtype=np.int64, mode="r", shape=(rows, 2))
+            self.times = np.memmap(self.times_path, dtype=np.float64, mode="r", shape=(rows,))
+            self.codes = {field: np.memmap(path, dtype=np.int32, mode="r", shape=(rows,))
+                          for field, path in self.codes_paths.items()}
+        else:
+            self.vectors = np.zeros((0, dim), dtype=np.float32)
+            self.offsets = np.zeros((0, 2), dtype=np.int64)
+            self.times = np.zeros(0, dtype=np.float64)
+            self.codes = {field: np.zeros(0, dtype=np.int32) for field in self.fields}
+        self._data_file = open(self.data_path, "rb")
+        return True
+
+    def reset(self):
+        self.close()
+        for path in self._all_paths() + [self.meta_path]:
+            if os.path.exists(path):
+                os.remove(path)
+        self.meta, self.rows, self.mapped_rows, self.dim = None, 0, 0, None
+
+    def read_record(self, row: int) -> Dict[str, Any]:
+        with self._lock:
+            record = self._cache.get(row)
+            if record is not None:
+                self._cache.move_to_end(row)
+                return record
+            offset, length = self.offsets[row]
+            self._data_file.seek(int(offset))
+            record = json.loads(self._data_file.read(int(length)))
+            self._cache[row] = record
+            if len(self._cache) > config.MEMORY_MAPPED_RECORD_CACHE:
+                self._cache.popitem(last=False)
+            return record
+
+    def iter_records(self, start: int, stop: int) -> Iterator[Dict[str, Any]]:
+        if start >= stop:
+            return
+        with open(self.data_path, "rb") as f:
+            f.seek(int(self.offsets[start][0]))
+            for _ in range(start, stop):
+                yield json.loads(f.readline())
+
+    def append(self, vectors: np.ndarray, records: List[Dict[str, Any]], times: np.ndarray,
+               codes: Dict[str, np.ndarray]):
+        if not records:
+            return
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if self.dim is not None and vectors.shape[1] != self.dim:
+            raise ValueError(f"Vector dimension {vectors.shape[1]} does not match mapped dimension {self.dim}.")
+        os.makedirs(os.path.dirname(os.path.abspath(self.meta_path)), exist_ok=True)
+        lines = [(json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8") for record in records]
+        with open(self.data_path, "ab") as data_file:
+            start = data_file.tell()
+            data_file.write(b"".join(lines))
+        lengths = np.asarray([len(line) for line in lines], dtype=np.int64)
+        offsets = np.column_stack([start + np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths]).astype(np.int64)
+        with open(self.vectors_path, "ab") as f:
+            f.write(vectors.tobytes())
+        with open(self.offsets_path, "ab") as f:
+            f.write(offsets.tobytes())
+        with open(self.times_path, "ab") as f:
+            f.write(np.asarray(times, dtype=np.float64).tobytes())
+        for field, path in self.codes_paths.items():
+            with open(path, "ab") as f:
+                f.write(np.asarray(codes[field], dtype=np.int32).tobytes())
+        self.rows += len(records)
+        self.dim = vectors.shape[1]
+
+    def commit(self, model: str, log_generation: int, log_size: int, values: Dict[str, List[Any]]):
+        if self.dim is None:
+            return
+        for path in self._all_paths():
+            if os.path.exists(path):
+                with open(path, "rb+") as f:
+                    os.fsync(f.fileno())
+        meta = {
+            "rows": self.rows,
+            "dim": self.dim,
+            "model": model,
+            "fields": self.fields,
+            "values": values,
+            "data_size": os.path.getsize(self.data_path) if os.path.exists(self.data_path) else 0,
+            "log_generation": log_generation,
+            "log_size": log_size,
+        }
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.meta_path)
+        self.meta = meta
+
+    def close(self):
+        if self._data_file is not None:
+            self._data_file.close()
+            self._data_file = None
+        self.vectors = self.offsets = self.times = None
+        self.codes = {}
+        self._cache.clear()
+
+
+if __name__ == "__main__":
+    import shutil
+    import tempfile
+    import time
+    from memory_log import MemoryLog
+    from memory_shard import MemoryShard
+    from embedding_sidecar import EmbeddingSidecar, content_hash
+
+    rows, dim, chunk = 1_000_000, 768, 50_000
+    model = config.EMBEDDING_MODEL
+    bench_dir = tempfile.mkdtemp(prefix="mapped_rows_bench_")
+    try:
+        base_path = os.path.join(bench_dir, "memory_store.jsonl")
+        open(base_path, "w").close()
+        fields = list(config.MEMORY_INDEXED_FIELDS)
+        row_file = MappedRowFile(base_path, fields)
+        sidecar = EmbeddingSidecar(base_path)
+        rng = np.random.default_rng(0)
+        for start in range(0, rows, chunk):
+            count = min(chunk, rows - start)
+            vectors = rng.normal(size=(count, dim)).astype(np.float32)
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+            records = [{"id": f"row-{start + i}", "page_content": f"message {start + i}",
+                        "metadata": {"user_id": "u", "project_id": "p", "session_id": f"s{(start + i) // 1000}",
+                                     "type": "ai" if i % 2 else "human"}} for i in range(count)]
+            times = 1.7e9 + np.arange(start, start + count, dtype=np.float64)
+            codes = {"user_id": np.zeros(count), "project_id": np.zeros(count),
+                     "session_id": np.arange(start, start + count) // 1000, "type": np.arange(count) % 2}
+            row_file.append(vectors, records, times, codes)
+            # Written directly: put_many would keep every vector pending in RAM.
+            with open(sidecar.vectors_path, "ab") as vf, open(sidecar.index_path, "a", encoding="utf-8") as idx:
+                offset = vf.tell()
+                vf.write(vectors.tobytes())
+                idx.write("".join(json.dumps({"hash": content_hash(r["page_content"]), "model": model,
+                                              "offset": offset + i * dim * 4, "dim": dim}) + "\n"
+                                  for i, r in enumerate(records)))
+        values = {"user_id": ["u"], "project_id": ["p"], "session_id": [f"s{i}" for i in range(rows // 1000 + 1)],
+                  "type": ["human", "ai"]}
+        row_file.commit(model, MemoryLog._read_generation(base_path), 0, values)
+        row_file.close()
+        size_gb = sum(os.path.getsize(p) for p in row_file._all_paths()) / 1e9
+        sidecar_gb = os.path.getsize(sidecar.vectors_path) / 1e9
+        print(f"Wrote {rows} rows x {dim} dims ({size_gb:.2f} GB, plus a {sidecar_gb:.2f} GB embedding sidecar)")
+
+        start = time.perf_counter()
+        shard = MemoryShard(bench_dir, None, model)
+        opened = time.perf_counter() - start
+        query = rng.normal(size=dim).astype(np.float32)
+        start = time.perf_counter()
+        hits = shard.search(query, {"user_id": "u", "project_id": "p", "session_id": "s42"}, k=5)
+        filtered = time.perf_counter() - start
+        start = time.perf_counter()
+        recent = shard.recent({"type": "ai"}, 5)
+        latest = time.perf_counter() - start
+        print(f"Cold start: {opened * 1e3:.1f} ms for {len(shard)} rows")
+        print(f"First filtered search: {filtered * 1e3:.1f} ms -> {[doc.page_content for doc, _ in hits]}")
+        print(f"Last 5 AI messages: {latest * 1e3:.1f} ms -> {[doc.page_content for doc in recent]}")
+        shard.close()
+    finally:
+        shutil.rmtree(bench_dir)
@@ -0,0 +1,208 @@
+import datetime
+from typing import Optional, Dict, Any, List, Sequence, Tuple
+
+import numpy as np
+
+import config
+
+
+class MetadataIndex:
+    def __init__(self, fields: Optional[Sequence[str]] = None, initial_capacity: int = 1024):
+        self.fields = list(fields if fields is not None else config.MEMORY_INDEXED_FIELDS)
+        self._codes: Dict[str, np.ndarray] = {field: np.full(initial_capacity, -1, dtype=np.int32) for field in self.fields}
+        self._values: Dict[str, List[Any]] = {field: [] for field in self.fields}
+        self._code_of: Dict[str, Dict[Any, int]] = {field: {} for field in self.fields}
+        self._counts: Dict[str, List[int]] = {field: [] for field in self.fields}
+        self._postings: Dict[Tuple[str, int], Tuple[np.ndarray, int]] = {}
+        self._size = 0
+
+    @classmethod
+    def from_columns(cls, codes: Dict[str, np.ndarray], values: Dict[str, List[Any]]) -> "MetadataIndex":
+        index = cls(fields=list(codes.keys()), initial_capacity=1)
+        for field, column in codes.items():
+            column = np.asarray(column, dtype=np.int32)
+            index._size = column.shape[0]
+            index._codes[field] = np.array(column, dtype=np.int32)
+            index._values[field] = list(values.get(field, []))
+            index._code_of[field] = {value: code for code, value in enumerate(index._values[field])}
+            present = column[column >= 0]
+            index._counts[field] = np.bincount(present, minlength=len(index._values[field])).tolist()
+        return index
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _reserve(self, size: int):
+        capacity = self._codes[self.fields[0]].shape[0] if self.fields else size
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity = max(1, capacity * 2)
+        for field in self.fields:
+            grown = np.full(capacity, -1, dtype=np.int32)
+            grown[:self._size] = self._codes[field][:self._size]
+            self._codes[field] = grown
+
+    def _code(self, field: str, value: Any) -> int:
+        code = self._code_of[field].get(value)
+        if code is None:
+            code = len(self._values[field])
+            self._code_of[field][value] = code
+            self._values[field].append(value)
+            self._counts[field].append(0)
+        return code
+
+    def add(self, row: int, metadata: Dict[str, Any]):
+        self._reserve(row + 1)
+        for field in self.fields:
+            value = metadata.get(field)
+            if value is None:
+                continue
+            code = self._code(field, value)
+            self._codes[field][row] = code
+            self._counts[field][code] += 1
+        self._size = max(self._size, row + 1)
+
+    def add_many(self, rows: Sequence[int], metadatas: Sequence[Dict[str, Any]]):
+        for row, metadata in zip(rows, metadatas):
+            self.add(row, metadata)
+
+    def columns(self, start: int, stop: int) -> Dict[str, np.ndarray]:
+        return {field: self._codes[field][start:stop] for field in self.fields}
+
+    def values(self) -> Dict[str, List[Any]]:
+        return {field: list(self._values[field]) for field in self.fields}
+
+    def split_filter(self, filter_by: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        indexed = {k: v for k, v in filter_by.items() if k in self._codes}
+        residual = {k: v for k, v in filter_by.items() if k not in self._codes}
+        return indexed, residual
+
+    def _posting_array(self, field: str, value: Any) -> np.ndarray:
+        code = self._code_of[field].get(value)
+        if code is None:
+            return np.zeros(0, dtype=np.int64)
+        rows, upto = self._postings.get((field, code), (np.zeros(0, dtype=np.int64), 0))
+        if upto < self._size:
+            new_rows = np.flatnonzero(self._codes[field][upto:self._size] == code) + upto
+            rows = np.concatenate([rows, new_rows.astype(np.int64)]) if rows.size else new_rows.astype(np.int64)
+            self._postings[(field, code)] = (rows, self._size)
+        return rows
+
+    def count(self, field: str, value: Any) -> int:
+        code = self._code_of.get(field, {}).get(value)
+        return 0 if code is None else self._counts[field][code]
+
+    def candidates(self, filter_by: Dict[str, Any]) -> Optional[np.ndarray]:
+        indexed, _ = self.split_filter(filter_by)
+        if not indexed:
+            return None
+        ordered = sorted(indexed.items(), key=lambda item: self.count(*item))
+        rows = self._posting_array(*ordered[0])
+        for field, value in ordered[1:]:
+            if rows.size == 0:
+                break
+            if self.count(field, value) == self._size:
+                continue
+            rows = np.intersect1d(rows, self._posting_array(field, value), assume_unique=True)
+        return rows
+
+
+def parse_timestamp(value: str) -> float:
+    parsed = datetime.datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed.timestamp()
+
+
+def day_bounds(day: str) -> Tuple[float, float]:
+    date = datetime.date.fromisoformat(day.strip()[:10])
+    start = datetime.datetime.combine(date, datetime.time.min, tzinfo=datetime.timezone.utc)
+    return start.timestamp(), (start + datetime.timedelta(days=1)).timestamp()
+
+
+class TimeIndex:
+    def __init__(self, initial_capacity: int = 1024):
+        self._times = np.zeros(initial_capacity, dtype=np.float64)
+        self._rows = np.zeros(initial_capacity, dtype=np.int64)
+        self._size = 0
+
+    @classmethod
+    def from_times(cls, times: np.ndarray) -> "TimeIndex":
+        times = np.asarray(times, dtype=np.float64)
+        rows = np.flatnonzero(~np.isnan(times))
+        present = times[rows]
+        if present.size and np.any(present[1:] < present[:-1]):
+            order = np.argsort(present, kind="stable")
+            rows, present = rows[order], present[order]
+        index = cls(initial_capacity=max(1024, rows.size))
+        index._times[:rows.size] = present
+        index._rows[:rows.size] = rows
+        index._size = int(rows.size)
+        return index
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _reserve(self, extra: int):
+        needed = self._size + extra
+        if needed <= self._times.shape[0]:
+            return
+        capacity = self._times.shape[0]
+        while capacity < needed:
+            capacity *= 2
+        for name in ("_times", "_rows"):
+            old = getattr(self, name)
+            grown = np.zeros(capacity, dtype=old.dtype)
+            grown[:self._size] = old[:self._size]
+            setattr(self, name, grown)
+
+    def add(self, row: int, timestamp: Optional[str]):
+        if not timestamp:
+            return
+        try:
+            when = parse_timestamp(timestamp)
+        except ValueError:
+            return
+        self._reserve(1)
+        if self._size == 0 or when >= self._times[self._size - 1]:
+            position = self._size
+        else:
+            position = int(np.searchsorted(self._times[:self._size], when, side="right"))
+            self._times[position + 1:self._size + 1] = self._times[position:self._size]
+            self._rows[position + 1:self._size + 1] = self._rows[position:self._size]
+        self._times[position] = when
+        self._rows[position] = row
+        self._size += 1
+
+    def add_many(self, rows: Sequence[int], metadatas: Sequence[Dict[str, Any]]):
+        for row, metadata in zip(rows, metadatas):
+            self.add(row, metadata.get("timestamp"))
+
+    def ordered_rows(self) -> np.ndarray:
+        return self._rows[:self._size]
+
+    def range(self, start: Optional[float] = None, end: Optional[float] = None) -> np.ndarray:
+        times = self._times[:self._size]
+        lo = 0 if start is None else int(np.searchsorted(times, start, side="left"))
+        hi = self._size if end is None else int(np.searchsorted(times, end, side="left"))
+        return self._rows[lo:hi]
+
+    def latest(self, n: int, candidates: Optional[np.ndarray] = None,
+               start: Optional[float] = None, end: Optional[float] = None) -> np.ndarray:
+        window = self.range(start, end)
+        if n <= 0 or window.size == 0:
+            return np.zeros(0, dtype=np.int64)
+        if candidates is None:
+            return window[-n:]
+        found: List[np.ndarray] = []
+        total, hi, block = 0, window.size, max(n, 64)
+        while hi > 0 and total < n:
+            lo = max(0, hi - block)
+            chunk = window[lo:hi]
+            matches = chunk[np.isin(chunk, candidates, assume_unique=True)]
+            found.append(matches)
+            total += matches.size
+            hi, block = lo, block * 2
+        rows = np.concatenate(found[::-1]) if found else np.zeros(0, dtype=np.int64)
+        return rows[-n:]
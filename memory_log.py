@@ -0,0 +1,249 @@
+import os
+import json
+import time
+import atexit
+import shutil
+import tempfile
+import threading
+from typing import Optional, Dict, Any, List
+
+import config
+
+
+class MemoryLog:
+    def __init__(self, path: str,
+                 fsync_every: Optional[int] = None,
+                 fsync_interval: Optional[float] = None,
+                 compact_interval: Optional[float] = None):
+        self.path = path
+        self.fsync_every = fsync_every if fsync_every is not None else config.MEMORY_LOG_FSYNC_EVERY
+        self.fsync_interval = fsync_interval if fsync_interval is not None else config.MEMORY_LOG_FSYNC_INTERVAL
+        self.compact_interval = compact_interval if compact_interval is not None else config.MEMORY_LOG_COMPACT_INTERVAL
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._terminate_torn_tail()
+        self.generation = self._read_generation(self.path)
+        self._pending_sync = 0
+        self._last_sync = time.monotonic()
+        self._last_compact = time.monotonic()
+        self.live_records = 0
+        self.dead_records = 0
+        self._closed = False
+
+        self._stop_event = threading.Event()
+        self._worker = threading.Thread(target=self._background_loop, daemon=True)
+        self._worker.start()
+        atexit.register(self.close)
+
+    def _terminate_torn_tail(self):
+        if self._file.tell() == 0:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            last_byte = f.read(1)
+        if last_byte != b"\n":
+            self._file.write("\n")
+            self._file.flush()
+
+    @staticmethod
+    def _read_generation(path: str) -> int:
+        try:
+            with open(path, "rb") as f:
+                entry = json.loads(f.readline())
+            return int(entry.get("generation", 0)) if entry.get("op") == "header" else 0
+        except (OSError, ValueError, AttributeError):
+            return 0
+
+    def position(self):
+        with self._lock:
+            self._file.flush()
+            return self.generation, self._file.tell()
+
+    def read_records_from(self, offset: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._file.flush()
+            records, dead = self._replay(self.path, start=offset)
+            self.live_records += len(records)
+            self.dead_records += dead
+        return records
+
+    def read_records(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._file.flush()
+            records, self.dead_records = self._replay(self.path)
+            self.live_records = len(records)
+        return records
+
+    @staticmethod
+    def _replay(path: str, size_limit: Optional[int] = None, start: int = 0):
+        live: Dict[str, Dict[str, Any]] = {}
+        dead = 0
+        if not os.path.exists(path):
+            return [], 0
+        with open(path, "rb") as f:
+            f.seek(start)
+            data = f.read(size_limit - start) if size_limit is not None else f.read()
+        for line_no, raw_line in enumerate(data.splitlines()):
+            if not raw_line.strip():
+                continue
+            try:
+                entry = json.loads(raw_line)
+            except ValueError:
+                dead += 1
+                continue
+            op = entry.get("op", "add")
+            if op == "header":
+                continue
+            record_id = entry.get("id") or f"legacy-{line_no}"
+            if op == "delete":
+                dead += 1 + (1 if live.pop(record_id, None) is not None else 0)
+                continue
+            if record_id in live or "id" not in entry:
+                dead += 1
+            live.pop(record_id, None)
+            live[record_id] = {
+                "op": "add",
+                "id": record_id,
+                "page_content": entry.get("page_content", ""),
+                "metadata": entry.get("metadata", {}),
+            }
+        return list(live.values()), dead
+
+    def append(self, record: Dict[str, Any]):
+        self.append_many([record])
+
+    def append_many(self, records: List[Dict[str, Any]]):
+        if not records:
+            return
+        payload = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+        deletes = sum(1 for record in records if record.get("op", "add") == "delete")
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("MemoryLog is closed.")
+            self._file.write(payload)
+            self._file.flush()
+            self.dead_records += deletes
+            self.live_records += len(records) - deletes
+            self._pending_sync += len(records)
+            if self._pending_sync >= self.fsync_every:
+                self._sync_locked()
+
+    def flush(self):
+        with self._lock:
+            if not self._closed:
+                self._sync_locked()
+
+    def _sync_locked(self):
+        if self._pending_sync:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._pending_sync = 0
+        self._last_sync = time.monotonic()
+
+    def needs_compaction(self) -> bool:
+        total = self.live_records + self.dead_records
+        return self.dead_records > 0 and self.dead_records >= total * config.MEMORY_LOG_COMPACT_DEAD_RATIO
+
+    def schedule_compaction(self):
+        self._last_compact = float("-inf")
+
+    def compact(self):
+        with self._compact_lock:
+            with self._lock:
+                if self._closed:
+                    return
+                self._sync_locked()
+                snapshot_size = os.path.getsize(self.path)
+
+            records, _ = self._replay(self.path, size_limit=snapshot_size)
+            dir_name = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp_path = tempfile.mkstemp(prefix=".memory_log_", suffix=".tmp", dir=dir_name)
+            try:
+                generation = self.generation + 1
+                with os.fdopen(fd, "w", encoding="utf-8") as tmp:
+                    tmp.write(json.dumps({"op": "header", "generation": generation}) + "\n")
+                    for record in records:
+                        tmp.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+                with self._lock:
+                    self._file.flush()
+                    with open(self.path, "rb") as src, open(tmp_path, "ab") as dst:
+                        src.seek(snapshot_size)
+                        tail = src.read()
+                        dst.write(tail)
+                        dst.flush()
+                        os.fsync(dst.fileno())
+                    self._file.close()
+                    os.replace(tmp_path, self.path)
+                    self._file = open(self.path, "a", encoding="utf-8")
+                    self.generation = generation
+                    self.live_records, self.dead_records = len(records) + tail.count(b"\n"), 0
+                    self._last_compact = time.monotonic()
+            except Exception as e:
+                print(f"[DEBUG] Memory log compaction failed for {self.path}: {e}")
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+    def _background_loop(self):
+        while not self._stop_event.wait(self.fsync_interval):
+            with self._lock:
+                if self._closed:
+                    return
+                if self._pending_sync and time.monotonic() - self._last_sync >= self.fsync_interval:
+                    self._sync_locked()
+            if time.monotonic() - self._last_compact >= self.compact_interval:
+                self._last_compact = time.monotonic()
+                if self.needs_compaction():
+                    self.compact()
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._sync_locked()
+            self._file.close()
+            self._closed = True
+        self._stop_event.set()
+
+
+if __name__ == "__main__":
+    bench_dir = tempfile.mkdtemp(prefix="memory_log_bench_")
+    sample = {"page_content": "x" * 200, "metadata": {"user_id": "user1", "session_id": "sess1", "project_id": "proj1",
+                                                      "timestamp": "2024-01-01T00:00:00+00:00", "type": "ai"}}
+    writes = 2000
+    try:
+        print(f"{'stored':>10} | {'append-only us/write':>20} | {'full rewrite us/write':>21}")
+        for stored in [1_000, 10_000, 100_000, 1_000_000]:
+            path = os.path.join(bench_dir, f"log_{stored}.jsonl")
+            with open(path, "w", encoding="utf-8") as f:
+                for i in range(stored):
+                    f.write(json.dumps(dict(sample, op="add", id=f"seed-{i}")) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+            log = MemoryLog(path, compact_interval=float("inf"))
+            start = time.perf_counter()
+            for i in range(writes):
+                log.append(dict(sample, op="add", id=f"bench-{i}"))
+            log.flush()
+            append_us = (time.perf_counter() - start) / writes * 1e6
+            log.close()
+
+            rewrite_cell = "skipped"
+            if stored <= 10_000:
+                records, _ = MemoryLog._replay(path)
+                rewrites = 20
+                start = time.perf_counter()
+                for _ in range(rewrites):
+                    with open(path, "w", encoding="utf-8") as f:
+                        for record in records:
+                            json.dump(record, f)
+                            f.write("\n")
+                rewrite_cell = f"{(time.perf_counter() - start) / rewrites * 1e6:.1f}"
+            print(f"{stored:>10} | {append_us:>20.1f} | {rewrite_cell:>21}")
+            os.remove(path)
+    finally:
+        shutil.rmtree(bench_dir)
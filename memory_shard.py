@@ -0,0 +1,342 @@
+import os
+import json
+import uuid
+import threading
+from typing import Optional, Dict, Any, List, Tuple, Callable
+
+import numpy as np
+from langchain_core.documents import Document
+
+from memory_log import MemoryLog
+from embedding_sidecar import EmbeddingSidecar, content_hash
+from vector_store import MatrixVectorStore
+from memory_index import MetadataIndex, TimeIndex, parse_timestamp
+from mapped_rows import MappedRowFile
+from ann_index import IVFIndex
+from keyword_index import BM25Index
+import config
+
+
+class MemoryShard:
+    def __init__(self, directory: str, embedding_model, embedding_model_name: str):
+        self.directory = directory
+        self.embedding_model = embedding_model
+        self.embedding_model_name = embedding_model_name
+        self.persistence_path = os.path.join(directory, "memory_store.jsonl")
+        self.store = MatrixVectorStore(embedding=embedding_model)
+        self.metadata_index = MetadataIndex()
+        self.time_index = TimeIndex()
+        self.ann_path = self.persistence_path + ".ivf.npz"
+        self.ann_index: Optional[IVFIndex] = None
+        self.keyword_index = BM25Index()
+        self.log = MemoryLog(self.persistence_path)
+        self._sidecar: Optional[EmbeddingSidecar] = None
+        self.rows_file = MappedRowFile(self.persistence_path, self.metadata_index.fields) if config.MEMORY_MAPPED_ROWS else None
+        self.cold_dir = os.path.join(directory, "cold")
+        self._cold: Optional["MemoryShard"] = None
+        self._row_bytes: List[np.ndarray] = []
+        self.hot_bytes = 0
+        self._lock = threading.RLock()
+        self._load_from_persistence()
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    @property
+    def sidecar(self) -> EmbeddingSidecar:
+        # Opened on first use: a shard served from fresh mapped rows never needs the cached embeddings.
+        with self._lock:
+            if self._sidecar is None:
+                self._sidecar = EmbeddingSidecar(self.persistence_path)
+            return self._sidecar
+
+    def _load_from_persistence(self):
+        records = None
+        if self.rows_file is not None:
+            generation, log_size = self.log.position()
+            if (self.rows_file.open(self.embedding_model_name)
+                    and self.rows_file.meta["log_generation"] == generation
+                    and self.rows_file.meta["log_size"] <= log_size):
+                self.store.attach_base(self.rows_file.vectors, self.rows_file.read_record)
+                self.metadata_index = MetadataIndex.from_columns(self.rows_file.codes, self.rows_file.meta["values"])
+                self.time_index = TimeIndex.from_times(self.rows_file.times)
+                self._track_bytes(np.asarray(self.rows_file.offsets[:, 1], dtype=np.int64))
+                records = self.log.read_records_from(self.rows_file.meta["log_size"])
+            else:
+                self.rows_file.reset()
+        if records is None:
+            records = self.log.read_records()
+        if records:
+            self._insert(records, self._embed_with_cache([r["page_content"] for r in records]))
+        self._sync_ann_index()
+        self._commit_rows()
+        if self.log.needs_compaction():
+            self.log.schedule_compaction()
+
+    def _track_bytes(self, sizes: np.ndarray):
+        self._row_bytes.append(sizes)
+        self.hot_bytes += int(sizes.sum())
+
+    def _commit_rows(self):
+        if self.rows_file is None:
+            return
+        with self._lock:
+            generation, log_size = self.log.position()
+            self.rows_file.commit(self.embedding_model_name, generation, log_size, self.metadata_index.values())
+
+    def _embed_with_cache(self, texts: List[str]) -> np.ndarray:
+        hashes = [content_hash(text) for text in texts]
+        vectors = [self.sidecar.get(h, self.embedding_model_name) for h in hashes]
+        missing = {}
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(hashes[i], texts[i])
+        if missing:
+            new_vectors = self.embedding_model.embed_documents(list(missing.values()), batch_size=config.EMBEDDING_BATCH_SIZE)
+            self.sidecar.put_many([(h, self.embedding_model_name, v) for h, v in zip(missing.keys(), new_vectors)])
+            vectors = [self.sidecar.get(h, self.embedding_model_name) for h in hashes]
+        return np.vstack(vectors)
+
+    def _insert(self, records: List[Dict[str, Any]], vectors: np.ndarray):
+        with self._lock:
+            metadatas = [r["metadata"] for r in records]
+            rows = self.store.add_vectors([r["id"] for r in records], [r["page_content"] for r in records],
+                                          metadatas, vectors)
+            self.metadata_index.add_many(rows, metadatas)
+            self.time_index.add_many(rows, metadatas)
+            self._track_bytes(np.asarray([len(json.dumps(r, ensure_ascii=False).encode("utf-8")) + 1 for r in records],
+                                         dtype=np.int64))
+            if self.rows_file is not None:
+                times = np.asarray([self._record_time(m) for m in metadatas], dtype=np.float64)
+                self.rows_file.append(self.store.row_vectors(rows[0], rows[-1] + 1), records, times,
+                                      self.metadata_index.columns(rows[0], rows[-1] + 1))
+
+    @staticmethod
+    def _record_time(metadata: Dict[str, Any]) -> float:
+        try:
+            return parse_timestamp(metadata["timestamp"])
+        except (KeyError, TypeError, ValueError):
+            return float("nan")
+
+    def add_records(self, records: List[Dict[str, Any]]):
+        if not records:
+            return
+        vectors = self._embed_with_cache([r["page_content"] for r in records])
+        with self._lock:
+            self._insert(records, vectors)
+            self._sync_ann_index()
+            self.log.append_many(records)
+
+    def _ann_matches_store(self, index: IVFIndex) -> bool:
+        if index.centroids.shape[1] != self.store.dim or index.indexed_rows > len(self.store):
+            return False
+        return index.indexed_rows == 0 or self.store.id_of(index.indexed_rows - 1) == index.last_indexed_id
+
+    def _sync_ann_index(self):
+        if not config.MEMORY_ANN_ENABLED or len(self.store) < config.MEMORY_ANN_MIN_ROWS:
+            return
+        if self.ann_index is None:
+            loaded = IVFIndex.load(self.ann_path)
+            self.ann_index = loaded if loaded and self._ann_matches_store(loaded) else None
+        if self.ann_index is None or len(self.store) > self.ann_index.trained_rows * config.MEMORY_ANN_RETRAIN_GROWTH:
+            print(f"[DEBUG] Training ANN index over {len(self.store)} memory records in {self.directory}...")
+            self.ann_index = IVFIndex()
+            self.ann_index.train(self.store.matrix)
+        start = self.ann_index.indexed_rows
+        if start < len(self.store):
+            self.ann_index.add(np.arange(start, len(self.store)), self.store.row_vectors(start, len(self.store)),
+                               last_id=self.store.id_of(len(self.store) - 1))
+            if start == 0:
+                self.ann_index.save(self.ann_path)
+
+    def _candidate_rows(self, filter_by: Dict[str, Any]) -> Optional[np.ndarray]:
+        _, residual = self.metadata_index.split_filter(filter_by)
+        rows = self.metadata_index.candidates(filter_by)
+        if not residual:
+            return rows
+        scan = range(len(self.store)) if rows is None else rows
+        return np.asarray([row for row in scan if all(self.store.metadata_of(row).get(f) == v for f, v in residual.items())],
+                          dtype=np.int64)
+
+    def _candidate_rows_in_window(self, filter_by: Dict[str, Any], start: Optional[float],
+                                  end: Optional[float]) -> Optional[np.ndarray]:
+        rows = self._candidate_rows(filter_by)
+        if start is None and end is None:
+            return rows
+        window = self.time_index.range(start, end)
+        if rows is None:
+            return np.sort(window)
+        return rows[np.isin(rows, window, assume_unique=True)]
+
+    def search(self, query_vector, filter_by: Dict[str, Any], k: int, start: Optional[float] = None,
+               end: Optional[float] = None) -> List[Tuple[Document, float]]:
+        with self._lock:
+            rows = self._candidate_rows_in_window(filter_by, start, end)
+            if rows is not None and rows.size == 0:
+                return []
+            if self.ann_index is not None and (rows is None or rows.size >= config.MEMORY_ANN_MIN_ROWS):
+                probed = self.ann_index.probe(query_vector)
+                rows = probed if rows is None else np.intersect1d(rows, probed, assume_unique=True)
+            hits = self.store.search_by_vector(query_vector, k=k, rows=rows)
+            return [(self.store.document(row), score) for row, score in hits]
+
+    def _sync_keyword_index(self):
+        start = len(self.keyword_index)
+        if start >= len(self.store):
+            return
+        mapped = self.rows_file.mapped_rows if self.rows_file is not None and self.rows_file.vectors is not None else 0
+        mapped_stop = min(mapped, len(self.store))
+        if start < mapped_stop:
+            texts = (record["page_content"] for record in self.rows_file.iter_records(start, mapped_stop))
+            self.keyword_index.add_many(range(start, mapped_stop), list(texts))
+            start = mapped_stop
+        rows = range(start, len(self.store))
+        self.keyword_index.add_many(rows, [self.store.record(row)["page_content"] for row in rows])
+
+    def keyword_search(self, query: str, filter_by: Dict[str, Any], k: int, start: Optional[float] = None,
+                       end: Optional[float] = None) -> Tuple[List[Tuple[Document, float]], int]:
+        with self._lock:
+            self._sync_keyword_index()
+            rows = self._candidate_rows_in_window(filter_by, start, end)
+            if rows is not None and rows.size == 0:
+                return [], 0
+            hits, full_matches = self.keyword_index.search(query, k, rows)
+            return [(self.store.document(row), score) for row, score in hits], full_matches
+
+    def recent(self, filter_by: Dict[str, Any], n: int, start: Optional[float] = None,
+               end: Optional[float] = None) -> List[Document]:
+        with self._lock:
+            candidates = self._candidate_rows(filter_by)
+            if candidates is not None and candidates.size == 0:
+                return []
+            return [self.store.document(row) for row in self.time_index.latest(n, candidates, start, end).tolist()]
+
+    def has_cold_tier(self) -> bool:
+        return self._cold is not None or os.path.exists(os.path.join(self.cold_dir, "memory_store.jsonl"))
+
+    def cold(self) -> "MemoryShard":
+        with self._lock:
+            if self._cold is None:
+                self._cold = MemoryShard(self.cold_dir, self.embedding_model, self.embedding_model_name)
+            return self._cold
+
+    def over_budget(self, max_records: Optional[int], max_bytes: Optional[int]) -> bool:
+        return ((max_records is not None and len(self.store) > max_records)
+                or (max_bytes is not None and self.hot_bytes > max_bytes))
+
+    def _rows_by_age(self) -> np.ndarray:
+        timed = self.time_index.ordered_rows()
+        untimed = np.setdiff1d(np.arange(len(self.store)), timed, assume_unique=True)
+        return np.concatenate([untimed, timed])
+
+    def _eviction_rows(self, max_records: Optional[int], max_bytes: Optional[int]) -> np.ndarray:
+        ratio = config.MEMORY_PROJECT_TARGET_RATIO
+        order = self._rows_by_age()
+        evict = 0
+        if max_records is not None:
+            evict = max(evict, len(order) - int(max_records * ratio))
+        if max_bytes is not None:
+            sizes = np.concatenate(self._row_bytes)[order]
+            kept = self.hot_bytes - np.concatenate([[0], np.cumsum(sizes)])
+            evict = max(evict, int(np.argmax(kept <= max_bytes * ratio)))
+        return order[:evict]
+
+    @staticmethod
+    def _summary_records(records: List[Dict[str, Any]],
+                         summarizer: Callable[[List[Dict[str, Any]]], str]) -> List[Dict[str, Any]]:
+        sessions: Dict[Any, List[Dict[str, Any]]] = {}
+        for record in records:
+            sessions.setdefault(record["metadata"].get("session_id"), []).append(record)
+        summaries = []
+        for session_id, group in sessions.items():
+            try:
+                text = summarizer(group)
+            except Exception as e:
+                print(f"[DEBUG] Failed to summarize {len(group)} evicted memory records: {e}")
+                continue
+            if not text:
+                continue
+            latest = group[-1]["metadata"]
+            summaries.append({
+                "op": "add",
+                "id": uuid.uuid4().hex,
+                "page_content": text,
+                "metadata": {
+                    "user_id": latest.get("user_id"),
+                    "session_id": session_id,
+                    "project_id": latest.get("project_id"),
+                    "timestamp": max((r["metadata"].get("timestamp", "") for r in group), default=""),
+                    "type": "summary",
+                    "summarized_records": len(group)
+                }
+            })
+        return summaries
+
+    def enforce_budget(self, max_records: Optional[int], max_bytes: Optional[int],
+                       summarizer: Optional[Callable[[List[Dict[str, Any]]], str]] = None) -> int:
+        with self._lock:
+            if not self.over_budget(max_records, max_bytes):
+                return 0
+            rows = self._eviction_rows(max_records, max_bytes)
+            if rows.size == 0:
+                return 0
+            records = [dict(self.store.record(row), op="add") for row in rows.tolist()]
+            vectors = self.store.vectors_at(rows)
+        summaries = self._summary_records(records, summarizer) if summarizer is not None else []
+        if summaries:
+            self._embed_with_cache([r["page_content"] for r in summaries])
+
+        with self._lock:
+            print(f"[DEBUG] Moving {len(records)} memory records from {self.directory} to the cold tier...")
+            cold_was_open = self._cold is not None
+            cold = self.cold()
+            cold.sidecar.put_many([(content_hash(r["page_content"]), self.embedding_model_name, v)
+                                   for r, v in zip(records, vectors)])
+            cold.add_records(records)
+            if cold_was_open:
+                cold.flush()
+            else:
+                cold.close()
+                self._cold = None
+            self.log.append_many([{"op": "delete", "id": r["id"]} for r in records])
+            # Summaries go into the log before the rebuild, so they reload from the sidecar and survive its retain().
+            if summaries:
+                self.log.append_many(summaries)
+            self._rebuild()
+            self._commit_rows()
+        return len(records)
+
+    def _rebuild(self):
+        self.log.compact()
+        if self.rows_file is not None:
+            self.rows_file.close()
+        if os.path.exists(self.ann_path):
+            os.remove(self.ann_path)
+        self.store = MatrixVectorStore(embedding=self.embedding_model)
+        self.metadata_index = MetadataIndex()
+        self.time_index = TimeIndex()
+        self.ann_index = None
+        self.keyword_index = BM25Index()
+        self._row_bytes, self.hot_bytes = [], 0
+        self._load_from_persistence()
+        self.sidecar.retain({(content_hash(self.store.record(row)["page_content"]), self.embedding_model_name)
+                             for row in range(len(self.store))})
+
+    def flush(self):
+        self.log.flush()
+        self._commit_rows()
+
+    def close(self):
+        with self._lock:
+            if self._cold is not None:
+                self._cold.close()
+                self._cold = None
+            if self.ann_index is not None:
+                self.ann_index.save(self.ann_path)
+            self._commit_rows()
+            self.log.close()
+            if self.rows_file is not None:
+                self.rows_file.close()
+            if self._sidecar is not None:
+                self._sidecar.close()
+                self._sidecar = None
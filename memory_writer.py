@@ -0,0 +1,258 @@
+import time
+import queue
+import threading
+from typing import Optional, Dict, Any, List, Tuple, Callable, Iterable
+
+import config
+
+
+class MemoryWriter:
+    def __init__(self, sink: Callable[[Tuple[str, str], List[Dict[str, Any]]], None],
+                 max_queue: Optional[int] = None,
+                 batch_size: Optional[int] = None,
+                 flush_interval: Optional[float] = None,
+                 fallback: Optional[Callable[[Tuple[str, str], List[Dict[str, Any]]], None]] = None):
+        self.sink = sink
+        self.fallback = fallback
+        self.batch_size = batch_size if batch_size is not None else config.MEMORY_WRITE_BATCH_SIZE
+        self.flush_interval = flush_interval if flush_interval is not None else config.MEMORY_WRITE_FLUSH_INTERVAL
+        self._queue: "queue.Queue[Optional[Tuple[Tuple[str, str], List[Dict[str, Any]]]]]" = queue.Queue(
+            maxsize=max_queue if max_queue is not None else config.MEMORY_WRITE_QUEUE_SIZE)
+        self._pending: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        self._retries: List[Tuple[float, int, Tuple[str, str], List[Dict[str, Any]]]] = []
+        self._failing: Dict[Tuple[str, str], int] = {}
+        self._cond = threading.Condition()
+        self._closed = False
+        self._stats = {
+            "queue_depth": 0,
+            "max_queue_depth": 0,
+            "submitted_records": 0,
+            "flushed_records": 0,
+            "failed_records": 0,
+            "retried_records": 0,
+            "spooled_records": 0,
+            "flushes": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "total_flush_ms": 0.0,
+        }
+        # Not a daemon: interpreter shutdown joins it before atexit handlers close the memory logs,
+        # so everything still queued when the main thread exits gets written.
+        self._worker = threading.Thread(target=self._run, name="memory-writer")
+        self._worker.start()
+
+    def submit(self, key: Tuple[str, str], records: List[Dict[str, Any]]):
+        if not records:
+            return
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("MemoryWriter is closed.")
+            self._pending.setdefault(key, []).extend(records)
+            self._stats["submitted_records"] += len(records)
+            self._stats["queue_depth"] += len(records)
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], self._stats["queue_depth"])
+        self._queue.put((key, records))
+
+    def pending(self, keys: Optional[Iterable[Tuple[str, str]]] = None) -> List[Dict[str, Any]]:
+        with self._cond:
+            selected = self._pending.keys() if keys is None else [key for key in keys if key in self._pending]
+            return [record for key in selected for record in self._pending[key]]
+
+    def pending_keys(self) -> List[Tuple[str, str]]:
+        with self._cond:
+            return list(self._pending.keys())
+
+    def _settled(self, key: Tuple[str, str]) -> bool:
+        return key not in self._pending or len(self._pending[key]) <= self._failing.get(key, 0)
+
+    def wait(self, keys: Optional[Iterable[Tuple[str, str]]] = None, timeout: Optional[float] = None) -> bool:
+        # Records waiting for a retry count as settled: they stay visible through pending() meanwhile.
+        keys = None if keys is None else set(keys)
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: all(self._settled(key) for key in (self._pending.keys() if keys is None else keys)), timeout)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._cond:
+            stats = dict(self._stats)
+        stats["avg_flush_ms"] = stats["total_flush_ms"] / stats["flushes"] if stats["flushes"] else 0.0
+        return stats
+
+    def _collect(self) -> List[Tuple[Tuple[str, str], List[Dict[str, Any]]]]:
+        timeout = self.flush_interval
+        with self._cond:
+            if self._retries:
+                timeout = max(0.0, min(timeout, min(due for due, _, _, _ in self._retries) - time.monotonic()))
+        try:
+            first = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return []
+        if first is None:
+            return [None]
+        items, count = [first], len(first[1])
+        deadline = time.monotonic() + self.flush_interval
+        while count < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            items.append(item)
+            if item is None:
+                break
+            count += len(item[1])
+        return items
+
+    def _due_retries(self, force: bool = False) -> List[Tuple[int, Tuple[str, str], List[Dict[str, Any]]]]:
+        now = time.monotonic()
+        with self._cond:
+            due = [(attempt, key, records) for at, attempt, key, records in self._retries if force or at <= now]
+            self._retries = [] if force else [entry for entry in self._retries if entry[0] > now]
+            for _, key, records in due:
+                self._failing[key] -= len(records)
+                if not self._failing[key]:
+                    del self._failing[key]
+            return due
+
+    def _flush(self, items: List[Tuple[Tuple[str, str], List[Dict[str, Any]]]],
+               retries: Optional[List[Tuple[int, Tuple[str, str], List[Dict[str, Any]]]]] = None):
+        groups: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        attempts: Dict[Tuple[str, str], int] = {}
+        for key, records in items:
+            groups.setdefault(key, []).extend(records)
+        for attempt, key, records in retries or []:
+            groups.setdefault(key, []).extend(records)
+            attempts[key] = max(attempts.get(key, 0), attempt)
+            with self._cond:
+                self._stats["retried_records"] += len(records)
+        for key, records in groups.items():
+            start = time.perf_counter()
+            failed = False
+            try:
+                self.sink(key, records)
+            except Exception as e:
+                failed = True
+                print(f"[DEBUG] Failed to persist {len(records)} memory records for {key}, will retry: {e}")
+            elapsed_ms = (time.perf_counter() - start) * 1e3
+            with self._cond:
+                if failed:
+                    # Failed batches stay pending and are retried with backoff; they are never dropped.
+                    attempt = attempts.get(key, 0) + 1
+                    delay = min(config.MEMORY_WRITE_RETRY_BASE_DELAY * 2 ** (attempt - 1),
+                                config.MEMORY_WRITE_RETRY_MAX_DELAY)
+                    self._retries.append((time.monotonic() + delay, attempt, key, records))
+                    self._failing[key] = self._failing.get(key, 0) + len(records)
+                else:
+                    done = {id(record) for record in records}
+                    remaining = [record for record in self._pending.get(key, []) if id(record) not in done]
+                    if remaining:
+                        self._pending[key] = remaining
+                    else:
+                        self._pending.pop(key, None)
+                    self._stats["queue_depth"] -= len(records)
+                self._stats["failed_records" if failed else "flushed_records"] += len(records)
+                self._stats["flushes"] += 1
+                self._stats["last_flush_ms"] = elapsed_ms
+                self._stats["max_flush_ms"] = max(self._stats["max_flush_ms"], elapsed_ms)
+                self._stats["total_flush_ms"] += elapsed_ms
+                self._cond.notify_all()
+
+    def _spool_failures(self):
+        for _, key, records in self._due_retries(force=True):
+            try:
+                if self.fallback is None:
+                    raise RuntimeError("no fallback configured")
+                self.fallback(key, records)
+            except Exception as e:
+                print(f"[DEBUG] Could not spool {len(records)} unsaved memory records for {key}: {e}")
+                continue
+            with self._cond:
+                done = {id(record) for record in records}
+                remaining = [record for record in self._pending.get(key, []) if id(record) not in done]
+                if remaining:
+                    self._pending[key] = remaining
+                else:
+                    self._pending.pop(key, None)
+                self._stats["queue_depth"] -= len(records)
+                self._stats["spooled_records"] += len(records)
+                self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            items = self._collect()
+            stop = bool(items) and items[-1] is None
+            records = [item for item in items if item is not None]
+            exiting = stop or (not items and not threading.main_thread().is_alive() and self._queue.empty())
+            retries = self._due_retries(force=exiting)
+            if records or retries:
+                self._flush(records, retries)
+            if exiting:
+                self._spool_failures()
+                return
+
+    def close(self):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+        self._queue.put(None)
+        self._worker.join()
+
+
+if __name__ == "__main__":
+    import os
+    import shutil
+    import tempfile
+    import datetime
+    import numpy as np
+    from langchain_core.embeddings import Embeddings
+    from memory_shard import MemoryShard
+
+    class SlowFakeEmbeddings(Embeddings):
+        def __init__(self, dim: int = 256, latency: float = 0.05):
+            self.dim, self.latency = dim, latency
+
+        def _vector(self, text: str) -> List[float]:
+            return np.random.default_rng(abs(hash(text)) % (2 ** 32)).normal(size=self.dim).tolist()
+
+        def embed_documents(self, texts: List[str], **kwargs) -> List[List[float]]:
+            time.sleep(self.latency)
+            return [self._vector(text) for text in texts]
+
+        def embed_query(self, text: str) -> List[float]:
+            return self._vector(text)
+
+    def make_records(prefix: str, n: int) -> List[Dict[str, Any]]:
+        now = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        return [{"op": "add", "id": f"{prefix}-{i}", "page_content": f"{prefix} message {i}",
+                 "metadata": {"user_id": "u", "project_id": "p", "session_id": "s", "timestamp": now, "type": "ai"}}
+                for i in range(n)]
+
+    writes = 100
+    bench_dir = tempfile.mkdtemp(prefix="memory_writer_bench_")
+    try:
+        embeddings = SlowFakeEmbeddings()
+        shard = MemoryShard(os.path.join(bench_dir, "sync"), embeddings, "fake")
+        start = time.perf_counter()
+        for record in make_records("sync", writes):
+            shard.add_records([record])
+        sync_ms = (time.perf_counter() - start) / writes * 1e3
+        shard.close()
+
+        shard = MemoryShard(os.path.join(bench_dir, "behind"), embeddings, "fake")
+        writer = MemoryWriter(lambda key, records: shard.add_records(records))
+        start = time.perf_counter()
+        for record in make_records("behind", writes):
+            writer.submit(("u", "p"), [record])
+        behind_ms = (time.perf_counter() - start) / writes * 1e3
+        writer.close()
+        shard.close()
+        stats = writer.metrics()
+
+        print(f"Synchronous add_records: {sync_ms:.2f} ms per write on the caller thread")
+        print(f"Write-behind submit:     {behind_ms:.3f} ms per write on the caller thread")
+        print(f"Writer: {stats['flushes']} flushes for {stats['flushed_records']} records, "
+              f"max queue depth {stats['max_queue_depth']}, avg flush {stats['avg_flush_ms']:.1f} ms, "
+              f"max flush {stats['max_flush_ms']:.1f} ms")
+    finally:
+        shutil.rmtree(bench_dir)
@@ -0,0 +1,206 @@
+import os
+import ast
+import time
+from typing import Optional, Dict, Tuple, List, Callable
+
+
+def extract_imports(tree: ast.Module) -> Dict[str, List[str]]:
+    imports: Dict[str, List[str]] = {}
+    # Imports are statements, so only statement bodies need visiting, not every expression node.
+    stack = list(reversed(tree.body))
+    while stack:
+        node = stack.pop()
+        if isinstance(node, ast.ImportFrom):
+            module = "." * node.level + (node.module or "")
+            if module not in imports:
+                imports[module] = []
+            for alias in node.names:
+                if alias.name not in imports[module]:
+                    imports[module].append(alias.name)
+        elif isinstance(node, ast.Import):
+            for alias in node.names:
+                imports.setdefault(alias.name, [])
+        else:
+            for field in ("finalbody", "orelse", "handlers", "cases", "body"):
+                children = getattr(node, field, None)
+                if isinstance(children, list):
+                    stack.extend(reversed(children))
+    return imports
+
+
+def import_statements(tree: ast.Module) -> List[Tuple[str, int, List[Tuple[str, Optional[str]]]]]:
+    statements = []
+    for node in tree.body:
+        if isinstance(node, ast.ImportFrom):
+            statements.append((node.module or "", node.level, [(a.name, a.asname) for a in node.names]))
+        elif isinstance(node, ast.Import):
+            statements.append(("", -1, [(a.name, a.asname) for a in node.names]))
+    return statements
+
+
+# Files modified this recently may change again within the same mtime tick, so they are re-parsed on the next update.
+_RACY_WINDOW_NS = 2_000_000_000
+
+
+def parse_import_file(path: str) -> Tuple[str, Optional[int], int, Dict[str, List[str]], Optional[list]]:
+    # Lives here rather than in import_graph so spawned pool workers import as little as possible.
+    try:
+        stat = os.stat(path)
+        with open(path, "rb") as f:
+            tree = ast.parse(f.read(), filename=path)
+    except (OSError, SyntaxError, ValueError) as e:
+        print(f"[DEBUG] Import graph skipped {path}: {e}")
+        return path, None, -1, {}, None
+    mtime = stat.st_mtime_ns if time.time_ns() - stat.st_mtime_ns >= _RACY_WINDOW_NS else None
+    statements = import_statements(tree) if os.path.basename(path) == "__init__.py" else None
+    return path, mtime, stat.st_size, extract_imports(tree), statements
+
+
+class ModuleIndex:
+    def __init__(self, files: Dict[str, str], file_cache=None,
+                 statements: Optional[Callable[[str], Optional[list]]] = None):
+        self.file_cache = file_cache
+        self.statements = statements
+        self._modules: Dict[str, str] = {}
+        self._namespace_modules: Dict[str, str] = {}
+        self._names: Dict[str, str] = {}
+        self._packages = set()
+
+        py_files = {rel: path for rel, path in files.items() if rel.endswith(".py")}
+        package_dirs = {os.path.dirname(rel) for rel in py_files if os.path.basename(rel) == "__init__.py"}
+        for rel in sorted(py_files, key=lambda r: (r.count(os.sep), r)):
+            path = py_files[rel]
+            parts = rel[:-3].split(os.sep)
+            is_init = parts[-1] == "__init__"
+            if is_init:
+                parts = parts[:-1]
+            if not parts:
+                continue
+            directory = os.path.dirname(rel)
+            depth = 0
+            while directory and directory in package_dirs:
+                directory = os.path.dirname(directory)
+                depth += 1
+            package_name = ".".join(parts[-(depth if is_init else depth + 1):])
+            namespace_name = ".".join(parts)
+            self._modules.setdefault(package_name, path)
+            self._namespace_modules.setdefault(namespace_name, path)
+            self._names.setdefault(os.path.normpath(path), package_name)
+            if is_init:
+                self._packages.add(package_name)
+
+    def __len__(self) -> int:
+        return len(self._modules)
+
+    def resolve(self, module: str) -> Optional[str]:
+        return self._modules.get(module) or self._namespace_modules.get(module)
+
+    def is_package(self, module: str) -> bool:
+        return module in self._packages
+
+    def module_name_of(self, path: str) -> Optional[str]:
+        return self._names.get(os.path.normpath(os.path.abspath(path)))
+
+    def absolute_name(self, module: str, level: int, from_file: Optional[str]) -> Optional[str]:
+        if level == 0:
+            return module
+        current = self.module_name_of(from_file) if from_file else None
+        if current is None:
+            return None
+        package = current.split(".") if os.path.basename(from_file) == "__init__.py" else current.split(".")[:-1]
+        if level - 1 > len(package):
+            return None
+        base = package[:len(package) - (level - 1)]
+        return ".".join(base + ([module] if module else [])) or None
+
+    def exports(self, package: str) -> Dict[str, Tuple[str, bool]]:
+        init_path = self.resolve(package)
+        if init_path is None or not self.is_package(package):
+            return {}
+        try:
+            statements = self.statements(init_path) if self.statements is not None else None
+            if statements is None and self.file_cache is not None:
+                statements = self.file_cache.summary(init_path, "init_imports", import_statements)
+            elif statements is None:
+                with open(init_path, "r", encoding="utf-8") as f:
+                    statements = import_statements(ast.parse(f.read(), filename=init_path))
+        except Exception as e:
+            print(f"[DEBUG] Failed to parse {init_path}: {e}")
+            return {}
+        exported: Dict[str, Tuple[str, bool]] = {}
+        for module, level, aliases in statements:
+            if level < 0:
+                for name, asname in aliases:
+                    if asname:
+                        exported[asname] = (name, True)
+                continue
+            source = self.absolute_name(module, level, init_path)
+            if source is None:
+                continue
+            for name, asname in aliases:
+                if name == "*":
+                    continue
+                submodule = f"{source}.{name}"
+                if self.resolve(submodule):
+                    exported[asname or name] = (submodule, True)
+                else:
+                    exported[asname or name] = (source, False)
+        return exported
+
+    def resolve_name(self, module: str, name: str, max_depth: int = 4) -> List[str]:
+        submodule = f"{module}.{name}"
+        if self.resolve(submodule):
+            return [submodule]
+        found = []
+        for _ in range(max_depth):
+            if not self.is_package(module):
+                break
+            target = self.exports(module).get(name)
+            if target is None:
+                break
+            target_module, is_module = target
+            found.append(target_module)
+            if is_module or not self.is_package(target_module):
+                break
+            module = target_module
+        return found
+
+
+if __name__ == "__main__":
+    import shutil
+    import tempfile
+
+    bench_dir = tempfile.mkdtemp(prefix="module_index_bench_")
+    try:
+        files = {}
+        for p in range(200):
+            for m in range(50):
+                rel = os.path.join("src", f"pkg{p}", "sub", f"mod{m}.py")
+                files[rel] = os.path.join(bench_dir, rel)
+            for rel in [os.path.join("src", f"pkg{p}", "__init__.py"), os.path.join("src", f"pkg{p}", "sub", "__init__.py"),
+                        os.path.join("tests", f"pkg{p}", "sub", "mod0.py")]:
+                files[rel] = os.path.join(bench_dir, rel)
+        for rel, path in files.items():
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(path, "w").close()
+
+        start = time.perf_counter()
+        index = ModuleIndex(files)
+        build_ms = (time.perf_counter() - start) * 1e3
+        lookups = [f"pkg{p}.sub.mod{m}" for p in range(200) for m in range(0, 50, 7)]
+        start = time.perf_counter()
+        for name in lookups:
+            index.resolve(name)
+        lookup_us = (time.perf_counter() - start) / len(lookups) * 1e6
+
+        start = time.perf_counter()
+        for name in lookups:
+            basename = name.split(".")[0] + ".py"
+            next((p for r, p in files.items() if os.path.basename(r) == basename), None)
+        scan_us = (time.perf_counter() - start) / len(lookups) * 1e6
+
+        print(f"{len(files)} files -> {len(index)} modules indexed in {build_ms:.1f} ms")
+        print(f"Dotted lookup: {lookup_us:.2f} us/import, basename scan: {scan_us:.1f} us/import")
+        print(f"pkg7.sub.mod0 -> {os.path.relpath(index.resolve('pkg7.sub.mod0'), bench_dir)}")
+    finally:
+        shutil.rmtree(bench_dir)
@@ -0,0 +1,250 @@
+import os
+import re
+from typing import Optional, Dict, List, Tuple, Iterable, Iterator, NamedTuple
+
+import config
+
+
+class ScanEntry(NamedTuple):
+    rel_path: str
+    path: str
+    is_dir: bool
+
+
+def _translate(pattern: str) -> str:
+    parts, i = [], 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            parts.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            parts.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            parts.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            parts.append("[^/]")
+            i += 1
+        elif pattern[i] == "[" and "]" in pattern[i + 1:]:
+            end = pattern.index("]", i + 1)
+            body = pattern[i + 1:end]
+            parts.append("[" + ("^" + body[1:] if body.startswith("!") else body) + "]")
+            i = end + 1
+        elif pattern[i] == "\\" and i + 1 < len(pattern):
+            parts.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            parts.append(re.escape(pattern[i]))
+            i += 1
+    return "".join(parts)
+
+
+def compile_patterns(lines: Iterable[str]) -> List[Tuple["re.Pattern", bool, bool]]:
+    rules = []
+    for line in lines:
+        line = line.rstrip("\n")
+        if not line.endswith("\\ "):
+            line = line.rstrip()
+        if not line or line.startswith("#"):
+            continue
+        negate = line.startswith("!")
+        if negate:
+            line = line[1:]
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        anchored = "/" in line
+        line = line.lstrip("/")
+        if not line:
+            continue
+        prefix = "^" if anchored else "^(?:.*/)?"
+        rules.append((re.compile(prefix + _translate(line) + "$"), negate, dir_only))
+    return rules
+
+
+class IgnoreRules:
+    def __init__(self, root: str, exclude: Optional[Iterable[str]] = None, use_gitignore: Optional[bool] = None,
+                 skip_virtualenvs: Optional[bool] = None):
+        self.root = os.path.abspath(root)
+        self.exclude = list(exclude) if exclude is not None else list(config.FILE_SCAN_EXCLUDE_GLOBS)
+        self.use_gitignore = use_gitignore if use_gitignore is not None else config.FILE_SCAN_USE_GITIGNORE
+        self.skip_virtualenvs = skip_virtualenvs if skip_virtualenvs is not None else config.FILE_SCAN_SKIP_VIRTUALENVS
+        self._exclude_rules = compile_patterns(self.exclude)
+        self._rules: Dict[str, List[Tuple["re.Pattern", bool, bool]]] = {}
+        self._mtimes: Dict[str, Optional[int]] = {}
+        self._chains: Dict[str, List[Tuple[int, List[Tuple["re.Pattern", bool, bool]]]]] = {}
+
+    def _stat_gitignore(self, rel_dir: str) -> Optional[int]:
+        try:
+            return os.stat(os.path.join(self.root, rel_dir, ".gitignore")).st_mtime_ns
+        except OSError:
+            return None
+
+    def _load(self, rel_dir: str, mtime: Optional[int]):
+        rules = []
+        if mtime is not None:
+            try:
+                with open(os.path.join(self.root, rel_dir, ".gitignore"), "r", encoding="utf-8", errors="replace") as f:
+                    rules = compile_patterns(f)
+            except OSError as e:
+                print(f"[DEBUG] Cannot read .gitignore in '{rel_dir or '.'}': {e}")
+        self._rules[rel_dir] = rules
+        self._mtimes[rel_dir] = mtime
+        self._chains.clear()
+
+    def _rules_for(self, rel_dir: str) -> List[Tuple["re.Pattern", bool, bool]]:
+        rules = self._rules.get(rel_dir)
+        if rules is None:
+            self._load(rel_dir, self._stat_gitignore(rel_dir))
+            rules = self._rules[rel_dir]
+        return rules
+
+    def _chain(self, rel_dir: str) -> List[Tuple[int, List[Tuple["re.Pattern", bool, bool]]]]:
+        chain = self._chains.get(rel_dir)
+        if chain is None:
+            chain = list(self._chain(os.path.dirname(rel_dir))) if rel_dir else []
+            rules = self._rules_for(rel_dir)
+            if rules:
+                chain.append((len(rel_dir) + 1 if rel_dir else 0, rules))
+            self._chains[rel_dir] = chain
+        return chain
+
+    def sync_dir(self, rel_dir: str) -> bool:
+        if not self.use_gitignore:
+            return False
+        mtime = self._stat_gitignore(rel_dir)
+        if rel_dir in self._mtimes and self._mtimes[rel_dir] == mtime:
+            return False
+        changed = rel_dir in self._mtimes or mtime is not None
+        self._load(rel_dir, mtime)
+        return changed
+
+    def changed(self) -> bool:
+        return self.use_gitignore and any(
+            mtime is not None and self._stat_gitignore(rel_dir) != mtime for rel_dir, mtime in self._mtimes.items())
+
+    def signature(self) -> Dict[str, int]:
+        return {rel_dir: mtime for rel_dir, mtime in self._mtimes.items() if mtime is not None}
+
+    def seed(self, signature: Dict[str, int]):
+        for rel_dir, mtime in signature.items():
+            self._mtimes.setdefault(rel_dir, mtime)
+
+    @staticmethod
+    def _match(rules, path: str, is_dir: bool, ignored: bool) -> bool:
+        for pattern, negate, dir_only in rules:
+            if (is_dir or not dir_only) and pattern.match(path):
+                ignored = not negate
+        return ignored
+
+    def ignored(self, rel_path: str, is_dir: bool, path: Optional[str] = None) -> bool:
+        posix = rel_path.replace(os.sep, "/")
+        ignored = self._match(self._exclude_rules, posix, is_dir, False)
+        if self.use_gitignore:
+            for offset, rules in self._chain(os.path.dirname(rel_path)):
+                ignored = self._match(rules, posix[offset:], is_dir, ignored)
+        if not ignored and is_dir and self.skip_virtualenvs:
+            ignored = os.path.isfile(os.path.join(path or os.path.join(self.root, rel_path), "pyvenv.cfg"))
+        return ignored
+
+
+def scan(root: str, include_ext: Optional[Iterable[str]] = None, ignore_hidden: bool = True,
+         follow_symlinks: bool = False, max_depth: Optional[int] = None, files: bool = True, dirs: bool = True,
+         rules: Optional[IgnoreRules] = None) -> Iterator[ScanEntry]:
+    root = os.path.abspath(root)
+    include_ext = set(include_ext) if include_ext else None
+    rules = rules if rules is not None else IgnoreRules(root)
+    stack = [("", 0)]
+    while stack:
+        rel_dir, depth = stack.pop()
+        subdirs = []
+        try:
+            entries = os.scandir(os.path.join(root, rel_dir) if rel_dir else root)
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                name = entry.name
+                if ignore_hidden and name.startswith('.'):
+                    continue
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    continue
+                rel_path = os.path.join(rel_dir, name) if rel_dir else name
+                if is_dir:
+                    if ignore_hidden and name == '__pycache__':
+                        continue
+                    if rules.ignored(rel_path, True, entry.path):
+                        continue
+                    if dirs:
+                        yield ScanEntry(rel_path, entry.path, True)
+                    if (max_depth is None or depth + 1 < max_depth) and (follow_symlinks or not entry.is_symlink()):
+                        subdirs.append(rel_path)
+                else:
+                    if include_ext and os.path.splitext(name)[1] not in include_ext:
+                        continue
+                    if rules.ignored(rel_path, False):
+                        continue
+                    if files:
+                        yield ScanEntry(rel_path, entry.path, False)
+        stack.extend((rel_path, depth + 1) for rel_path in reversed(subdirs))
+
+
+if __name__ == "__main__":
+    import time
+    import shutil
+    import tempfile
+
+    def legacy_walk(project_dir, include_ext=None):
+        found = {}
+        for root, dir_names, file_names in os.walk(project_dir):
+            dir_names[:] = [d for d in dir_names if not d.startswith('.') and d != '__pycache__']
+            for name in file_names:
+                if name.startswith('.') or (include_ext and os.path.splitext(name)[1] not in include_ext):
+                    continue
+                found[os.path.relpath(os.path.join(root, name), project_dir)] = os.path.join(root, name)
+            for name in dir_names:
+                found[os.path.relpath(os.path.join(root, name), project_dir)] = os.path.join(root, name)
+        return found
+
+    bench_dir = tempfile.mkdtemp(prefix="path_scanner_bench_")
+    project_dir = os.path.join(bench_dir, "project")
+    try:
+        def make_tree(base, n_dirs, files_per_dir, ext=".py"):
+            for d in range(n_dirs):
+                directory = os.path.join(base, f"pkg{d % 50}", f"mod{d}")
+                os.makedirs(directory, exist_ok=True)
+                for f in range(files_per_dir):
+                    open(os.path.join(directory, f"file{f}{ext}"), "w").close()
+
+        make_tree(os.path.join(project_dir, "src"), 100, 20)
+        site_packages = os.path.join(project_dir, "venv", "lib", "python3.11", "site-packages")
+        make_tree(site_packages, 2000, 20)
+        open(os.path.join(project_dir, "venv", "pyvenv.cfg"), "w").close()
+        make_tree(os.path.join(project_dir, "node_modules"), 1000, 10, ".js")
+        make_tree(os.path.join(project_dir, "generated"), 200, 10)
+        make_tree(os.path.join(project_dir, "build"), 100, 10)
+        with open(os.path.join(project_dir, ".gitignore"), "w") as f:
+            f.write("# generated code\n/generated/\n*.log\n")
+
+        start = time.perf_counter()
+        legacy = legacy_walk(project_dir, include_ext={'.py'})
+        legacy_ms = (time.perf_counter() - start) * 1e3
+
+        start = time.perf_counter()
+        stream = scan(project_dir, include_ext={'.py'}, dirs=False)
+        first = next(stream)
+        first_ms = (time.perf_counter() - start) * 1e3
+        scanned_files = [first] + list(stream)
+        scan_ms = (time.perf_counter() - start) * 1e3
+        scanned_dirs = list(scan(project_dir, files=False))
+
+        legacy_files = sum(1 for path in legacy.values() if os.path.isfile(path))
+        print(f"Legacy os.walk:  {legacy_ms:8.1f} ms, {legacy_files} files + {len(legacy) - legacy_files} directories mixed")
+        print(f"Ignore-aware:    {scan_ms:8.1f} ms, {len(scanned_files)} files, {len(scanned_dirs)} directories "
+              f"(first result after {first_ms:.2f} ms)")
+        print("Skipped: venv (pyvenv.cfg), node_modules and build (exclude globs), generated (.gitignore)")
+        print(f"Depth 2 directories: {sorted(e.rel_path for e in scan(project_dir, files=False, max_depth=2))[:4]} ...")
+    finally:
+        shutil.rmtree(bench_dir)
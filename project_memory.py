@@ -1,80 +1,358 @@
 import os
 import json
 import shutil
+import uuid
 import datetime
-from typing import Optional, Dict, Any, List
+import threading
+from collections import OrderedDict
+from urllib.parse import quote, unquote
+from typing import Optional, Dict, Any, List, Tuple, Iterator, Callable
 from dotenv import load_dotenv
 
 from langchain_core.documents import Document
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_community.vectorstores import InMemoryVectorStore
+from memory_log import MemoryLog
+from embedding_sidecar import EmbeddingSidecar, content_hash
+from memory_shard import MemoryShard
+from memory_writer import MemoryWriter
+from keyword_index import reciprocal_rank_fusion, is_exact_query
+from memory_index import parse_timestamp, day_bounds
 import config
 
 load_dotenv()
 
 class ProjectMemory:
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None,
+                 summarizer: Optional[Callable[[List[Dict[str, Any]]], str]] = None):
         if api_key is None:
             api_key = os.getenv("GOOGLE_API_KEY")
         if not api_key:
             raise ValueError("Google API Key not found.")
-        self.embedding_model = GoogleGenerativeAIEmbeddings(model="models/embedding-001", google_api_key=api_key)
-        self.persistence_path = os.path.join(config.FAISS_STORE_PATH, "memory_store.jsonl")
-        self.store = InMemoryVectorStore(embedding=self.embedding_model)
-        self._load_from_persistence()
+        self.embedding_model = GoogleGenerativeAIEmbeddings(model=config.EMBEDDING_MODEL, google_api_key=api_key)
+        self.embedding_model_name = config.EMBEDDING_MODEL
+        self.shards_dir = os.path.join(config.FAISS_STORE_PATH, "memory_shards")
+        self.max_loaded_shards = config.MEMORY_MAX_LOADED_SHARDS
+        self.summarizer = summarizer
+        self._shards: "OrderedDict[Tuple[str, str], MemoryShard]" = OrderedDict()
+        self._active_key: Optional[Tuple[str, str]] = None
+        self._pinned: Dict[Tuple[str, str], int] = {}
+        self._last_timestamp = datetime.datetime.min.replace(tzinfo=datetime.timezone.utc)
+        self._lock = threading.RLock()
+        self._migrate_legacy_store()
+        self._writer = MemoryWriter(self._write_records, fallback=self._spool_records) if config.MEMORY_WRITE_BEHIND else None
+        self._resubmit_spooled()
 
-    def _load_from_persistence(self):
-        if not os.path.exists(self.persistence_path):
+    def _shard_dir(self, user_id: str, project_id: str) -> str:
+        return os.path.join(self.shards_dir, quote(str(user_id), safe=""), quote(str(project_id), safe=""))
+
+    def _migrate_legacy_store(self):
+        legacy_path = os.path.join(config.FAISS_STORE_PATH, "memory_store.jsonl")
+        if not os.path.exists(legacy_path):
             return
-        documents = []
-        with open(self.persistence_path, "r", encoding="utf-8") as f:
-            for line in f:
-                data = json.loads(line.strip())
-                documents.append(Document(page_content=data["page_content"], metadata=data["metadata"]))
-        if documents:
-            self.store.add_documents(documents)
-
-    def _save_to_persistence(self):
-        docs = self.store.similarity_search("", k=9999)
-        with open(self.persistence_path, "w", encoding="utf-8") as f:
-            for doc in docs:
-                json.dump({"page_content": doc.page_content, "metadata": doc.metadata}, f)
-                f.write("\n")
+        records, _ = MemoryLog._replay(legacy_path)
+        legacy_sidecar = EmbeddingSidecar(legacy_path)
+        groups: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        for record in records:
+            key = (record["metadata"].get("user_id", "default_user"), record["metadata"].get("project_id", "default_project"))
+            groups.setdefault(key, []).append(record)
+        print(f"[DEBUG] Migrating {len(records)} memory records into {len(groups)} project shards...")
+        for (user_id, project_id), group in groups.items():
+            shard_path = os.path.join(self._shard_dir(user_id, project_id), "memory_store.jsonl")
+            log = MemoryLog(shard_path)
+            log.append_many(group)
+            log.close()
+            cached = []
+            for record in group:
+                text_hash = content_hash(record["page_content"])
+                vector = legacy_sidecar.get(text_hash, self.embedding_model_name)
+                if vector is not None:
+                    cached.append((text_hash, self.embedding_model_name, vector))
+            EmbeddingSidecar(shard_path).put_many(cached)
+        legacy_sidecar.close()
+        for suffix in ["", ".vectors.f32", ".vectors.idx", ".ivf.npz"]:
+            if os.path.exists(legacy_path + suffix):
+                os.replace(legacy_path + suffix, legacy_path + suffix + ".migrated")
+
+    def _get_shard(self, user_id: str, project_id: str) -> MemoryShard:
+        key = (str(user_id), str(project_id))
+        with self._lock:
+            shard = self._shards.get(key)
+            if shard is not None:
+                self._shards.move_to_end(key)
+                return shard
+            shard = MemoryShard(self._shard_dir(*key), self.embedding_model, self.embedding_model_name)
+            self._shards[key] = shard
+            self._evict_idle_shards()
+            return shard
+
+    def _acquire_shard(self, user_id: str, project_id: str) -> MemoryShard:
+        with self._lock:
+            shard = self._get_shard(user_id, project_id)
+            key = (str(user_id), str(project_id))
+            self._pinned[key] = self._pinned.get(key, 0) + 1
+            return shard
+
+    def _release_shard(self, user_id: str, project_id: str):
+        key = (str(user_id), str(project_id))
+        with self._lock:
+            self._pinned[key] -= 1
+            if not self._pinned[key]:
+                del self._pinned[key]
+            self._evict_idle_shards()
+
+    def _evict_idle_shards(self):
+        for key in list(self._shards.keys()):
+            if len(self._shards) <= self.max_loaded_shards:
+                break
+            if key == self._active_key or key in self._pinned:
+                continue
+            self._shards.pop(key).close()
+
+    def _existing_shard_keys(self, user_id: Optional[str] = None) -> List[Tuple[str, str]]:
+        keys = set(self._shards.keys())
+        if os.path.isdir(self.shards_dir):
+            user_dirs = [quote(str(user_id), safe="")] if user_id is not None else os.listdir(self.shards_dir)
+            for user_dir in user_dirs:
+                user_path = os.path.join(self.shards_dir, user_dir)
+                if not os.path.isdir(user_path):
+                    continue
+                for project_dir in os.listdir(user_path):
+                    if os.path.exists(os.path.join(user_path, project_dir, "memory_store.jsonl")):
+                        keys.add((unquote(user_dir), unquote(project_dir)))
+        if user_id is not None:
+            keys = {key for key in keys if key[0] == str(user_id)}
+        return sorted(keys)
+
+    def _shards_for(self, filter_by: Dict[str, Any], include_cold: bool = False) -> Iterator[MemoryShard]:
+        if "user_id" in filter_by and "project_id" in filter_by:
+            keys = [(str(filter_by["user_id"]), str(filter_by["project_id"]))]
+        else:
+            keys = self._existing_shard_keys(filter_by.get("user_id"))
+        for key in keys:
+            shard = self._acquire_shard(*key)
+            try:
+                yield shard
+                if include_cold and shard.has_cold_tier():
+                    yield shard.cold()
+            finally:
+                self._release_shard(*key)
+
+    def activate(self, user_id: str, project_id: str) -> MemoryShard:
+        with self._lock:
+            self._active_key = (str(user_id), str(project_id))
+            return self._get_shard(user_id, project_id)
+
+    def loaded_shards(self) -> List[Tuple[str, str]]:
+        return list(self._shards.keys())
 
     def add_response(self, response_content: str, user_id: str, session_id: str, project_id: str, message_type: str = "ai"):
-        doc = Document(
-            page_content=response_content,
-            metadata={
-                "user_id": user_id,
-                "session_id": session_id,
-                "project_id": project_id,
-                "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
-                "type": message_type
+        self.add_responses([{
+            "response_content": response_content,
+            "user_id": user_id,
+            "session_id": session_id,
+            "project_id": project_id,
+            "message_type": message_type
+        }])
+
+    def add_responses(self, batch: List[Dict[str, Any]]):
+        if not batch:
+            return
+        # One microsecond apart, so the time index keeps the turn order of a batch saved in a single call.
+        step = datetime.timedelta(microseconds=1)
+        with self._lock:
+            base = max(datetime.datetime.now(datetime.timezone.utc), self._last_timestamp + step)
+            self._last_timestamp = base + step * (len(batch) - 1)
+        groups: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        for i, item in enumerate(batch):
+            record = {
+                "op": "add",
+                "id": uuid.uuid4().hex,
+                "page_content": item["response_content"],
+                "metadata": {
+                    "user_id": item["user_id"],
+                    "session_id": item["session_id"],
+                    "project_id": item["project_id"],
+                    "timestamp": item.get("timestamp") or (base + step * i).isoformat(),
+                    "type": item.get("message_type", "ai")
+                }
             }
-        )
-        self.store.add_documents([doc])
-        self._save_to_persistence()
-
-    def _generic_load_chat_history(self, query: str, filter_by: Dict[str, Any], k: int = 5) -> str:
-        results = self.store.similarity_search_with_score(query, k=k * 2)
-        filtered_docs = [doc for doc, _ in results if all(doc.metadata.get(k) == v for k, v in filter_by.items())]
-        filtered_docs.sort(key=lambda d: d.metadata.get("timestamp", ""))
-        if not filtered_docs:
+            groups.setdefault((item["user_id"], item["project_id"]), []).append(record)
+        for key, records in groups.items():
+            if self._writer is not None:
+                self._writer.submit(key, records)
+            else:
+                self._write_records(key, records)
+
+    def _write_records(self, key: Tuple[str, str], records: List[Dict[str, Any]]):
+        shard = self._acquire_shard(*key)
+        try:
+            shard.add_records(records)
+            shard.enforce_budget(config.MEMORY_PROJECT_MAX_RECORDS, config.MEMORY_PROJECT_MAX_BYTES,
+                                 self.summarizer if config.MEMORY_SUMMARIZE_EVICTED else None)
+        finally:
+            self._release_shard(*key)
+
+    def _spool_path(self, key: Tuple[str, str]) -> str:
+        return os.path.join(self._shard_dir(*key), "memory_store.jsonl.unsaved")
+
+    def _spool_records(self, key: Tuple[str, str], records: List[Dict[str, Any]]):
+        path = self._spool_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        print(f"[DEBUG] Spooled {len(records)} unsaved memory records for {key} to {path}")
+
+    def _resubmit_spooled(self):
+        if not os.path.isdir(self.shards_dir):
+            return
+        for user_dir in os.listdir(self.shards_dir):
+            user_path = os.path.join(self.shards_dir, user_dir)
+            if not os.path.isdir(user_path):
+                continue
+            for project_dir in os.listdir(user_path):
+                key = (unquote(user_dir), unquote(project_dir))
+                path = self._spool_path(key)
+                if not os.path.exists(path):
+                    continue
+                records, _ = MemoryLog._replay(path)
+                os.remove(path)
+                if not records:
+                    continue
+                print(f"[DEBUG] Resubmitting {len(records)} spooled memory records for {key}")
+                if self._writer is not None:
+                    self._writer.submit(key, records)
+                else:
+                    self._write_records(key, records)
+
+    def _pending_docs(self, filter_by: Dict[str, Any], start: Optional[float] = None,
+                      end: Optional[float] = None) -> List[Document]:
+        if self._writer is None:
+            return []
+        docs = []
+        for record in self._writer.pending():
+            metadata = record["metadata"]
+            if any(metadata.get(field) != value for field, value in filter_by.items()):
+                continue
+            when = parse_timestamp(metadata["timestamp"])
+            if (start is not None and when < start) or (end is not None and when >= end):
+                continue
+            docs.append(Document(id=record["id"], page_content=record["page_content"], metadata=metadata))
+        return docs
+
+    def _wait_for_pending(self, filter_by: Dict[str, Any]):
+        if self._writer is None:
+            return
+        keys = [key for key in self._writer.pending_keys()
+                if str(filter_by.get("user_id", key[0])) == key[0] and str(filter_by.get("project_id", key[1])) == key[1]]
+        if keys:
+            self._writer.wait(keys)
+
+    def write_metrics(self) -> Dict[str, Any]:
+        return self._writer.metrics() if self._writer is not None else {}
+
+    def flush(self):
+        if self._writer is not None:
+            self._writer.wait()
+        with self._lock:
+            for shard in self._shards.values():
+                shard.flush()
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        with self._lock:
+            while self._shards:
+                self._shards.popitem(last=False)[1].close()
+
+    def _format_history(self, docs: List[Document]) -> str:
+        if not docs:
             return "No relevant history found."
         return "\n---\n".join([
             f"PAST {doc.metadata.get('type', 'unknown').upper()} MESSAGE:\n{doc.page_content}"
-            for doc in filtered_docs[-k:]
+            for doc in docs
         ])
 
-    def load_chat_on_current_project(self, query: str, user_id: str, project_id: str, k: int = 5) -> str:
-        return self._generic_load_chat_history(query, {"user_id": user_id, "project_id": project_id}, k)
+    def _recent_docs(self, filter_by: Dict[str, Any], n: int, start: Optional[float] = None,
+                     end: Optional[float] = None, include_cold: bool = False) -> List[Document]:
+        pending = self._pending_docs(filter_by, start, end)
+        docs = [doc for shard in self._shards_for(filter_by, include_cold)
+                for doc in shard.recent(filter_by, n, start, end)]
+        seen = {doc.id for doc in docs}
+        docs.extend(doc for doc in pending if doc.id not in seen)
+        docs.sort(key=lambda d: parse_timestamp(d.metadata["timestamp"]))
+        return docs[-n:] if n > 0 else []
+
+    def _generic_load_chat_history(self, query: Optional[str], filter_by: Dict[str, Any], k: int = 5,
+                                   start: Optional[float] = None, end: Optional[float] = None,
+                                   include_cold: bool = False) -> str:
+        if not query:
+            return self._format_history(self._recent_docs(filter_by, k, start, end, include_cold))
+        self._wait_for_pending(filter_by)
+        mode = config.MEMORY_SEARCH_MODE
+        depth = k if mode == "vector" else max(k, config.MEMORY_FUSION_CANDIDATES)
+        keyword_hits = []
+        full_matches = 0
+        if mode != "vector":
+            for shard in self._shards_for(filter_by, include_cold):
+                if not len(shard):
+                    continue
+                shard_hits, shard_full_matches = shard.keyword_search(query, filter_by, depth, start, end)
+                keyword_hits.extend(shard_hits)
+                full_matches += shard_full_matches
+            keyword_hits.sort(key=lambda hit: hit[1], reverse=True)
+        # Only identifier, path or quoted queries may skip the embedding; natural language always fuses with vectors.
+        exact = mode == "auto" and full_matches and is_exact_query(query)
+        if mode == "keyword" or (exact and full_matches >= k):
+            docs = [doc for doc, _ in keyword_hits[:k]]
+        else:
+            # An exact query keeps its literal matches on top; the fused ranking only tops them up to k.
+            pinned = [doc for doc, _ in keyword_hits[:full_matches]] if exact else []
+            query_vector = None
+            vector_hits = []
+            for shard in self._shards_for(filter_by, include_cold):
+                if not len(shard):
+                    continue
+                if query_vector is None:
+                    query_vector = self.embedding_model.embed_query(query)
+                vector_hits.extend(shard.search(query_vector, filter_by, depth, start, end))
+            vector_hits.sort(key=lambda hit: hit[1], reverse=True)
+            if keyword_hits:
+                fused = reciprocal_rank_fusion([[doc.id for doc, _ in vector_hits], [doc.id for doc, _ in keyword_hits]])
+                by_id = {doc.id: doc for doc, _ in keyword_hits + vector_hits}
+                ranked = [by_id[doc_id] for doc_id in sorted(fused, key=fused.get, reverse=True)]
+            else:
+                ranked = [doc for doc, _ in vector_hits]
+            pinned_ids = {doc.id for doc in pinned}
+            docs = pinned + [doc for doc in ranked if doc.id not in pinned_ids][:k - len(pinned)]
+        docs.sort(key=lambda d: d.metadata.get("timestamp", ""))
+        return self._format_history(docs)
+
+    def load_chat_on_current_project(self, query: str, user_id: str, project_id: str, k: int = 5,
+                                     include_cold: bool = False) -> str:
+        return self._generic_load_chat_history(query, {"user_id": user_id, "project_id": project_id}, k,
+                                               include_cold=include_cold)
 
     def load_chat_for_user_session(self, query: str, user_id: str, session_id: str, k: int = 5) -> str:
         return self._generic_load_chat_history(query, {"user_id": user_id, "session_id": session_id}, k)
 
     def load_chat_on_user_date(self, query: str, user_id: str, time: str, k: int = 5) -> str:
-        return self._generic_load_chat_history(query, {"user_id": user_id, "timestamp": time}, k)
+        try:
+            start, end = day_bounds(time)
+        except ValueError:
+            return "No relevant history found."
+        return self._generic_load_chat_history(query, {"user_id": user_id}, k, start, end)
+
+    def load_chat_in_window(self, query: Optional[str], filter_by: Dict[str, Any], start: Optional[str] = None,
+                            end: Optional[str] = None, k: int = 5, include_cold: bool = False) -> str:
+        start_ts = parse_timestamp(start) if start else None
+        end_ts = parse_timestamp(end) if end else None
+        return self._generic_load_chat_history(query, filter_by, k, start_ts, end_ts, include_cold)
 
+    def load_recent_chat(self, filter_by: Dict[str, Any], n: int = 5) -> str:
+        return self._format_history(self._recent_docs(filter_by, n))
 
 if __name__ == "__main__":
     api_key = os.getenv("GOOGLE_API_KEY")
@@ -90,10 +368,12 @@ if __name__ == "__main__":
     memory = ProjectMemory(api_key)
     memory.add_response("Hello! How can I assist?", "user1", "sess1", "proj1", "ai")
     memory.add_response("I need help with deployment.", "user1", "sess1", "proj1", "human")
+    memory.close()
 
     memory = ProjectMemory(api_key)
     history = memory.load_chat_on_current_project("deployment", "user1", "proj1")
     print(history)
+    memory.close()
 
     shutil.rmtree(test_dir)
     config.FAISS_STORE_PATH = original_path
@@ -0,0 +1,172 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+
+import config
+
+
+def content_hash(text: Optional[str]) -> str:
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+def prompt_key(**parts: Any) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, max_entries: Optional[int] = None, ttl: Optional[float] = None,
+                 disk_dir: Optional[str] = None, use_disk: Optional[bool] = None):
+        self.max_entries = max_entries if max_entries is not None else config.RESPONSE_CACHE_MAX_ENTRIES
+        self.ttl = ttl if ttl is not None else config.RESPONSE_CACHE_TTL
+        use_disk = use_disk if use_disk is not None else config.RESPONSE_CACHE_DISK_ENABLED
+        self.disk_dir = (disk_dir or os.path.join(config.FAISS_STORE_PATH, "response_cache")) if use_disk else None
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else 0.0
+
+    def _project_dir(self, project_id: str) -> Optional[str]:
+        if self.disk_dir is None:
+            return None
+        return os.path.join(self.disk_dir, hashlib.sha1(project_id.encode("utf-8")).hexdigest())
+
+    def _disk_path(self, project_id: str, key: str) -> Optional[str]:
+        project_dir = self._project_dir(project_id)
+        return os.path.join(project_dir, key[:2], key + ".json") if project_dir else None
+
+    def _expired(self, entry: Dict[str, Any]) -> bool:
+        return self.ttl > 0 and time.time() - entry["created"] > self.ttl
+
+    def _store(self, key: str, entry: Dict[str, Any]):
+        self._entries.pop(key, None)
+        self._entries[key] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _load_disk(self, project_id: str, key: str) -> Optional[Dict[str, Any]]:
+        disk_path = self._disk_path(project_id, key)
+        if disk_path is None or not os.path.exists(disk_path):
+            return None
+        try:
+            with open(disk_path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[DEBUG] Ignoring response cache entry {disk_path}: {e}")
+            return None
+        if entry.get("project") != project_id or self._expired(entry):
+            self._remove_disk(project_id, key)
+            return None
+        return entry
+
+    def _save_disk(self, key: str, entry: Dict[str, Any]):
+        disk_path = self._disk_path(entry["project"], key)
+        if disk_path is None:
+            return
+        try:
+            os.makedirs(os.path.dirname(disk_path), exist_ok=True)
+            tmp_path = disk_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, disk_path)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"[DEBUG] Failed to write response cache entry {disk_path}: {e}")
+
+    def _remove_disk(self, project_id: str, key: str):
+        disk_path = self._disk_path(project_id, key)
+        if disk_path is not None:
+            try:
+                os.remove(disk_path)
+            except OSError:
+                pass
+
+    def get(self, project_id: str, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry["project"] != project_id:
+                entry = None
+            if entry is not None and self._expired(entry):
+                del self._entries[key]
+                self._remove_disk(project_id, key)
+                self.stats["expired"] += 1
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry
+            entry = self._load_disk(project_id, key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self._store(key, entry)
+            self.stats["hits"] += 1
+            self.stats["disk_hits"] += 1
+            return entry
+
+    def put(self, project_id: str, key: str, response: Dict[str, Any], raw: str = ""):
+        entry = {"project": project_id, "created": time.time(), "response": response, "raw": raw}
+        with self._lock:
+            self._store(key, entry)
+            self._save_disk(key, entry)
+
+    def invalidate(self, project_id: Optional[str] = None) -> int:
+        with self._lock:
+            keys = [key for key, entry in self._entries.items() if project_id is None or entry["project"] == project_id]
+            for key in keys:
+                del self._entries[key]
+            target = self.disk_dir if project_id is None else self._project_dir(project_id)
+            if target is not None and os.path.isdir(target):
+                shutil.rmtree(target, ignore_errors=True)
+            return len(keys)
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    bench_dir = tempfile.mkdtemp(prefix="response_cache_bench_")
+    try:
+        active_code = "def handle(request):\n    return request.body\n" * 400
+        context = {f"pkg/module_{i}.py": f"VALUE_{i} = {i}\n" * 300 for i in range(8)}
+
+        def key_for(command):
+            return prompt_key(command=command.strip().lower(), active=content_hash(active_code),
+                              context={path: content_hash(text) for path, text in context.items()},
+                              goal="Build a voice assistant", history="")
+
+        def fake_llm(command):
+            time.sleep(1.5)
+            return {"Guidance": f"Answer for {command}", "Suggested code": "None"}
+
+        cache = ResponseCache(disk_dir=os.path.join(bench_dir, "cache"), use_disk=True)
+        timings = []
+        for command in ["review this file", "explain this file", "review this file", "Review this file ", "explain this file"]:
+            start = time.perf_counter()
+            key = key_for(command)
+            entry = cache.get("demo", key)
+            if entry is None:
+                cache.put("demo", key, fake_llm(command))
+            timings.append((command, entry is not None, (time.perf_counter() - start) * 1e3))
+        for command, hit, ms in timings:
+            print(f"{command!r:>22}: {'hit ' if hit else 'miss'} {ms:8.2f} ms")
+
+        restarted = ResponseCache(disk_dir=os.path.join(bench_dir, "cache"), use_disk=True)
+        start = time.perf_counter()
+        restarted.get("demo", key_for("review this file"))
+        print(f"After restart (disk tier): {(time.perf_counter() - start) * 1e3:.2f} ms")
+        print(f"Hit ratio {cache.hit_ratio:.0%} {cache.stats}")
+        print(f"Invalidated {cache.invalidate('demo')} entries; "
+              f"lookup afterwards: {cache.get('demo', key_for('review this file'))}")
+    finally:
+        shutil.rmtree(bench_dir)
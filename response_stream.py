@@ -0,0 +1,193 @@
+import re
+import queue
+import threading
+from typing import Optional, Callable, Iterable, AsyncIterable, List, Any
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+_SENTENCE_END = re.compile(r"[.!?](?=[\s\"')\]]*\s)|\n")
+
+
+class JsonFieldStream:
+    def __init__(self, field: str):
+        self._key = re.compile(r'"' + re.escape(field) + r'"\s*:\s*"')
+        self._buffer = ""
+        self._state = "search"
+        self.value = ""
+
+    @property
+    def done(self) -> bool:
+        return self._state == "done"
+
+    def feed(self, chunk: str) -> str:
+        if self._state == "done":
+            return ""
+        self._buffer += chunk
+        if self._state == "search":
+            match = self._key.search(self._buffer)
+            if match is None:
+                # Keep enough of the tail to match a key split across chunks.
+                self._buffer = self._buffer[-(len(self._key.pattern) + 16):]
+                return ""
+            self._buffer = self._buffer[match.end():]
+            self._state = "value"
+        decoded, i, text = [], 0, self._buffer
+        while i < len(text):
+            char = text[i]
+            if char == '"':
+                self._state = "done"
+                i += 1
+                break
+            if char != "\\":
+                decoded.append(char)
+                i += 1
+                continue
+            if i + 1 >= len(text):
+                break
+            escape = text[i + 1]
+            if escape == "u":
+                if i + 6 > len(text):
+                    break
+                try:
+                    decoded.append(chr(int(text[i + 2:i + 6], 16)))
+                except ValueError:
+                    decoded.append(text[i:i + 6])
+                i += 6
+            else:
+                decoded.append(_ESCAPES.get(escape, escape))
+                i += 2
+        self._buffer = text[i:]
+        new_text = "".join(decoded)
+        self.value += new_text
+        return new_text
+
+
+class SentenceBuffer:
+    def __init__(self, min_chars: int = 0):
+        self.min_chars = min_chars
+        self._pending = ""
+
+    def feed(self, text: str) -> List[str]:
+        self._pending += text
+        sentences, start = [], 0
+        for match in _SENTENCE_END.finditer(self._pending):
+            sentence = self._pending[start:match.end()].strip()
+            if len(sentence) < self.min_chars and match.group() != "\n":
+                continue
+            if sentence:
+                sentences.append(sentence)
+            start = match.end()
+        self._pending = self._pending[start:]
+        return sentences
+
+    def flush(self) -> Optional[str]:
+        sentence, self._pending = self._pending.strip(), ""
+        return sentence or None
+
+
+def _emit_field_text(parser: JsonFieldStream, sentences: SentenceBuffer, text: str,
+                     on_sentence: Callable[[str], None]):
+    for sentence in sentences.feed(parser.feed(text)):
+        on_sentence(sentence)
+    if parser.done:
+        # The closing quote ends the last sentence; don't hold it until the rest of the response has streamed.
+        rest = sentences.flush()
+        if rest:
+            on_sentence(rest)
+
+
+def stream_field_sentences(chunks: Iterable[Any], field: str, on_sentence: Callable[[str], None],
+                           min_chars: int = 0) -> str:
+    parser = JsonFieldStream(field)
+    sentences = SentenceBuffer(min_chars)
+    raw = []
+    for chunk in chunks:
+        text = chunk if isinstance(chunk, str) else getattr(chunk, "content", str(chunk))
+        raw.append(text)
+        if not parser.done:
+            _emit_field_text(parser, sentences, text, on_sentence)
+    rest = sentences.flush()
+    if rest:
+        on_sentence(rest)
+    return "".join(raw)
+
+
+async def astream_field_sentences(chunks: AsyncIterable[Any], field: str, on_sentence: Callable[[str], None],
+                                  min_chars: int = 0) -> str:
+    parser = JsonFieldStream(field)
+    sentences = SentenceBuffer(min_chars)
+    raw = []
+    async for chunk in chunks:
+        text = chunk if isinstance(chunk, str) else getattr(chunk, "content", str(chunk))
+        raw.append(text)
+        if not parser.done:
+            _emit_field_text(parser, sentences, text, on_sentence)
+    rest = sentences.flush()
+    if rest:
+        on_sentence(rest)
+    return "".join(raw)
+
+
+class StreamingCall:
+    _DONE = object()
+
+    def __init__(self, target: Callable[[Callable[[str], None]], Any]):
+        self._queue: "queue.Queue" = queue.Queue()
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._run, args=(target,), daemon=True)
+        self._thread.start()
+
+    def _run(self, target):
+        try:
+            self.result = target(self._queue.put)
+        except BaseException as e:
+            self.error = e
+        finally:
+            self._queue.put(self._DONE)
+
+    def __iter__(self):
+        while True:
+            item = self._queue.get()
+            if item is self._DONE:
+                return
+            yield item
+
+    def wait(self) -> Any:
+        for _ in self:
+            pass
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+if __name__ == "__main__":
+    import json
+    import time
+
+    guidance = ("The loop re-reads the config on every iteration. Move the read above the loop! "
+                "Also, \"LIMIT\" is shadowed inside handle_request; rename it.\nFinally, add a test for the empty list case.")
+    response = json.dumps({"Guidance": guidance, "Suggested code": "def f():\n    return 1\n" * 40})
+    chunk_size, delay = 24, 0.004
+
+    def fake_stream():
+        for i in range(0, len(response), chunk_size):
+            time.sleep(delay)
+            yield response[i:i + chunk_size]
+
+    start = time.perf_counter()
+    first = []
+    spoken = []
+
+    def on_sentence(sentence):
+        if not first:
+            first.append(time.perf_counter() - start)
+        spoken.append(sentence)
+
+    raw = stream_field_sentences(fake_stream(), "Guidance", on_sentence, min_chars=12)
+    total = time.perf_counter() - start
+    assert json.loads(raw)["Guidance"] == guidance and " ".join(spoken).replace("\n", " ") == guidance.replace("\n", " ")
+    print(f"Blocking call: first word after {total * 1e3:.0f} ms (whole response)")
+    print(f"Streaming:     first sentence after {first[0] * 1e3:.0f} ms, {len(spoken)} sentences")
+    for sentence in spoken:
+        print("  ->", sentence)
@@ -0,0 +1,291 @@
+import os
+import ast
+import time
+import threading
+from typing import Optional, Dict, Any, List, Tuple
+
+
+class _SymbolVisitor(ast.NodeVisitor):
+    def __init__(self):
+        self.scope: List[Tuple[str, str]] = []
+        self.definitions: List[List[Any]] = []
+        self.calls: Dict[str, List[int]] = {}
+        self.refs: Dict[str, List[int]] = {}
+
+    def _define(self, name: str, kind: str, node: ast.AST):
+        start = min([node.lineno] + [d.lineno for d in getattr(node, "decorator_list", [])])
+        qualname = ".".join([s for s, _ in self.scope] + [name])
+        self.definitions.append([qualname, kind, start, node.end_lineno])
+
+    def _scoped(self, node, kind: str):
+        if kind == "function" and self.scope and self.scope[-1][1] == "class":
+            kind = "method"
+        self._define(node.name, kind, node)
+        for decorator in node.decorator_list:
+            self.visit(decorator)
+        for field in ("args", "returns", "bases", "keywords"):
+            value = getattr(node, field, None)
+            for child in value if isinstance(value, list) else [value]:
+                if isinstance(child, ast.AST):
+                    self.visit(child)
+        self.scope.append((node.name, kind))
+        for child in node.body:
+            self.visit(child)
+        self.scope.pop()
+
+    def visit_FunctionDef(self, node):
+        self._scoped(node, "function")
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_ClassDef(self, node):
+        self._scoped(node, "class")
+
+    def visit_Assign(self, node):
+        if not self.scope or self.scope[-1][1] == "class":
+            for target in node.targets:
+                for name in ast.walk(target):
+                    if isinstance(name, ast.Name):
+                        self._define(name.id, "variable", node)
+        self.generic_visit(node)
+
+    def visit_AnnAssign(self, node):
+        if (not self.scope or self.scope[-1][1] == "class") and isinstance(node.target, ast.Name):
+            self._define(node.target.id, "variable", node)
+        self.generic_visit(node)
+
+    def visit_Call(self, node):
+        func = node.func
+        name = func.id if isinstance(func, ast.Name) else func.attr if isinstance(func, ast.Attribute) else None
+        if name:
+            self.calls.setdefault(name, []).append(node.lineno)
+            if isinstance(func, ast.Attribute):
+                self.visit(func.value)
+        else:
+            self.visit(func)
+        for child in node.args + node.keywords:
+            self.visit(child)
+
+    def visit_Name(self, node):
+        if isinstance(node.ctx, ast.Load):
+            self.refs.setdefault(node.id, []).append(node.lineno)
+
+    def visit_Attribute(self, node):
+        if isinstance(node.ctx, ast.Load):
+            self.refs.setdefault(node.attr, []).append(node.lineno)
+        self.visit(node.value)
+
+
+def symbol_table(tree: ast.Module) -> Dict[str, Any]:
+    visitor = _SymbolVisitor()
+    visitor.visit(tree)
+    return {
+        "definitions": visitor.definitions,
+        "calls": {name: sorted(set(lines)) for name, lines in visitor.calls.items()},
+        "refs": {name: sorted(set(lines)) for name, lines in visitor.refs.items() if name != "self"},
+    }
+
+
+class SymbolIndex:
+    def __init__(self, code_parser):
+        self.code_parser = code_parser
+        self._tables: Dict[str, Dict[str, Any]] = {}
+        self._paths: Dict[str, str] = {}
+        self._modules: Dict[str, Optional[str]] = {}
+        self._module_index = None
+        self._definitions: Dict[str, Dict[str, List[Tuple[str, str, int, int]]]] = {}
+        self._references: Dict[str, Dict[str, List[Tuple[int, bool]]]] = {}
+        self._folded: Dict[str, set] = {}
+        self._lock = threading.RLock()
+        self.last_update = {"reindexed": 0, "removed": 0, "ms": 0.0}
+
+    def __len__(self) -> int:
+        return len(self._definitions)
+
+    def _keys(self, rel: str, qualname: str) -> List[str]:
+        keys = [qualname.rsplit(".", 1)[-1]]
+        if qualname != keys[0]:
+            keys.append(qualname)
+        module = self._modules.get(rel)
+        if module:
+            keys.append(f"{module}.{qualname}")
+        return keys
+
+    def _remove(self, rel: str):
+        table = self._tables.pop(rel, None)
+        if table is None:
+            return
+        for qualname, _, _, _ in table["definitions"]:
+            for key in self._keys(rel, qualname):
+                files = self._definitions.get(key)
+                if files is not None and files.pop(rel, None) is not None and not files:
+                    del self._definitions[key]
+                    self._folded.get(key.lower(), set()).discard(key)
+        for name in set(table["calls"]) | set(table["refs"]):
+            files = self._references.get(name)
+            if files is not None and files.pop(rel, None) is not None and not files:
+                del self._references[name]
+
+    def _add(self, rel: str, table: Dict[str, Any]):
+        self._tables[rel] = table
+        for qualname, kind, start, end in table["definitions"]:
+            for key in self._keys(rel, qualname):
+                self._definitions.setdefault(key, {}).setdefault(rel, []).append((qualname, kind, start, end))
+                self._folded.setdefault(key.lower(), set()).add(key)
+        sites: Dict[str, List[Tuple[int, bool]]] = {}
+        for name, lines in table["refs"].items():
+            sites[name] = [(line, False) for line in lines]
+        for name, lines in table["calls"].items():
+            sites.setdefault(name, []).extend((line, True) for line in lines)
+        for name, entries in sites.items():
+            self._references.setdefault(name, {})[rel] = sorted(entries)
+
+    def update(self) -> int:
+        start = time.perf_counter()
+        with self._lock:
+            files = {rel: path for rel, path in self.code_parser.get_all_files(include_ext={'.py'}).items()
+                     if rel.endswith(".py")}
+            module_index = self.code_parser.module_index
+            if module_index is not self._module_index:
+                modules = {rel: module_index.module_name_of(path) for rel, path in files.items()}
+                tables = self._tables
+                self._tables, self._definitions, self._references, self._folded = {}, {}, {}, {}
+                self._modules = modules
+                self._module_index = module_index
+                for rel, table in tables.items():
+                    if rel in files:
+                        self._add(rel, table)
+            self._paths = files
+
+            removed = [rel for rel in self._tables if rel not in files]
+            for rel in removed:
+                self._remove(rel)
+            reindexed = 0
+            for rel, path in files.items():
+                try:
+                    table = self.code_parser.file_cache.summary(path, "symbol_table", symbol_table)
+                except (OSError, SyntaxError, ValueError) as e:
+                    print(f"[DEBUG] Symbol index skipped {path}: {e}")
+                    continue
+                # FileCache hands back the same summary object until the file changes.
+                if self._tables.get(rel) is not table:
+                    self._remove(rel)
+                    self._add(rel, table)
+                    reindexed += 1
+            self.last_update = {"reindexed": reindexed, "removed": len(removed),
+                                "ms": (time.perf_counter() - start) * 1e3}
+        return reindexed + len(removed)
+
+    def definitions(self, name: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            found = []
+            for rel, entries in self._definitions.get(name, {}).items():
+                module = self._modules.get(rel)
+                for qualname, kind, start, end in entries:
+                    found.append({"name": f"{module}.{qualname}" if module else qualname, "qualname": qualname,
+                                  "kind": kind, "file": rel, "path": self._paths.get(rel), "start": start, "end": end})
+            return found
+
+    def find(self, name: str) -> List[Dict[str, Any]]:
+        found = self.definitions(name)
+        if found:
+            return found
+        for key in sorted(self._folded.get(name.lower(), ())):
+            found.extend(self.definitions(key))
+        return found
+
+    def references(self, name: str, calls_only: bool = False) -> List[Dict[str, Any]]:
+        name = name.rsplit(".", 1)[-1]
+        with self._lock:
+            return [{"file": rel, "path": self._paths.get(rel), "line": line, "call": is_call}
+                    for rel, entries in self._references.get(name, {}).items()
+                    for line, is_call in entries if is_call or not calls_only]
+
+    def snippet(self, definition: Dict[str, Any]) -> str:
+        content = self.code_parser.file_cache.content(definition["path"])
+        return "\n".join(content.splitlines()[definition["start"] - 1:definition["end"]])
+
+
+if __name__ == "__main__":
+    import shutil
+    import tempfile
+    import config
+    from code_parser import CodeParser
+
+    bench_dir = tempfile.mkdtemp(prefix="symbol_index_bench_")
+    original_store = config.FAISS_STORE_PATH
+    config.FAISS_STORE_PATH = os.path.join(bench_dir, "store")
+    project_dir = os.path.join(bench_dir, "project")
+    try:
+        n_packages, modules_per_package = 20, 50
+        for p in range(n_packages):
+            package = os.path.join(project_dir, f"pkg{p}")
+            os.makedirs(package)
+            open(os.path.join(package, "__init__.py"), "w").close()
+            for m in range(modules_per_package):
+                with open(os.path.join(package, f"mod{m}.py"), "w") as f:
+                    f.write(f"from pkg{(p + 1) % n_packages}.mod{m} import Service{m}_{(p + 1) % n_packages}\n\n")
+                    f.write(f"LIMIT_{p}_{m} = {m}\n\n")
+                    f.write(f"class Service{m}_{p}:\n")
+                    for j in range(10):
+                        f.write(f"    def handle_{j}(self, value):\n"
+                                f"        return Service{m}_{(p + 1) % n_packages}().handle_{j}(value) + LIMIT_{p}_{m}\n\n")
+                    f.write("".join(f"def helper_{p}_{m}_{j}(x):\n    return [x] * {j}\n\n" for j in range(10)))
+        old = time.time() - 60
+        for root, _, names in os.walk(project_dir):
+            for name in names:
+                os.utime(os.path.join(root, name), (old, old))
+
+        parser = CodeParser(project_dir)
+        index = SymbolIndex(parser)
+        start = time.perf_counter()
+        index.update()
+        build_ms = (time.perf_counter() - start) * 1e3
+
+        start = time.perf_counter()
+        index.update()
+        idle_ms = (time.perf_counter() - start) * 1e3
+
+        changed = os.path.join(project_dir, "pkg3", "mod7.py")
+        with open(changed, "a") as f:
+            f.write("def brand_new_function():\n    return helper_3_7_1(2)\n")
+        old_time = time.time() - 30
+        os.utime(changed, (old_time, old_time))
+        start = time.perf_counter()
+        index.update()
+        changed_ms = (time.perf_counter() - start) * 1e3
+
+        names = ["Service7_3", "pkg3.mod7.Service7_3.handle_4", "brand_new_function", "helper_3_7_1"]
+        rounds = 10_000
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for name in names:
+                index.definitions(name)
+        lookup_us = (time.perf_counter() - start) / (rounds * len(names)) * 1e6
+
+        start = time.perf_counter()
+        index.definitions("handle_4")
+        common_us = (time.perf_counter() - start) * 1e6
+
+        start = time.perf_counter()
+        matches = []
+        for path in parser.all_files.values():
+            if path.endswith(".py"):
+                with open(path, "r", encoding="utf-8") as f:
+                    if "def brand_new_function" in f.read():
+                        matches.append(path)
+        grep_ms = (time.perf_counter() - start) * 1e3
+
+        print(f"{len(parser.all_files)} paths, {len(index)} symbol keys")
+        print(f"First build:            {build_ms:8.1f} ms")
+        print(f"Update, no changes:     {idle_ms:8.1f} ms")
+        print(f"Update, one file edited:{changed_ms:8.1f} ms ({index.last_update['reindexed']} reindexed)")
+        print(f"Definition lookup:      {lookup_us:8.2f} us   (scanning file text: {grep_ms:.1f} ms)")
+        print(f"Lookup of handle_4 ({len(index.definitions('handle_4'))} definitions): {common_us:.0f} us")
+        found = index.definitions("brand_new_function")[0]
+        print(f"brand_new_function -> {found['name']} {found['file']}:{found['start']}, "
+              f"{len(index.references('helper_3_7_1', calls_only=True))} call sites of helper_3_7_1")
+        parser.close()
+    finally:
+        config.FAISS_STORE_PATH = original_store
+        shutil.rmtree(bench_dir)
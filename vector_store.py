@@ -0,0 +1,245 @@
+import threading
+from typing import Optional, Dict, Any, List, Tuple, Sequence, Callable
+
+import numpy as np
+from langchain_core.documents import Document
+
+import config
+
+
+class MatrixVectorStore:
+    def __init__(self, embedding=None, dtype: Optional[str] = None, initial_capacity: int = 1024):
+        self.embedding = embedding
+        self.dtype = np.dtype(dtype or config.MEMORY_VECTOR_DTYPE)
+        if self.dtype not in (np.float32, np.float16):
+            raise ValueError(f"Unsupported vector dtype: {self.dtype}")
+        self._initial_capacity = initial_capacity
+        self._matrix: Optional[np.ndarray] = None
+        self._size = 0
+        self._records: List[Dict[str, Any]] = []
+        self._base: Optional[np.ndarray] = None
+        self._base_rows = 0
+        self._base_reader: Optional[Callable[[int], Dict[str, Any]]] = None
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return self._base_rows + self._size
+
+    @property
+    def dim(self) -> Optional[int]:
+        if self._base is not None:
+            return self._base.shape[1]
+        return None if self._matrix is None else self._matrix.shape[1]
+
+    @property
+    def matrix(self) -> np.ndarray:
+        return self.row_vectors(0, len(self))
+
+    def row_vectors(self, start: int, stop: int) -> np.ndarray:
+        parts = []
+        if start < self._base_rows:
+            parts.append(np.asarray(self._base[start:min(stop, self._base_rows)]))
+        if stop > self._base_rows and self._matrix is not None:
+            parts.append(self._matrix[max(start, self._base_rows) - self._base_rows:stop - self._base_rows])
+        if not parts:
+            return np.zeros((0, self.dim or 0), dtype=self.dtype)
+        return parts[0] if len(parts) == 1 else np.vstack([p.astype(np.float32) for p in parts])
+
+    def vectors_at(self, rows: Sequence[int]) -> np.ndarray:
+        rows = np.asarray(rows, dtype=np.int64)
+        vectors = np.zeros((rows.size, self.dim or 0), dtype=np.float32)
+        in_base = rows < self._base_rows
+        if in_base.any():
+            vectors[in_base] = self._base[rows[in_base]]
+        if (~in_base).any():
+            vectors[~in_base] = self._matrix[rows[~in_base] - self._base_rows]
+        return vectors
+
+    def attach_base(self, vectors: np.ndarray, reader: Callable[[int], Dict[str, Any]]):
+        with self._lock:
+            if len(self):
+                raise ValueError("A base segment can only be attached to an empty store.")
+            self._base = vectors
+            self._base_rows = vectors.shape[0]
+            self._base_reader = reader
+
+    @staticmethod
+    def normalize(vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors[None, :]
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _reserve(self, extra_rows: int, dim: int):
+        if self.dim is not None and dim != self.dim:
+            raise ValueError(f"Vector dimension {dim} does not match store dimension {self.dim}.")
+        if self._matrix is None:
+            capacity = max(self._initial_capacity, extra_rows)
+            self._matrix = np.zeros((capacity, dim), dtype=self.dtype)
+            return
+        needed = self._size + extra_rows
+        if needed <= self._matrix.shape[0]:
+            return
+        capacity = self._matrix.shape[0]
+        while capacity < needed:
+            capacity *= 2
+        grown = np.zeros((capacity, dim), dtype=self.dtype)
+        grown[:self._size] = self._matrix[:self._size]
+        self._matrix = grown
+
+    def add_vectors(self, ids: Sequence[str], texts: Sequence[str], metadatas: Sequence[Dict[str, Any]],
+                    vectors) -> List[int]:
+        if not len(ids):
+            return []
+        normalized = self.normalize(vectors)
+        if not (len(ids) == len(texts) == len(metadatas) == normalized.shape[0]):
+            raise ValueError("ids, texts, metadatas and vectors must have the same length.")
+        with self._lock:
+            self._reserve(len(ids), normalized.shape[1])
+            start = self._size
+            self._matrix[start:start + len(ids)] = normalized.astype(self.dtype)
+            self._size += len(ids)
+            self._records.extend({"id": doc_id, "page_content": text, "metadata": metadata}
+                                 for doc_id, text, metadata in zip(ids, texts, metadatas))
+            first_row = self._base_rows + start
+            return list(range(first_row, first_row + len(ids)))
+
+    def add_documents(self, documents: List[Document], ids: Optional[List[str]] = None) -> List[str]:
+        if self.embedding is None:
+            raise ValueError("MatrixVectorStore has no embedding model; use add_vectors instead.")
+        ids = ids or [doc.id for doc in documents]
+        vectors = self.embedding.embed_documents([doc.page_content for doc in documents])
+        self.add_vectors(ids, [doc.page_content for doc in documents], [doc.metadata for doc in documents], vectors)
+        return list(ids)
+
+    def record(self, row: int) -> Dict[str, Any]:
+        if row < self._base_rows:
+            return self._base_reader(row)
+        return self._records[row - self._base_rows]
+
+    def id_of(self, row: int) -> str:
+        return self.record(row)["id"]
+
+    def metadata_of(self, row: int) -> Dict[str, Any]:
+        return self.record(row)["metadata"]
+
+    def document(self, row: int) -> Document:
+        record = self.record(row)
+        return Document(id=record["id"], page_content=record["page_content"], metadata=record["metadata"])
+
+    @staticmethod
+    def _segment_scores(queries: np.ndarray, matrix: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        if matrix.dtype == np.float32 and not isinstance(matrix, np.memmap):
+            return queries @ (matrix if rows is None else matrix[rows]).T
+        count = matrix.shape[0] if rows is None else rows.size
+        scores = np.empty((queries.shape[0], count), dtype=np.float32)
+        chunk = config.MEMORY_SEARCH_CHUNK_ROWS
+        for start in range(0, count, chunk):
+            block = matrix[start:start + chunk] if rows is None else matrix[rows[start:start + chunk]]
+            scores[:, start:start + chunk] = queries @ np.asarray(block, dtype=np.float32).T
+        return scores
+
+    def _scores(self, queries: np.ndarray, rows: Optional[np.ndarray]) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        tail = self._matrix[:self._size] if self._matrix is not None else None
+        if rows is None:
+            parts = []
+            if self._base_rows:
+                parts.append(self._segment_scores(queries, self._base))
+            if self._size:
+                parts.append(self._segment_scores(queries, tail))
+            return (parts[0] if len(parts) == 1 else np.hstack(parts)), None
+        base_rows = rows[rows < self._base_rows]
+        tail_rows = rows[rows >= self._base_rows] - self._base_rows
+        parts = []
+        if base_rows.size:
+            parts.append(self._segment_scores(queries, self._base, base_rows))
+        if tail_rows.size:
+            parts.append(self._segment_scores(queries, tail, tail_rows))
+        return np.hstack(parts), np.concatenate([base_rows, tail_rows + self._base_rows])
+
+    @staticmethod
+    def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+        if k >= scores.shape[0]:
+            return np.argsort(-scores, kind="stable")
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top], kind="stable")]
+
+    def search_batch_by_vector(self, query_vectors, k: int = 4,
+                               rows: Optional[Sequence[int]] = None) -> List[List[Tuple[int, float]]]:
+        queries = self.normalize(query_vectors)
+        with self._lock:
+            if len(self) == 0 or k <= 0:
+                return [[] for _ in range(queries.shape[0])]
+            row_ids = None if rows is None else np.asarray(rows, dtype=np.int64)
+            if row_ids is not None and row_ids.size == 0:
+                return [[] for _ in range(queries.shape[0])]
+            scores, row_ids = self._scores(queries, row_ids)
+        results = []
+        for query_scores in scores:
+            top = self._top_k(query_scores, k)
+            if row_ids is None:
+                results.append([(int(i), float(query_scores[i])) for i in top])
+            else:
+                results.append([(int(row_ids[i]), float(query_scores[i])) for i in top])
+        return results
+
+    def search_by_vector(self, query_vector, k: int = 4,
+                         rows: Optional[Sequence[int]] = None) -> List[Tuple[int, float]]:
+        return self.search_batch_by_vector(query_vector, k, rows)[0]
+
+    def similarity_search_with_score_by_vector(self, embedding, k: int = 4) -> List[Tuple[Document, float]]:
+        return [(self.document(row), score) for row, score in self.search_by_vector(embedding, k)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k)
+
+    def similarity_search(self, query: str, k: int = 4) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+
+if __name__ == "__main__":
+    import time
+    import warnings
+    warnings.filterwarnings("ignore")
+    from langchain_core.vectorstores import InMemoryVectorStore
+
+    dim, k, queries = 256, 10, 20
+    langchain_max_rows = 100_000
+    rng = np.random.default_rng(0)
+    query_vectors = rng.normal(size=(queries, dim)).astype(np.float32)
+
+    print(f"{'rows':>9} | {'InMemoryVectorStore ms/query':>28} | {'float32 ms/query':>16} | {'float16 ms/query':>16} | {'float32 batch ms/query':>22}")
+    for rows in [10_000, 100_000, 1_000_000]:
+        vectors = rng.normal(size=(rows, dim)).astype(np.float32)
+        ids = [str(i) for i in range(rows)]
+        texts = [""] * rows
+        metadatas = [{}] * rows
+
+        timings = {}
+        for dtype in ["float32", "float16"]:
+            store = MatrixVectorStore(dtype=dtype)
+            store.add_vectors(ids, texts, metadatas, vectors)
+            start = time.perf_counter()
+            for q in query_vectors:
+                store.search_by_vector(q, k)
+            timings[dtype] = (time.perf_counter() - start) / queries * 1e3
+            if dtype == "float32":
+                start = time.perf_counter()
+                store.search_batch_by_vector(query_vectors, k)
+                timings["batch"] = (time.perf_counter() - start) / queries * 1e3
+            del store
+
+        langchain_cell = "skipped"
+        if rows <= langchain_max_rows:
+            legacy = InMemoryVectorStore(embedding=None)
+            for i in range(rows):
+                legacy.store[ids[i]] = {"id": ids[i], "vector": vectors[i].tolist(), "text": "", "metadata": {}}
+            start = time.perf_counter()
+            for q in query_vectors[:5]:
+                legacy.similarity_search_with_score_by_vector(q.tolist(), k)
+            langchain_cell = f"{(time.perf_counter() - start) / 5 * 1e3:.2f}"
+            del legacy
+        print(f"{rows:>9} | {langchain_cell:>28} | {timings['float32']:>16.2f} | {timings['float16']:>16.2f} | {timings['batch']:>22.2f}")
+        del vectors
@@ -52,8 +52,10 @@ class VsCodeHandler:
             self.voice_manager.speak(f"I encountered an error creating the directory: {e}")
             return False
 
-    def open_file_in_editor(self, full_path: str):
+    def open_file_in_editor(self, full_path: str, line: int = None):
         if os.path.exists(full_path):
+            if line:
+                return self._run_vscode_command(["-g", f"{full_path}:{line}"])
             return self._run_vscode_command([full_path])
         else:
             self.voice_manager.speak(f"Cannot open file because it does not exist at path: {full_path}")